@@ -0,0 +1,1107 @@
+import os
+import sys
+import json
+import time
+import base64
+import asyncio
+import argparse
+import tempfile
+import logging
+import socket
+import resource
+import itertools
+import subprocess
+import http.server
+import urllib.request
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+SUITES = ("parse", "pipeline", "profiles", "filter", "sessions", "reconnect", "webhook", "ratelimit",
+          "download", "startup")
+
+
+def percentiles(samples, scale=1000.0):
+    """p50/p95/p99/max of samples, scaled to milliseconds by default"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)] * scale
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": ordered[-1] * scale}
+
+
+def histogram_percentiles(bounds, before, after, scale=1000.0):
+    """Percentiles from the change in a metrics histogram, as bucket upper bounds"""
+    counts = [b - a for a, b in zip(before, after)]
+    total = sum(counts)
+    if not total:
+        return {}
+    result = {}
+    for name, q in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+        cumulative = 0
+        for bound, count in zip(bounds + (float("inf"),), counts):
+            cumulative += count
+            if cumulative >= q * total:
+                # None when the percentile is beyond the largest bucket
+                result[name] = bound * scale if bound != float("inf") else None
+                break
+    return result
+
+
+def rss_mb():
+    """Current resident set size; falls back to the peak where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RSSSampler:
+    """Tracks peak RSS while a benchmark runs"""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.start = self.peak = 0.0
+        self._task = None
+
+    async def _sample(self):
+        while True:
+            self.peak = max(self.peak, rss_mb())
+            await asyncio.sleep(self.interval)
+
+    async def __aenter__(self):
+        self.start = self.peak = rss_mb()
+        self._task = asyncio.create_task(self._sample())
+        return self
+
+    async def __aexit__(self, *exc):
+        self._task.cancel()
+        self.peak = max(self.peak, rss_mb())
+
+    def stats(self):
+        return {"rss_start_mb": self.start, "rss_peak_mb": self.peak}
+
+
+def bench_parse(payload_size=50_000, iterations=20_000, alloc_frames=1000):
+    """Binary header parsing vs JSON + base64 for one video message
+
+    Each path runs through to the array the processor decodes from
+    (np.frombuffer); cv2.imdecode is the same for both and left out. Per
+    frame it reports time, peak bytes allocated while handling the frame
+    (every copy alive at once, measured with tracemalloc) and the blocks
+    still allocated for the frame's result.
+    """
+    import tracemalloc
+    import numpy as np
+    from rtms_frames import pack_binary_frame, parse_binary_frame
+    payload = os.urandom(payload_size)
+    binary = pack_binary_frame("video", payload, 1, time.time(), True)
+    text = json.dumps({"video": base64.b64encode(payload).decode("ascii"), "participant_id": 1,
+                       "timestamp": time.time(), "keyframe": True})
+
+    def run_binary():
+        frame = parse_binary_frame(binary)
+        return np.frombuffer(frame.payload, np.uint8)
+
+    def run_json():
+        data = json.loads(text)
+        return np.frombuffer(base64.b64decode(data["video"]), np.uint8)
+
+    results = {"payload_bytes": payload_size, "binary_wire_bytes": len(binary),
+               "json_wire_bytes": len(text)}
+    for name, func in (("binary", run_binary), ("json", run_json)):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter() - started
+        results[f"{name}_us"] = elapsed / iterations * 1e6
+        results[f"{name}_messages_per_second"] = iterations / elapsed
+
+        tracemalloc.start()
+        try:
+            peaks = []
+            for _ in range(alloc_frames):
+                baseline = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                func()
+                peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+            # Results are kept so what each frame leaves allocated can be counted
+            before = tracemalloc.take_snapshot()
+            kept = [func() for _ in range(alloc_frames)]
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        diff = after.compare_to(before, "lineno")
+        results[f"{name}_peak_bytes_per_frame"] = sorted(peaks)[len(peaks) // 2]
+        results[f"{name}_allocations_per_frame"] = sum(s.count_diff for s in diff) / len(kept)
+        results[f"{name}_retained_bytes_per_frame"] = sum(s.size_diff for s in diff) / len(kept)
+    results["speedup"] = results["json_us"] / results["binary_us"]
+    results["peak_bytes_ratio"] = (results["json_peak_bytes_per_frame"]
+                                   / results["binary_peak_bytes_per_frame"])
+    return results
+
+
+def _timed(handler, stream, stages):
+    """Wrap a stream handler to record delivery (send to handler start) and handler time"""
+    async def wrapper(payload, participant_id=None, timestamp=None):
+        started = time.time()
+        if timestamp:
+            stages[f"{stream}_delivery"].append(started - timestamp)
+        await handler(payload, participant_id=participant_id, timestamp=timestamp)
+        stages[f"{stream}_handler"].append(time.time() - started)
+    return wrapper
+
+
+async def bench_pipeline(meetings=1, participants=2, fps=15, seconds=10.0, speed=0.0,
+                         message_format="binary", execution_mode="inline", workers=1,
+                         face_detection=False, analysis_batch=0, audio=False, output_root=None,
+                         profile=None, adaptive=False, hold=1, frame_filter=True,
+                         capture_path=None, overflow_policy=None, change_threshold=None):
+    """End-to-end: fake RTMS server -> ZoomRTMSClient -> VideoProcessor, per meeting
+
+    overflow_policy defaults to the client's configured policy; "block"
+    applies backpressure so every frame is decoded instead of dropped.
+    """
+    from fake_rtms_server import SyntheticSource, FakeRTMSServer
+    from rtms_client import ZoomRTMSClient
+    from stream_profiles import AdaptiveController, get_profile
+    from video_processor import VideoProcessor, DECODE_SECONDS
+    from stream_handlers import AudioAnalyzer
+
+    source = None if capture_path else SyntheticSource(participants, fps, audio=audio, hold=hold)
+    server = await FakeRTMSServer(source, capture_path, seconds=seconds, speed=speed,
+                                  message_format=message_format).start()
+    stages = defaultdict(list)
+    # Configured defaults when on, otherwise every frame is decoded and saved
+    filter_options = {"dedup": False, "change_threshold": 0}
+    if frame_filter:
+        filter_options = {} if change_threshold is None else {"change_threshold": change_threshold}
+    decode = DECODE_SECONDS.labels()
+    decode_before = list(decode.counts)
+
+    async def run_meeting(index):
+        meeting_id = f"bench-{index}"
+        client = ZoomRTMSClient(profile=get_profile(profile) if profile else None,
+                                **({"overflow_policy": overflow_policy} if overflow_policy else {}))
+        client.rtms_url = server.url
+        # The fake server accepts any token, so skip the Zoom API round trip
+        client.rtms_token = "benchmark"
+        client.meeting_id = meeting_id
+        processor = VideoProcessor(output_dir=os.path.join(output_root, meeting_id),
+                                   execution_mode=execution_mode, workers=workers,
+                                   face_detection=face_detection,
+                                   analysis_batch_size=analysis_batch, meeting_id=meeting_id,
+                                   **filter_options)
+        client.register_handler("video", _timed(processor.process_frame, "video", stages))
+        analyzer = AudioAnalyzer() if audio else None
+        if analyzer:
+            client.register_handler("audio", _timed(analyzer.handle_audio, "audio", stages))
+        if not await client.connect_to_rtms(meeting_id):
+            raise RuntimeError(f"Could not connect to the fake RTMS server at {server.url}")
+        controller = AdaptiveController(client, interval=0.5) if adaptive else None
+        controller_task = asyncio.create_task(controller.run()) if controller else None
+        try:
+            await client.process_video_data()
+        finally:
+            if controller_task:
+                controller_task.cancel()
+            await client.close()
+            await processor.close()
+        dropped = sum(stats["dropped"] for stats in client.queue_stats().values())
+        adaptation = controller.stats() if controller else None
+        filtered = processor.filter.stats()
+        return (processor.frame_count, dropped, analyzer.stats() if analyzer else None, adaptation,
+                filtered, processor.batcher)
+
+    try:
+        async with RSSSampler() as rss:
+            started = time.perf_counter()
+            cpu_started = time.process_time()
+            results = await asyncio.gather(*(run_meeting(i) for i in range(meetings)))
+            elapsed = time.perf_counter() - started
+            cpu = time.process_time() - cpu_started
+    finally:
+        await server.stop()
+
+    frames = sum(result[0] for result in results)
+    decoded = sum(decode.counts) - sum(decode_before)
+    filtered = {key: sum(result[4][key] for result in results)
+                for key in ("seen", "duplicates", "unchanged")}
+    report = {
+        "config": {"meetings": meetings, "participants": participants, "fps": fps,
+                   "seconds": seconds, "speed": speed, "format": message_format,
+                   "execution_mode": execution_mode, "workers": workers,
+                   "face_detection": face_detection, "analysis_batch": analysis_batch,
+                   "audio": audio, "profile": profile, "adaptive": adaptive,
+                   "overflow_policy": overflow_policy, "frame_filter": frame_filter},
+        "seconds": elapsed,
+        "frames": frames,
+        "frames_per_second": frames / elapsed,
+        "decoded_frames": decoded,
+        "decoded_frames_per_second": decoded / elapsed,
+        "messages_per_second": server.messages / elapsed,
+        "wire_mb_per_second": server.bytes / elapsed / 1e6,
+        "dropped": sum(result[1] for result in results),
+        "skip_ratio": ((filtered["duplicates"] + filtered["unchanged"]) / filtered["seen"]
+                       if filtered["seen"] else 0.0),
+        "frame_filter": filtered,
+        # Includes the in-process fake server, which is cheap next to decoding
+        "cpu_seconds": cpu,
+        "cpu_percent": cpu / elapsed * 100,
+        "latency_ms": {stage: percentiles(samples) for stage, samples in stages.items()},
+        "decode_ms": histogram_percentiles(decode.bounds, decode_before, decode.counts),
+        **rss.stats(),
+    }
+    if audio:
+        report["audio_cpu_seconds_per_minute"] = max(
+            result[2]["cpu_seconds_per_audio_minute"] for result in results)
+    if adaptive:
+        report["adaptation"] = [result[3] for result in results]
+    batchers = [result[5] for result in results if result[5] is not None]
+    if batchers:
+        # Summed over meetings: wait is averaged per frame, inference rate over inference time
+        batches = sum(batcher.batches for batcher in batchers)
+        analyzed = sum(batcher.frames for batcher in batchers)
+        infer_time = sum(batcher.infer_time for batcher in batchers)
+        report["analysis_batch"] = {
+            "batches": batches,
+            "frames": analyzed,
+            "avg_batch_size": analyzed / batches if batches else 0.0,
+            "avg_batch_wait_ms": (sum(batcher.wait_total for batcher in batchers) / analyzed * 1000
+                                  if analyzed else 0.0),
+            "inference_frames_per_second": analyzed / infer_time if infer_time else 0.0,
+        }
+    return report
+
+
+async def bench_filter(meetings=1, participants=2, fps=15, seconds=10.0, hold=15,
+                       capture_path=None, output_root=None, change_threshold=4):
+    """CPU with and without duplicate/change filtering on a mostly static stream
+
+    Uses a capture when given, otherwise synthetic video whose images are
+    held for `hold` frames. Streams in real time so CPU use is comparable.
+    The change filter is off by default, so the "on" run sets
+    change_threshold explicitly.
+    """
+    runs = {}
+    for enabled in (False, True):
+        runs["on" if enabled else "off"] = await bench_pipeline(
+            meetings, participants, fps, seconds, 1.0, output_root=output_root, hold=hold,
+            frame_filter=enabled, capture_path=capture_path, change_threshold=change_threshold)
+    off, on = runs["off"], runs["on"]
+    return {
+        "config": {"meetings": meetings, "participants": participants, "fps": fps,
+                   "seconds": seconds, "hold": hold, "capture": capture_path,
+                   "change_threshold": change_threshold},
+        "cpu_percent_off": off["cpu_percent"],
+        "cpu_percent_on": on["cpu_percent"],
+        "cpu_saved": 1 - on["cpu_percent"] / off["cpu_percent"] if off["cpu_percent"] else 0.0,
+        "frames_saved_off": off["frames"],
+        "frames_saved_on": on["frames"],
+        "skip_ratio": on["skip_ratio"],
+        "frame_filter": on["frame_filter"],
+    }
+
+
+async def bench_profiles(profiles, meetings=1, participants=2, seconds=10.0,
+                         face_detection=False, output_root=None):
+    """Bandwidth and CPU per subscription profile, streamed in real time
+
+    The source runs at 30 fps so every profile gets the frame rate it asks
+    for; savings are relative to the first profile. A final run starts at
+    the first profile with the adaptive controller on, to show how it
+    settles under the same load.
+    """
+    runs = {}
+    for name in list(profiles) + ["adaptive"]:
+        runs[name] = await bench_pipeline(meetings, participants, 30, seconds, 1.0, audio=True,
+                                          face_detection=face_detection, output_root=output_root,
+                                          profile=profiles[0] if name == "adaptive" else name,
+                                          adaptive=name == "adaptive")
+        logger.info(f"{name}: {runs[name]['wire_mb_per_second']:.2f} MB/s, "
+                    f"{runs[name]['cpu_percent']:.0f}% CPU")
+    base = runs[profiles[0]]
+    report = {}
+    for name, run in runs.items():
+        report[name] = {
+            "wire_mb_per_second": run["wire_mb_per_second"],
+            "frames_per_second": run["frames_per_second"],
+            "cpu_percent": run["cpu_percent"],
+            "bandwidth_saved": 1 - run["wire_mb_per_second"] / base["wire_mb_per_second"],
+            "cpu_saved": 1 - run["cpu_percent"] / base["cpu_percent"],
+            "latency_ms": run["latency_ms"].get("video_delivery", {}),
+        }
+        if "adaptation" in run:
+            report[name]["adaptation"] = run["adaptation"]
+    return report
+
+
+def bench_ring(meetings, workers):
+    """How evenly the hash ring spreads meetings, and how many move when a worker joins"""
+    from rtms_workers import HashRing
+    ring = HashRing()
+    for i in range(workers):
+        ring.add(f"worker-{i}")
+    meeting_ids = [str(85000000000 + i * 7919) for i in range(meetings)]
+    before = {meeting_id: ring.get(meeting_id) for meeting_id in meeting_ids}
+    load = defaultdict(int)
+    for owner in before.values():
+        load[owner] += 1
+    ring.add(f"worker-{workers}")
+    moved = sum(1 for meeting_id in meeting_ids if ring.get(meeting_id) != before[meeting_id])
+    return {
+        "workers": workers,
+        "max_load_ratio": max(load.values()) / (meetings / workers),
+        "moved_on_join": moved / meetings,
+        "ideal_moved_on_join": 1 / (workers + 1),
+    }
+
+
+async def bench_sessions(meetings=100, participants=2, fps=5, seconds=10.0, speed=1.0,
+                         ring_workers=4, output_root=None):
+    """Many concurrent meetings through RTMSSessionManager on one node"""
+    from fake_rtms_server import SyntheticSource, FakeRTMSServer
+    from rtms_sessions import RTMSSessionManager
+
+    source = SyntheticSource(participants, fps, width=320, height=180)
+    # Held open so clients do not reconnect once their stream ends
+    server = await FakeRTMSServer(source, seconds=seconds, speed=speed, hold_open=True).start()
+
+    class BenchSessionManager(RTMSSessionManager):
+        def create_session(self, meeting_id, *args, **kwargs):
+            session = super().create_session(meeting_id, *args, **kwargs)
+            session.client.rtms_url = server.url
+            session.client.rtms_token = "benchmark"
+            session.client.meeting_id = meeting_id
+            return session
+
+    manager = BenchSessionManager(max_sessions=meetings, output_root=output_root)
+    expected = (seconds / speed if speed else seconds) * 5 + 30
+    try:
+        async with RSSSampler() as rss:
+            started = time.perf_counter()
+            for i in range(meetings):
+                await manager.start(f"bench-{i}")
+            sessions = list(manager.sessions.values())
+            await asyncio.wait_for(server.wait_completed(meetings), expected)
+            await manager.shutdown()
+            elapsed = time.perf_counter() - started
+    finally:
+        await server.stop()
+
+    per_session = [session.processor.frame_count for session in sessions]
+    return {
+        "config": {"meetings": meetings, "participants": participants, "fps": fps,
+                   "seconds": seconds, "speed": speed},
+        "seconds": elapsed,
+        "frames": sum(per_session),
+        "frames_per_second": sum(per_session) / elapsed,
+        "expected_frames_per_session": int(seconds * fps) * participants,
+        "min_frames_per_session": min(per_session),
+        "reconnects": sum(session.client.reconnects for session in sessions),
+        "sharding": bench_ring(meetings, ring_workers),
+        **rss.stats(),
+    }
+
+
+def _worker_frames(families):
+    """Frames a worker processed, from the metric families in its heartbeat"""
+    return sum(value for fam in families if fam["name"] == "video_frames_total"
+               for _, labels, value in fam["samples"] if labels.get("outcome") == "processed")
+
+
+async def bench_sharded_sessions(workers=4, meetings=100, participants=2, fps=5, seconds=10.0,
+                                 speed=1.0, kill_after=None, output_root=None):
+    """Meetings spread over ShardedSessionManager worker processes, one of them killed mid-run
+
+    Workers fetch tokens from a FakeZoomAPI and stream from a FakeRTMSServer,
+    both passed through the environment they are spawned with. `kill_after`
+    seconds in (default half the stream) the worker holding the most
+    meetings is killed; its meetings should move to the surviving workers
+    and still stream to the end. Fails if a moved meeting never comes back.
+    Workers replaced beyond the killed one missed heartbeats, usually
+    because the host ran out of CPU.
+    """
+    import signal
+    import rtms_workers
+    from fake_rtms_server import SyntheticSource, FakeRTMSServer
+    from fake_zoom_api import FakeZoomAPI
+
+    source = SyntheticSource(participants, fps, width=320, height=180)
+    server = await FakeRTMSServer(source, seconds=seconds, speed=speed, hold_open=True).start()
+    api = FakeZoomAPI().start()
+    stream_seconds = seconds / speed if speed else seconds
+    kill_after = stream_seconds / 2 if kill_after is None else kill_after
+    heartbeat = 1.0
+    saved = dict(os.environ)
+    # Spawned workers import their settings from the environment they start with
+    os.environ.update({
+        "ZOOM_RTMS_URL": server.url, "ZOOM_API_BASE_URL": api.base_url,
+        "ZOOM_TOKEN_URL": api.token_url, "ZOOM_ACCOUNT_ID": "benchmark",
+        "ZOOM_CLIENT_ID": "benchmark", "ZOOM_CLIENT_SECRET": "benchmark",
+        "RTMS_WORKER_HEARTBEAT": str(heartbeat), "RTMS_MAX_SESSIONS": str(meetings),
+        "VIDEO_OUTPUT_DIR": os.path.join(output_root, "sharded"),
+    })
+    manager = rtms_workers.ShardedSessionManager(workers)
+    # Last heartbeat metrics per worker, kept after a worker is gone
+    frames = {}
+    victim, moved, kill_at, recovered_at = None, [], None, None
+    try:
+        await manager.start_workers()
+        started = time.perf_counter()
+        for i in range(meetings):
+            await manager.start(f"bench-{i}")
+        deadline = started + stream_seconds * 3 + 60
+        while len(server.finished) < meetings and time.perf_counter() < deadline:
+            await asyncio.sleep(0.2)
+            for worker_id, families in list(manager.worker_metrics.items()):
+                frames[worker_id] = _worker_frames(families)
+            if victim is None and time.perf_counter() - started >= kill_after:
+                load = defaultdict(list)
+                for meeting_id, owner in manager.assignments.items():
+                    load[owner].append(meeting_id)
+                victim = max(load, key=lambda worker_id: len(load[worker_id]))
+                moved = load[victim]
+                os.kill(manager.processes[victim].pid, signal.SIGKILL)
+                kill_at = time.perf_counter()
+                logger.info(f"Killed {victim} holding {len(moved)} meetings")
+            elif victim is not None and recovered_at is None:
+                # Recovered once every moved meeting streams on a live worker
+                streaming = {str(session["meeting_id"])
+                             for worker_id, sessions in list(manager.worker_sessions.items())
+                             if worker_id != victim and sessions
+                             for session in sessions.get("sessions", [])
+                             if session["state"] == "streaming"}
+                if all(meeting_id in streaming for meeting_id in moved):
+                    recovered_at = time.perf_counter()
+        elapsed = time.perf_counter() - started
+        # One more heartbeat so the totals include the end of the run
+        await asyncio.sleep(heartbeat * 1.5)
+        for worker_id, families in list(manager.worker_metrics.items()):
+            frames[worker_id] = _worker_frames(families)
+        owners = dict(manager.assignments)
+        replaced = manager.next_worker - workers
+    finally:
+        await manager.shutdown()
+        api.stop()
+        await server.stop()
+        os.environ.clear()
+        os.environ.update(saved)
+
+    if moved and recovered_at is None:
+        raise RuntimeError(f"Meetings moved off {victim} never resumed streaming")
+    finished = {path.rsplit("fake-rtms-token-", 1)[-1] for path in server.finished}
+    per_worker = {}
+    for worker_id in sorted(set(owners.values()) | set(frames)):
+        assigned = [meeting_id for meeting_id, owner in owners.items() if owner == worker_id]
+        per_worker[worker_id] = {
+            "meetings": len(assigned),
+            "completed": sum(1 for meeting_id in assigned if meeting_id in finished),
+            "frames": frames.get(worker_id, 0),
+            "frames_per_second": frames.get(worker_id, 0) / elapsed,
+            "killed": worker_id == victim,
+        }
+    return {
+        "config": {"workers": workers, "meetings": meetings, "participants": participants,
+                   "fps": fps, "seconds": seconds, "speed": speed, "kill_after": kill_after},
+        "seconds": elapsed,
+        "completed": len(finished),
+        "completion_ratio": len(finished) / meetings,
+        "frames": sum(frames.values()),
+        "frames_per_second": sum(frames.values()) / elapsed,
+        "killed_worker": victim,
+        "moved_meetings": len(moved),
+        "moved_completed": sum(1 for meeting_id in moved if meeting_id in finished),
+        "moved_to": sorted({owners.get(meeting_id) for meeting_id in moved} - {None}),
+        "recovery_ms": (recovered_at - kill_at) * 1000 if recovered_at else None,
+        "workers_replaced": replaced,
+        "connections": server.connections,
+        "workers": per_worker,
+    }
+
+
+def print_worker_table(report):
+    """Meetings, completion and throughput per worker of a sharded run"""
+    print(f"{'worker':>10} {'meetings':>8} {'completed':>9} {'frames':>8} {'frames/s':>9}")
+    for worker_id, stats in report["workers"].items():
+        print(f"{worker_id:>10} {stats['meetings']:>8} {stats['completed']:>9} "
+              f"{stats['frames']:>8.0f} {stats['frames_per_second']:>9.1f}"
+              f"{'  (killed)' if stats['killed'] else ''}")
+    print(f"{report['moved_meetings']} meetings moved off {report['killed_worker']}, "
+          f"{report['moved_completed']} completed; {report['completed']}/"
+          f"{report['config']['meetings']} meetings completed; "
+          f"{report['workers_replaced']} workers replaced")
+
+
+async def bench_reconnect(meetings=5, participants=2, fps=15, seconds=10.0, drop_every=2.0):
+    """ZoomRTMSClient.run against a fake server that drops every stream on a schedule
+
+    Each client should reconnect after every drop and, as the server resumes
+    dropped streams, still receive every frame. Fails if a client never
+    recovered.
+    """
+    from fake_rtms_server import SyntheticSource, FakeRTMSServer
+    from rtms_client import ZoomRTMSClient
+
+    source = SyntheticSource(participants, fps, width=320, height=180)
+    server = await FakeRTMSServer(source, seconds=seconds, speed=1.0, hold_open=True,
+                                  drop_every=drop_every).start()
+    received = defaultdict(int)
+
+    def counter(meeting_id):
+        async def count(payload, participant_id=None, timestamp=None):
+            received[meeting_id] += 1
+        return count
+
+    clients = {}
+    for i in range(meetings):
+        meeting_id = f"bench-{i}"
+        client = clients[meeting_id] = ZoomRTMSClient()
+        client.rtms_url = server.url
+        # A token per meeting gives each its own URL, which the server resumes by
+        client.rtms_token = f"benchmark-{i}"
+        client.meeting_id = meeting_id
+        client.register_handler("video", counter(meeting_id))
+    tasks = [asyncio.create_task(client.run(meeting_id)) for meeting_id, client in clients.items()]
+    try:
+        await asyncio.wait_for(server.wait_completed(meetings), seconds * 3 + 30)
+    finally:
+        for client in clients.values():
+            await client.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await server.stop()
+
+    unrecovered = [meeting_id for meeting_id, client in clients.items()
+                   if client.reconnects == 0 or client.last_recovery_time is None]
+    if server.drops and unrecovered:
+        raise RuntimeError(f"Meetings {unrecovered} never reconnected after a drop")
+    return {
+        "config": {"meetings": meetings, "participants": participants, "fps": fps,
+                   "seconds": seconds, "drop_every": drop_every},
+        "drops": server.drops,
+        "reconnects": sum(client.reconnects for client in clients.values()),
+        "recovery_ms": percentiles([client.last_recovery_time for client in clients.values()
+                                    if client.last_recovery_time is not None]),
+        "downtime_ms": percentiles([client.total_downtime for client in clients.values()]),
+        "expected_frames_per_meeting": int(seconds * fps) * participants,
+        "min_frames_per_meeting": min(received[meeting_id] for meeting_id in clients),
+    }
+
+
+async def bench_zoom_calls(concurrency=200, latency=0.05):
+    """Webhook handlers calling the Zoom API: blocking requests vs ZoomAPIClient
+
+    `concurrency` handlers run at once, each making one call to a fake API
+    that takes `latency` seconds. The blocking variant calls requests.get
+    without a session inside the coroutine, as handlers did before the
+    async client, so every call stalls the event loop. Rate limits are
+    raised out of the way so only the HTTP path is compared.
+    """
+    import requests
+    from fake_zoom_api import FakeZoomAPI
+    from zoom_api import ZoomAPIClient
+    from zoom_ratelimit import RateLimitScheduler
+
+    api = FakeZoomAPI(latency=latency).start()
+    path = "/meetings/85000000000/recordings"
+
+    async def blocking_handler():
+        return requests.get(f"{api.base_url}{path}", headers={"Authorization": "Bearer benchmark"},
+                            timeout=30).status_code
+
+    async def async_handler():
+        return (await client.get(path)).status_code
+
+    async def timed(handler, arrived, latencies):
+        status = await handler()
+        # From the burst's arrival, so time spent waiting on a blocked loop counts
+        latencies.append(time.perf_counter() - arrived)
+        return status
+
+    report = {"config": {"concurrency": concurrency, "latency": latency}}
+    scheduler = RateLimitScheduler(rates={"light": 1e6, "medium": 1e6, "heavy": 1e6})
+    client = ZoomAPIClient(base_url=api.base_url, tokens=StaticTokens(), scheduler=scheduler)
+    try:
+        for name, handler in (("requests", blocking_handler), ("zoom_api_client", async_handler)):
+            latencies = []
+            started = time.perf_counter()
+            statuses = await asyncio.gather(*(timed(handler, started, latencies)
+                                              for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+            report[name] = {
+                "requests_per_second": concurrency / elapsed,
+                "latency_ms": percentiles(latencies),
+                "statuses": {str(code): statuses.count(code) for code in set(statuses)},
+            }
+    finally:
+        await client.aclose()
+        api.stop()
+    report["p99_speedup"] = (report["requests"]["latency_ms"]["p99"]
+                             / report["zoom_api_client"]["latency_ms"]["p99"])
+    return report
+
+
+async def bench_webhook(requests=2000, concurrency=200, output_root=None):
+    """Ack latency for valid webhooks and throughput for rejected ones
+
+    Also compares handlers calling the Zoom API with blocking requests and
+    with ZoomAPIClient at the same concurrency.
+    """
+    # Configure signing before the app reads its settings
+    os.environ.setdefault("ZOOM_VERIFICATION_TOKEN", "benchmark-secret")
+    os.environ["ZOOM_WEBHOOK_VERIFY"] = "true"
+    import hmac
+    import hashlib
+    import httpx
+    import zoom_integration
+    from webhook_queue import event_log
+    from webhook_auth import webhook_verifier
+
+    secret = os.environ["ZOOM_VERIFICATION_TOKEN"].encode("utf-8")
+    event_log.path = os.path.join(output_root, "events.db")
+    event_log.open()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def signed(i, valid=True):
+        body = json.dumps({"event": "meeting.participant_joined", "event_ts": i,
+                           "payload": {"object": {"id": "1", "uuid": f"bench-{i}"}}}).encode()
+        timestamp = str(int(time.time()))
+        mac = hmac.new(secret, b"v0:" + timestamp.encode() + b":" + body, hashlib.sha256)
+        signature = "v0=" + (mac.hexdigest() if valid else "0" * 64)
+        return body, {"x-zm-request-timestamp": timestamp, "x-zm-signature": signature,
+                      "content-type": "application/json"}
+
+    async def send(client, body, headers, latencies):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/webhook", content=body, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            return response.status_code
+
+    report = {"config": {"requests": requests, "concurrency": concurrency}}
+    transport = httpx.ASGITransport(app=zoom_integration.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for name, valid in (("ack", True), ("reject", False)):
+                messages = [signed(i, valid) for i in range(requests)]
+                latencies = []
+                started = time.perf_counter()
+                statuses = await asyncio.gather(*(send(client, body, headers, latencies)
+                                                  for body, headers in messages))
+                elapsed = time.perf_counter() - started
+                report[name] = {
+                    "requests_per_second": requests / elapsed,
+                    "latency_ms": percentiles(latencies),
+                    "statuses": {str(code): statuses.count(code) for code in set(statuses)},
+                }
+    finally:
+        event_log.close()
+
+    body, headers = signed(0, valid=False)
+    iterations = 100_000
+    started = time.perf_counter()
+    for _ in range(iterations):
+        webhook_verifier.verify(body, headers["x-zm-request-timestamp"], headers["x-zm-signature"])
+    report["verify_reject_per_second"] = iterations / (time.perf_counter() - started)
+    report["zoom_api"] = await bench_zoom_calls(concurrency)
+    return report
+
+
+class StaticTokens:
+    """Token provider stand-in for clients talking to a fake Zoom API"""
+
+    async def get_access_token_async(self):
+        return "benchmark"
+
+    def invalidate(self):
+        pass
+
+
+async def bench_ratelimit(callers=50, retry_after=0.2, max_retry_wait=5.0):
+    """The Zoom API client against a fake API that throttles
+
+    Short Retry-Afters should be retried transparently. Once the fake's quota
+    is spent (a Retry-After far beyond max_retry_wait), callers already
+    queued in the token bucket and later callers should get a 429 straight
+    away without the fake seeing their calls.
+    """
+    from fake_zoom_api import FakeZoomAPI
+    from zoom_api import ZoomAPIClient
+    from zoom_ratelimit import RateLimitScheduler
+
+    api = FakeZoomAPI().start()
+    report = {"config": {"callers": callers, "retry_after": retry_after,
+                         "max_retry_wait": max_retry_wait}}
+
+    async def call(client, latencies):
+        started = time.perf_counter()
+        response = await client.get("/users/me/meetings")
+        latencies.append(time.perf_counter() - started)
+        return response.status_code
+
+    async def run(name, client):
+        latencies = []
+        before = api.stats()
+        statuses = await asyncio.gather(*(call(client, latencies) for _ in range(callers)))
+        report[name] = {
+            "latency_ms": percentiles(latencies),
+            "statuses": {str(code): statuses.count(code) for code in set(statuses)},
+            "upstream_requests": api.requests - before["requests"],
+            "upstream_throttled": api.throttled - before["throttled"],
+        }
+
+    try:
+        scheduler = RateLimitScheduler(max_retry_wait=max_retry_wait)
+        client = ZoomAPIClient(base_url=api.base_url, tokens=StaticTokens(), scheduler=scheduler)
+        try:
+            api.throttle(5, retry_after)
+            await run("short_throttle", client)
+            # Spend the quota: the next call is told to come back in an hour
+            api.quota = api.requests
+            await run("quota_exhausted", client)
+            await run("after_exhaustion", client)
+            report["scheduler"] = scheduler.stats()["medium"]
+        finally:
+            await client.aclose()
+    finally:
+        api.stop()
+    return report
+
+
+class SyntheticFileHandler(http.server.BaseHTTPRequestHandler):
+    """Serves a large synthetic file with Range support, generated as it is sent
+
+    The content repeats one random block, so multi-GB files cost no memory.
+    """
+
+    protocol_version = "HTTP/1.1"
+    size = 0
+    block = b""
+
+    @classmethod
+    def chunks(cls, start, end, chunk_size=1024 * 1024):
+        """The file's bytes from start to end inclusive"""
+        doubled = cls.block * 2
+        offset = start
+        while offset <= end:
+            length = min(end + 1 - offset, chunk_size, len(cls.block))
+            position = offset % len(cls.block)
+            yield doubled[position:position + length]
+            offset += length
+
+    def do_GET(self):
+        start, end = 0, self.size - 1
+        requested = self.headers.get("Range")
+        if requested:
+            first, _, last = requested.split("=", 1)[1].partition("-")
+            start, end = int(first), min(int(last or end), end)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{self.size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        try:
+            for chunk in self.chunks(start, end):
+                self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+async def bench_download(size_mb=1024, part_size_mb=32, parts=(1, 4), output_root=None):
+    """RecordingDownloader against a local HTTP server streaming a synthetic file
+
+    Reports MB/s and peak RSS per parallel range count; the file is checked
+    against its SHA-256, and peak RSS should stay flat as the file grows.
+    """
+    import hashlib
+    import threading
+    import httpx
+    from zoom_auth import token_provider
+    from recording_downloader import RecordingDownloader
+
+    size = size_mb * 1024 * 1024
+    handler = type("Handler", (SyntheticFileHandler,), {"size": size, "block": os.urandom(1024 * 1024)})
+    digest = hashlib.sha256()
+    for chunk in handler.chunks(0, size - 1):
+        digest.update(chunk)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/recording.mp4"
+
+    # No Zoom credentials needed; the local server ignores the token
+    token_provider.access_token = "benchmark"
+    token_provider.expires_at = time.time() + 3600
+    report = {"config": {"size_mb": size_mb, "part_size_mb": part_size_mb}}
+    try:
+        for count in parts:
+            downloader = RecordingDownloader(output_dir=output_root,
+                                             part_size=part_size_mb * 1024 * 1024,
+                                             parts_per_file=count)
+            path = os.path.join(output_root, f"recording-{count}.mp4")
+            async with RSSSampler() as rss:
+                async with httpx.AsyncClient(timeout=httpx.Timeout(60)) as client:
+                    result = await downloader.download_file(client, url, path, expected_size=size,
+                                                            sha256=digest.hexdigest())
+            os.remove(path)
+            report[f"parts_{count}"] = {"mb_per_second": result["mb_per_second"], **rss.stats()}
+    finally:
+        server.shutdown()
+        server.server_close()
+    return report
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _time_to_first_200(env, timeout=60.0):
+    """Seconds from launching the app under uvicorn until GET / returns 200"""
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "zoom_integration:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"App exited with status {server.returncode} before serving")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                pass
+            time.sleep(0.01)
+        raise TimeoutError(f"App did not answer / within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _run_probe(code, env):
+    """Run code in a fresh interpreter and return the last line it prints"""
+    result = subprocess.run([sys.executable, "-c", code], env=env, check=True,
+                            capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return result.stdout.strip().splitlines()[-1]
+
+
+def bench_startup(runs=5, modes=("full", "webhook"), output_root=None):
+    """Cold start of the web app per service mode, each run in a fresh interpreter
+
+    Reports how long importing zoom_integration takes, whether that import
+    loaded OpenCV or numpy, and the time from launching uvicorn to the first
+    200 on /. Also times what the first RTMS session pays to load the media
+    stack.
+    """
+    import_probe = ("import sys, time; started = time.perf_counter(); import zoom_integration; "
+                    "print(time.perf_counter() - started, int('cv2' in sys.modules "
+                    "or 'numpy' in sys.modules))")
+    media_probe = ("import time, rtms_sessions; started = time.perf_counter(); "
+                   "rtms_sessions.load_media_modules(); print(time.perf_counter() - started)")
+    report = {"config": {"runs": runs, "modes": list(modes)}}
+    for mode in modes:
+        env = dict(os.environ, SERVICE_MODE=mode, RTMS_WORKERS="0",
+                   WEBHOOK_EVENT_DB=os.path.join(output_root, f"startup-{mode}.db"))
+        imports, first_200 = [], []
+        media_loaded = False
+        for _ in range(runs):
+            seconds, loaded = _run_probe(import_probe, env).split()
+            imports.append(float(seconds))
+            media_loaded = media_loaded or loaded == "1"
+            first_200.append(_time_to_first_200(env))
+        report[mode] = {"import_ms": percentiles(imports),
+                        "first_200_ms": percentiles(first_200),
+                        "media_loaded_on_import": media_loaded}
+    report["media_import_ms"] = percentiles(
+        [float(_run_probe(media_probe, dict(os.environ))) for _ in range(runs)])
+    return report
+
+
+def print_batch_table(runs):
+    """Throughput and added latency per analysis batch size"""
+    print(f"{'batch':>6} {'workers':>7} {'faces':>5} {'avg size':>8} {'wait ms':>8} "
+          f"{'infer fps':>10} {'decoded fps':>11} {'video p99 ms':>12}")
+    for run in runs:
+        config = run["config"]
+        batch = run.get("analysis_batch") or {}
+        p99 = run["latency_ms"].get("video_handler", {}).get("p99", 0.0)
+        print(f"{config['analysis_batch']:>6} {config['workers']:>7} {str(config['face_detection']):>5} "
+              f"{batch.get('avg_batch_size', 0.0):>8.1f} {batch.get('avg_batch_wait_ms', 0.0):>8.1f} "
+              f"{batch.get('inference_frames_per_second', 0.0):>10.0f} "
+              f"{run['decoded_frames_per_second']:>11.1f} {p99:>12.1f}")
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+async def run_suites(args):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="rtms-bench-") as output_root:
+        if "parse" in args.suites:
+            results["parse"] = bench_parse(args.payload_bytes)
+        if "pipeline" in args.suites:
+            faces = {"off": [False], "on": [True], "both": [False, True]}[args.face_detection]
+            runs = []
+            # Backpressure and no frame filter, so throughput counts decoded frames, not drops
+            for message_format, workers, face, batch in itertools.product(
+                    args.format, args.workers, faces, args.analysis_batch):
+                report = await bench_pipeline(args.meetings, args.participants, args.fps,
+                                              args.seconds, args.speed, message_format,
+                                              args.execution_mode, workers, face, batch,
+                                              args.audio, output_root, frame_filter=args.frame_filter,
+                                              overflow_policy=args.overflow_policy)
+                logger.info(f"{report['config']}: {report['decoded_frames_per_second']:.1f} "
+                            f"decoded frames/s, {report['dropped']} dropped")
+                runs.append(report)
+            results["pipeline"] = runs
+            if any("analysis_batch" in run for run in runs):
+                print_batch_table(runs)
+        if "profiles" in args.suites:
+            results["profiles"] = await bench_profiles(args.profiles, args.meetings,
+                                                       args.participants, args.seconds,
+                                                       args.face_detection != "off", output_root)
+        if "filter" in args.suites:
+            results["filter"] = await bench_filter(args.meetings, args.participants, args.fps,
+                                                   args.seconds, args.hold, args.capture, output_root,
+                                                   args.change_threshold)
+        if "sessions" in args.suites:
+            results["sessions"] = await bench_sessions(args.session_meetings, args.participants,
+                                                       args.session_fps, args.seconds, args.speed or 1.0,
+                                                       output_root=output_root)
+            if args.session_workers:
+                sharded = await bench_sharded_sessions(args.session_workers, args.session_meetings,
+                                                       args.participants, args.session_fps,
+                                                       args.seconds, args.speed or 1.0,
+                                                       output_root=output_root)
+                results["sessions_sharded"] = sharded
+                print_worker_table(sharded)
+        if "reconnect" in args.suites:
+            results["reconnect"] = await bench_reconnect(args.meetings, args.participants, args.fps,
+                                                         args.seconds, args.drop_every)
+        if "webhook" in args.suites:
+            results["webhook"] = await bench_webhook(args.webhook_requests, args.webhook_concurrency,
+                                                     output_root)
+        if "ratelimit" in args.suites:
+            results["ratelimit"] = await bench_ratelimit()
+        if "download" in args.suites:
+            results["download"] = await bench_download(args.download_mb,
+                                                       output_root=output_root)
+        if "startup" in args.suites:
+            results["startup"] = bench_startup(args.startup_runs, output_root=output_root)
+    return results
+
+
+def _flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key != "config":
+                yield from _flatten(item, f"{prefix}{key}.")
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            yield from _flatten(item, f"{prefix}{i}.")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix.rstrip("."), value
+
+
+def compare(results, baseline, tolerance):
+    """Print changes against a baseline; return the metrics that regressed past tolerance"""
+    old = dict(_flatten(baseline))
+    regressions = []
+    for key, value in _flatten(results):
+        if key not in old or not old[key]:
+            continue
+        if "per_second" in key or key.endswith("speedup"):
+            change = value / old[key] - 1
+        elif "_ms." in key or key.endswith("_mb"):
+            change = old[key] / value - 1 if value else 0.0
+        else:
+            continue
+        marker = ""
+        if change < -tolerance:
+            regressions.append(key)
+            marker = "  REGRESSION"
+        print(f"{key}: {old[key]:.3f} -> {value:.3f} ({change:+.1%}){marker}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the RTMS pipeline and webhook app")
+    parser.add_argument("suites", nargs="*", choices=SUITES, default=["parse", "pipeline"])
+    parser.add_argument("--meetings", type=int, default=1)
+    parser.add_argument("--participants", type=int, default=2)
+    parser.add_argument("--fps", type=int, default=15)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="Replay speed multiplier; 0 sends as fast as possible")
+    parser.add_argument("--format", type=lambda v: v.split(","), default=["binary"],
+                        help="Comma-separated message formats: binary,json")
+    parser.add_argument("--execution-mode", default="inline", choices=("inline", "thread", "process"))
+    parser.add_argument("--workers", type=_int_list, default=[1], help="Comma-separated, e.g. 1,2,4,8")
+    parser.add_argument("--face-detection", choices=("off", "on", "both"), default="off")
+    parser.add_argument("--analysis-batch", type=_int_list, default=[0],
+                        help="Comma-separated batch sizes; 0 disables batched analysis")
+    parser.add_argument("--audio", action="store_true", help="Stream and analyze audio too")
+    parser.add_argument("--overflow-policy", default="block",
+                        choices=("block", "drop_oldest", "drop_newest", "keyframes_only"),
+                        help="Frame queue policy in the pipeline suite")
+    parser.add_argument("--frame-filter", action="store_true",
+                        help="Skip duplicate/unchanged frames in the pipeline suite")
+    parser.add_argument("--profiles", type=lambda v: v.split(","),
+                        default=["full", "standard", "low", "audio_only"],
+                        help="Comma-separated subscription profiles for the profiles suite")
+    parser.add_argument("--hold", type=int, default=15,
+                        help="Frames each synthetic image is held for in the filter suite")
+    parser.add_argument("--capture", help="Replay this RTMS capture in the filter suite")
+    parser.add_argument("--change-threshold", type=int, default=4,
+                        help="Difference-hash bits the filter suite treats as unchanged")
+    parser.add_argument("--payload-bytes", type=int, default=50_000)
+    parser.add_argument("--session-meetings", type=int, default=100)
+    parser.add_argument("--session-fps", type=int, default=5)
+    parser.add_argument("--session-workers", type=int, default=4,
+                        help="Worker processes for the sharded sessions run; 0 skips it")
+    parser.add_argument("--drop-every", type=float, default=2.0,
+                        help="Seconds between dropped connections in the reconnect suite")
+    parser.add_argument("--webhook-requests", type=int, default=2000)
+    parser.add_argument("--webhook-concurrency", type=int, default=200)
+    parser.add_argument("--download-mb", type=int, default=1024,
+                        help="Size of the synthetic recording served in the download suite")
+    parser.add_argument("--startup-runs", type=int, default=5,
+                        help="Cold starts per service mode in the startup suite")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results from a previous --output")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Fail when a metric is this much worse than the baseline")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    results = asyncio.run(run_suites(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metrics regressed more than {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import os
+import threading
+import cv2
+
+FACE_DETECTION = os.getenv('VIDEO_FACE_DETECTION', 'false').lower() == 'true'
+# Run the full detector every N frames and track faces in between
+DETECT_EVERY = int(os.getenv('VIDEO_FACE_DETECT_EVERY', '5'))
+# Width frames are downscaled to before detection
+DETECT_WIDTH = int(os.getenv('VIDEO_FACE_DETECT_WIDTH', '320'))
+
+CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+
+# CascadeClassifier is not safe to share between threads, so each worker
+# thread (or process) loads its own copy once
+_local = threading.local()
+
+
+def get_face_cascade():
+    """Return this worker's face detector, loading it on first use"""
+    cascade = getattr(_local, "face_cascade", None)
+    if cascade is None:
+        cascade = _local.face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
+    return cascade
+
+
+def detect_faces(gray, detect_width=DETECT_WIDTH):
+    """Detect faces on a downscaled copy and map boxes back to full resolution"""
+    height, width = gray.shape[:2]
+    scale = min(1.0, detect_width / width)
+    small = gray if scale == 1.0 else cv2.resize(
+        gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    faces = get_face_cascade().detectMultiScale(small, 1.1, 4)
+    return [(int(x / scale), int(y / scale), int(w / scale), int(h / scale))
+            for (x, y, w, h) in faces]
+
+
+class FaceTracker:
+    """Detects faces every N frames and follows them with template matching"""
+
+    def __init__(self, detect_every=DETECT_EVERY, detect_width=DETECT_WIDTH):
+        self.detect_every = max(detect_every, 1)
+        self.detect_width = detect_width
+        self.frame_index = 0
+        self.faces = []
+        self.templates = []
+
+    def _track(self, gray):
+        """Search near each previous box for the best template match"""
+        height, width = gray.shape[:2]
+        tracked = []
+        templates = []
+        for (x, y, w, h), template in zip(self.faces, self.templates):
+            # Search window: the previous box grown by half its size on each side
+            x0, y0 = max(x - w // 2, 0), max(y - h // 2, 0)
+            x1, y1 = min(x + w + w // 2, width), min(y + h + h // 2, height)
+            window = gray[y0:y1, x0:x1]
+            if window.shape[0] < h or window.shape[1] < w:
+                continue
+            result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (dx, dy) = cv2.minMaxLoc(result)
+            if score < 0.5:
+                # Lost it; the next detection pass will pick it up again
+                continue
+            box = (x0 + dx, y0 + dy, w, h)
+            tracked.append(box)
+            templates.append(gray[box[1]:box[1] + h, box[0]:box[0] + w].copy())
+        self.faces = tracked
+        self.templates = templates
+
+    def update(self, gray):
+        """Return face boxes for this frame"""
+        if self.frame_index % self.detect_every == 0:
+            self.faces = detect_faces(gray, self.detect_width)
+            self.templates = [gray[y:y + h, x:x + w].copy() for (x, y, w, h) in self.faces]
+        else:
+            self._track(gray)
+        self.frame_index += 1
+        return self.faces
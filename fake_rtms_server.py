@@ -0,0 +1,346 @@
+import sys
+import json
+import time
+import heapq
+import base64
+import asyncio
+import argparse
+import logging
+import websockets
+from rtms_frames import pack_binary_frame, FRAME_HEADER
+from rtms_capture import read_capture
+
+logger = logging.getLogger(__name__)
+
+BINARY = "binary"
+JSON = "json"
+
+
+class SyntheticSource:
+    """Generates a meeting: JPEG video, PCM audio and transcript per participant
+
+    A small set of distinct frames is encoded once per participant and size
+    and cycled, so generating messages costs nothing while the content still
+    changes between consecutive frames. Events honour the connection's
+    current subscription: unsubscribed streams are skipped, and video follows
+    the requested width, height and fps.
+    """
+
+    def __init__(self, participants=2, fps=15, width=640, height=360, audio=False,
+                 transcript_every=0.0, distinct_frames=30, quality=80, hold=1):
+        self.participants = participants
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.audio = audio
+        self.transcript_every = transcript_every
+        self.distinct_frames = distinct_frames
+        self.quality = quality
+        # Frames each image is held for, like a screen share or someone sitting still
+        self.hold = hold
+        self.frames = {}
+        for participant in range(1, participants + 1):
+            self.video_frames(participant, width, height)
+        self.chunks = ({participant: self._audio_chunks(participant)
+                        for participant in range(1, participants + 1)} if audio else {})
+
+    @staticmethod
+    def _encode_frames(participant, width, height, count, quality, hold=1):
+        # Imported here so replaying a capture does not need OpenCV
+        import cv2
+        import numpy as np
+        frames = []
+        for i in range(count):
+            image = np.full((height, width, 3), (37 * participant) % 256, np.uint8)
+            x = (i * width // count) % max(width - 80, 1)
+            cv2.rectangle(image, (x, height // 3), (x + 80, height // 3 + 80), (255, 255, 255), -1)
+            cv2.putText(image, f"p{participant} #{i}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX,
+                        1, (0, 0, 0), 2)
+            ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if hold <= 1:
+                frames.append(encoded.tobytes())
+                continue
+            # Held images alternate between two encodings: byte-identical repeats
+            # and recompressed copies that only differ perceptually by noise
+            ok, recompressed = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality - 5])
+            for j in range(hold):
+                frames.append((encoded if j % 4 < 2 else recompressed).tobytes())
+        return frames
+
+    @staticmethod
+    def _audio_chunks(participant, sample_rate=16000, chunk_ms=20):
+        import numpy as np
+        samples = sample_rate * chunk_ms // 1000
+        t = np.arange(samples * 50) / sample_rate
+        # Odd participants talk, even ones send near-silence
+        amplitude = 3000 if participant % 2 else 50
+        wave = (amplitude * np.sin(2 * np.pi * 220 * participant * t)).astype(np.int16)
+        return [wave[i:i + samples].tobytes() for i in range(0, len(wave), samples)]
+
+    def video_frames(self, participant, width, height):
+        key = (participant, width, height)
+        frames = self.frames.get(key)
+        if frames is None:
+            frames = self.frames[key] = self._encode_frames(participant, width, height,
+                                                            self.distinct_frames, self.quality,
+                                                            self.hold)
+        return frames
+
+    def _video(self, participant, seconds, subscription):
+        next_offset = 0.0
+        for i in range(int(seconds * self.fps)):
+            offset = i / self.fps
+            options = subscription.get("video") if subscription is not None else {}
+            if options is None or offset < next_offset - 1e-9:
+                continue
+            # Thin the source rate down to the subscribed fps
+            next_offset = max(next_offset + 1 / (options.get("fps") or self.fps), offset)
+            frames = self.video_frames(participant, options.get("width", self.width),
+                                       options.get("height", self.height))
+            yield offset, "video", participant, frames[i % len(frames)], i % self.fps == 0
+
+    def _audio(self, participant, seconds, subscription):
+        chunks = self.chunks[participant]
+        for i in range(int(seconds / 0.02)):
+            if subscription is None or "audio" in subscription:
+                yield i * 0.02, "audio", participant, chunks[i % len(chunks)], True
+
+    def _transcript(self, seconds, subscription):
+        count = int(seconds / self.transcript_every)
+        for i in range(count):
+            if subscription is not None and "transcript" not in subscription:
+                continue
+            participant = i % self.participants + 1
+            text = f"participant {participant} says line {i}".encode("utf-8")
+            yield i * self.transcript_every, "transcript", participant, text, True
+
+    def events(self, seconds, subscription=None):
+        """Yield (offset, stream, participant_id, payload, keyframe) in time order
+
+        subscription maps stream type to its options and is read lazily, so
+        changes made while streaming take effect from the next event.
+        """
+        sources = []
+        for participant in range(1, self.participants + 1):
+            sources.append(self._video(participant, seconds, subscription))
+            if self.audio:
+                sources.append(self._audio(participant, seconds, subscription))
+        if self.transcript_every:
+            sources.append(self._transcript(seconds, subscription))
+        return heapq.merge(*sources, key=lambda event: event[0])
+
+
+class FakeRTMSServer:
+    """Local stand-in for Zoom's RTMS websocket endpoint
+
+    Every connection is one meeting. After the client subscribes, the server
+    streams either a capture file or synthetic media at `speed` times real
+    time (0 sends as fast as the connection allows). Timestamps are stamped
+    at send time so receivers can measure delivery latency.
+
+    With `drop_every` set, every connection still streaming is closed on
+    that schedule. A reconnect with the same URL resumes its stream after
+    the last message sent, so dropped meetings still complete.
+    """
+
+    def __init__(self, source=None, capture_path=None, seconds=10.0, speed=1.0,
+                 message_format=BINARY, hold_open=False, drop_every=0.0):
+        if source is None and capture_path is None:
+            raise ValueError("Need a synthetic source or a capture file")
+        self.source = source
+        self.capture_path = capture_path
+        self.seconds = seconds
+        self.speed = speed
+        self.message_format = message_format
+        self.hold_open = hold_open
+        self.drop_every = drop_every
+        self.server = None
+        self.connections = 0
+        self.completed = 0
+        # URLs (one per RTMS token) that have been sent a whole stream at least once
+        self.finished = set()
+        self.messages = 0
+        self.bytes = 0
+        self.subscription_messages = 0
+        self.drops = 0
+        # Connections still streaming, and messages sent per URL for resuming
+        self.live = set()
+        self.resume = {}
+        self._dropper = None
+        self._completed = None
+        self._b64 = {}
+
+    @property
+    def url(self):
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"ws://{host}:{port}"
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._completed = asyncio.Condition()
+        self.server = await websockets.serve(self._handle, host, port, max_size=None)
+        if self.drop_every:
+            self._dropper = asyncio.create_task(self._drop_connections())
+        return self
+
+    async def stop(self):
+        if self._dropper is not None:
+            self._dropper.cancel()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _drop_connections(self):
+        while True:
+            await asyncio.sleep(self.drop_every)
+            live = list(self.live)
+            self.drops += len(live)
+            if live:
+                logger.info(f"Dropping {len(live)} RTMS connections")
+            await asyncio.gather(*(websocket.close(1011, "fake drop") for websocket in live),
+                                 return_exceptions=True)
+
+    async def wait_completed(self, count):
+        """Wait until count connections have been sent their whole stream"""
+        async with self._completed:
+            await self._completed.wait_for(lambda: self.completed >= count)
+
+    async def wait_finished(self, count):
+        """Wait until count distinct URLs have been sent their whole stream"""
+        async with self._completed:
+            await self._completed.wait_for(lambda: len(self.finished) >= count)
+
+    def _encode(self, stream, participant_id, payload, keyframe):
+        if self.message_format == BINARY:
+            return pack_binary_frame(stream, payload, participant_id, time.time(), keyframe)
+        if stream == "transcript":
+            value = payload.decode("utf-8")
+        else:
+            # Payloads are cycled, so each is base64 encoded only once
+            value = self._b64.get(id(payload))
+            if value is None:
+                value = self._b64[id(payload)] = base64.b64encode(payload).decode("ascii")
+        return json.dumps({stream: value, "participant_id": participant_id,
+                           "timestamp": time.time(), "keyframe": keyframe})
+
+    def _messages(self, subscription):
+        """Yield (offset, message) pairs for one connection"""
+        if self.capture_path:
+            for offset, message in read_capture(self.capture_path):
+                if isinstance(message, bytes) and len(message) >= FRAME_HEADER.size:
+                    # Restamp so latency is measured from this send
+                    stream_type, flags, participant_id, _, length = FRAME_HEADER.unpack_from(message)
+                    message = bytearray(message)
+                    FRAME_HEADER.pack_into(message, 0, stream_type, flags, participant_id,
+                                           time.time(), length)
+                yield offset, message
+            return
+        for offset, stream, participant_id, payload, keyframe in self.source.events(self.seconds,
+                                                                                    subscription):
+            yield offset, self._encode(stream, participant_id, payload, keyframe)
+
+    def _apply(self, subscription, request):
+        """Update a connection's subscription from a subscribe/unsubscribe message"""
+        action = request.get("action")
+        for stream in request.get("streams", []):
+            if action == "unsubscribe":
+                subscription.pop(stream.get("type"), None)
+            elif action == "subscribe":
+                subscription[stream.get("type")] = stream.get("options") or {}
+        if action in ("subscribe", "unsubscribe"):
+            self.subscription_messages += 1
+
+    async def _follow_subscription(self, websocket, subscription):
+        async for message in websocket:
+            try:
+                self._apply(subscription, json.loads(message))
+            except (ValueError, AttributeError):
+                logger.warning("Ignoring malformed client message")
+
+    async def _handle(self, websocket, path=None):
+        self.connections += 1
+        follower = None
+        try:
+            subscription = {}
+            self._apply(subscription, json.loads(await asyncio.wait_for(websocket.recv(), 10)))
+            follower = asyncio.create_task(self._follow_subscription(websocket, subscription))
+            key = websocket.request.path
+            skip = self.resume.get(key, 0) if self.drop_every else 0
+            started = None
+            self.live.add(websocket)
+            for index, (offset, message) in enumerate(self._messages(subscription)):
+                if index < skip:
+                    continue
+                if started is None:
+                    # Paced from the resume point rather than catching up on the gap
+                    started = time.monotonic() - (offset / self.speed if self.speed else 0.0)
+                if self.speed:
+                    delay = started + offset / self.speed - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                await websocket.send(message)
+                self.resume[key] = index + 1
+                self.messages += 1
+                self.bytes += len(message)
+            self.live.discard(websocket)
+            async with self._completed:
+                self.completed += 1
+                self.finished.add(key)
+                self._completed.notify_all()
+            if self.hold_open:
+                await websocket.wait_closed()
+        except (websockets.exceptions.ConnectionClosed, asyncio.TimeoutError):
+            pass
+        finally:
+            self.live.discard(websocket)
+            if follower is not None:
+                follower.cancel()
+            if not self.hold_open:
+                await websocket.close()
+
+    def stats(self):
+        return {"connections": self.connections, "completed": self.completed,
+                "messages": self.messages, "bytes": self.bytes,
+                "subscription_messages": self.subscription_messages, "drops": self.drops}
+
+
+async def serve(args):
+    source = None
+    if not args.capture:
+        source = SyntheticSource(args.participants, args.fps, args.width, args.height,
+                                 args.audio, args.transcript_every, hold=args.hold)
+    server = FakeRTMSServer(source, args.capture, args.seconds, args.speed, args.format,
+                            drop_every=args.drop_every)
+    await server.start(args.host, args.port)
+    print(f"Fake RTMS server listening on {server.url}")
+    try:
+        await asyncio.Future()
+    finally:
+        await server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve recorded or synthetic RTMS streams locally")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--capture", help="Replay this capture file instead of synthetic media")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Replay speed multiplier; 0 sends as fast as possible")
+    parser.add_argument("--seconds", type=float, default=60.0, help="Length of synthetic streams")
+    parser.add_argument("--participants", type=int, default=2)
+    parser.add_argument("--fps", type=int, default=15)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--audio", action="store_true", help="Include synthetic PCM audio")
+    parser.add_argument("--hold", type=int, default=1,
+                        help="Repeat each synthetic image for this many frames")
+    parser.add_argument("--transcript-every", type=float, default=0.0,
+                        help="Seconds between synthetic transcript lines (0 disables)")
+    parser.add_argument("--format", choices=(BINARY, JSON), default=BINARY)
+    parser.add_argument("--drop-every", type=float, default=0.0,
+                        help="Close streaming connections every this many seconds (0 never)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
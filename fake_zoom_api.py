@@ -0,0 +1,155 @@
+import sys
+import json
+import time
+import argparse
+import threading
+import http.server
+from urllib.parse import urlsplit
+
+
+class FakeZoomHandler(http.server.BaseHTTPRequestHandler):
+    """Answers the Zoom OAuth and REST calls this app makes with canned JSON"""
+
+    protocol_version = "HTTP/1.1"
+    api = None
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if urlsplit(self.path).path == "/oauth/token":
+            self._send_json(200, {"access_token": "fake-token", "token_type": "bearer",
+                                  "expires_in": 3600})
+        else:
+            self._send_json(*self.api.respond("POST", self.path))
+
+    def do_GET(self):
+        self._send_json(*self.api.respond("GET", self.path))
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeZoomServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for a burst of new connections, as Zoom's load balancers would take
+    request_queue_size = 1024
+
+
+class FakeZoomAPI:
+    """Local stand-in for Zoom's REST API and OAuth token endpoint
+
+    Point ZOOM_API_BASE_URL at `base_url` and ZOOM_TOKEN_URL at `token_url`;
+    RTMS token requests get a token any FakeRTMSServer accepts. Each API call waits `latency`
+    seconds. After `quota` calls every call is throttled with a Retry-After
+    of `quota_reset` seconds, the way Zoom answers once a daily limit is
+    spent; throttle() queues short 429s for the next calls.
+    """
+
+    def __init__(self, latency=0.0, quota=None, quota_reset=3600.0, meetings=3, users=2):
+        self.latency = latency
+        self.quota = quota
+        self.quota_reset = quota_reset
+        self.meetings = meetings
+        self.users = users
+        self.server = None
+        self.requests = 0
+        self.throttled = 0
+        self._throttles = []
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v2"
+
+    @property
+    def token_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/oauth/token"
+
+    def start(self, host="127.0.0.1", port=0):
+        handler = type("Handler", (FakeZoomHandler,), {"api": self})
+        self.server = FakeZoomServer((host, port), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def throttle(self, count, retry_after=1.0):
+        """Answer the next count calls with 429 and this Retry-After"""
+        with self._lock:
+            self._throttles.extend([retry_after] * count)
+
+    def _body(self, path):
+        parts = [part for part in path.split("/") if part]
+        if parts[-1:] == ["meetings"]:
+            return {"meetings": [{"id": 1000 + i, "topic": f"Meeting {i}"}
+                                 for i in range(self.meetings)]}
+        if parts == ["users"]:
+            return {"users": [{"id": f"user-{i}"} for i in range(self.users)], "next_page_token": ""}
+        if parts[-1:] == ["recordings"]:
+            return {"recording_files": []}
+        if parts[:1] == ["rtms"] and parts[-1:] == ["tokens"]:
+            # One token per meeting, so the RTMS server can tell meetings apart by URL
+            return {"token": f"fake-rtms-token-{parts[2]}"}
+        if parts[-1:] == ["participants"]:
+            return {"participants": [], "next_page_token": ""}
+        return {}
+
+    def respond(self, method, path):
+        """(status, body, headers) for one API call"""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            served = self.requests
+            retry_after = self._throttles.pop(0) if self._throttles else None
+        if retry_after is None and self.quota is not None and served > self.quota:
+            retry_after = self.quota_reset
+        if retry_after is not None:
+            with self._lock:
+                self.throttled += 1
+            return 429, {"code": 429, "message": "Too many requests"}, {
+                "Retry-After": str(retry_after), "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Type": "QPS" if retry_after < 60 else "Daily-limit"}
+        headers = {}
+        if self.quota is not None:
+            headers["X-RateLimit-Remaining"] = str(max(self.quota - served, 0))
+        path = urlsplit(path).path
+        if path.startswith("/v2"):
+            path = path[3:]
+        return 200, self._body(path), headers
+
+    def stats(self):
+        return {"requests": self.requests, "throttled": self.throttled}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a fake Zoom REST API locally")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds each API call takes")
+    parser.add_argument("--quota", type=int, help="Calls allowed before every call is throttled")
+    args = parser.parse_args(argv)
+    api = FakeZoomAPI(args.latency, args.quota).start(args.host, args.port)
+    print(f"Fake Zoom API listening on {api.base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
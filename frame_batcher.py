@@ -0,0 +1,158 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 0 disables batched analysis
+BATCH_SIZE = int(os.getenv('VIDEO_ANALYSIS_BATCH', '0'))
+BATCH_DEADLINE_MS = float(os.getenv('VIDEO_ANALYSIS_BATCH_MS', '50'))
+INPUT_SIZE = (224, 224)
+# Batches being filled or inferred at once; more buffers means more overlap
+BUFFERS = 2
+
+
+class FrameBatcher:
+    """Collects frames into preallocated arrays and runs inference per batch
+
+    A batch is flushed when batch_size frames have arrived or deadline_ms
+    after its first frame, whichever comes first. Frames are resized straight
+    into a reused uint8 buffer and normalized into a matching float32 buffer,
+    so no per-frame arrays are allocated. Larger batches raise throughput at
+    the cost of the latency a frame spends waiting for its batch to fill.
+    """
+
+    def __init__(self, infer, batch_size=BATCH_SIZE, deadline_ms=BATCH_DEADLINE_MS,
+                 input_size=INPUT_SIZE, buffers=BUFFERS, mean=0.5, std=0.25):
+        self.infer = infer
+        self.batch_size = max(batch_size, 1)
+        self.deadline = deadline_ms / 1000
+        self.width, self.height = input_size
+        self.scale = 1.0 / (255.0 * std)
+        self.offset = mean / std
+        self.raw = [np.empty((self.batch_size, self.height, self.width), np.uint8)
+                    for _ in range(buffers)]
+        self.normalized = [np.empty((self.batch_size, self.height, self.width), np.float32)
+                           for _ in range(buffers)]
+        self.free = deque(range(buffers))
+        self._buffer_freed = None
+
+        # Batch being filled
+        self.current = None
+        self.futures = []
+        self.enqueued = []
+        self.generation = 0
+        self._timer = None
+        self.running = set()
+
+        # Metrics
+        self.batches = 0
+        self.frames = 0
+        self.wait_total = 0.0
+        self.infer_time = 0.0
+
+    async def _acquire_buffer(self):
+        if self._buffer_freed is None:
+            self._buffer_freed = asyncio.Condition()
+        async with self._buffer_freed:
+            await self._buffer_freed.wait_for(lambda: self.free)
+            return self.free.popleft()
+
+    async def _release_buffer(self, index):
+        async with self._buffer_freed:
+            self.free.append(index)
+            self._buffer_freed.notify()
+
+    async def submit(self, frame):
+        """Add a frame to the current batch and return a future for its result
+
+        Only waits when every buffer is busy, which applies backpressure.
+        """
+        loop = asyncio.get_running_loop()
+        if self.current is None:
+            index = await self._acquire_buffer()
+            if self.current is None:
+                self.current = index
+                self.generation += 1
+                self._timer = loop.call_later(self.deadline, self._flush_due, self.generation)
+            else:
+                # Another frame started a batch while we waited
+                await self._release_buffer(index)
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        slot = self.raw[self.current][len(self.futures)]
+        cv2.resize(frame, (self.width, self.height), dst=slot, interpolation=cv2.INTER_AREA)
+
+        future = loop.create_future()
+        self.futures.append(future)
+        self.enqueued.append(time.monotonic())
+        if len(self.futures) == self.batch_size:
+            self.flush()
+        return future
+
+    def _flush_due(self, generation):
+        if generation == self.generation:
+            self.flush()
+
+    def flush(self):
+        """Send the current batch for inference, full or not"""
+        if self.current is None:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        self.wait_total += sum(now - enqueued for enqueued in self.enqueued)
+        task = asyncio.get_running_loop().create_task(
+            self._run(self.current, self.futures))
+        self.running.add(task)
+        task.add_done_callback(self.running.discard)
+        self.current = None
+        self.futures = []
+        self.enqueued = []
+        self.generation += 1
+
+    def _infer_batch(self, index, count):
+        raw = self.raw[index][:count]
+        normalized = self.normalized[index][:count]
+        # Vectorized normalize: (x / 255 - mean) / std, in place
+        np.multiply(raw, self.scale, out=normalized, casting="unsafe")
+        normalized -= self.offset
+        return self.infer(normalized)
+
+    async def _run(self, index, futures):
+        started = time.monotonic()
+        try:
+            results = await asyncio.to_thread(self._infer_batch, index, len(futures))
+            for future, result in zip(futures, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            logger.error(f"Error running batch inference: {e}")
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            await self._release_buffer(index)
+        self.infer_time += time.monotonic() - started
+        self.batches += 1
+        self.frames += len(futures)
+
+    async def close(self):
+        """Flush the partial batch and wait for inference to finish"""
+        self.flush()
+        if self.running:
+            await asyncio.gather(*self.running, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "frames": self.frames,
+            "avg_batch_size": self.frames / self.batches if self.batches else 0.0,
+            "avg_batch_wait": self.wait_total / self.frames if self.frames else 0.0,
+            "frames_per_second": self.frames / self.infer_time if self.infer_time else 0.0,
+        }
@@ -0,0 +1,100 @@
+import os
+import time
+import hashlib
+import cv2
+import numpy as np
+
+# Drop frames whose compressed bytes match the participant's previous frame
+DEDUP = os.getenv('VIDEO_DEDUP', 'true').lower() == 'true'
+# Skip analysis and saving when this few of the 256 hash bits changed (0 disables).
+# Off by default: at 4 bits, an 80 px object moving 10-20 px per frame on a
+# 320x180 stream already counts as unchanged. Raise it only for mostly static
+# content such as screen shares, where recompression noise is the main change.
+CHANGE_THRESHOLD = int(os.getenv('VIDEO_CHANGE_THRESHOLD', '0'))
+# Let a frame through at least this often even if nothing changed
+MAX_SKIP_SECONDS = float(os.getenv('VIDEO_CHANGE_MAX_SKIP_SECONDS', '10'))
+HASH_SIZE = 16
+
+
+def payload_digest(payload):
+    """Digest of a compressed frame; cheap next to decoding it"""
+    return hashlib.sha1(payload, usedforsecurity=False).digest()
+
+
+def difference_hash(gray, size=HASH_SIZE):
+    """size*size-bit hash of horizontal brightness gradients on a thumbnail
+
+    Robust to recompression noise and small lighting changes, but changes
+    when content moves, a slide advances or someone starts talking.
+    """
+    thumb = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    return np.packbits(thumb[:, 1:] > thumb[:, :-1])
+
+
+def hamming(a, b):
+    return int(np.unpackbits(np.bitwise_xor(a, b)).sum())
+
+
+class FrameFilter:
+    """Decides per participant which frames are worth decoding and processing
+
+    check_payload runs before decoding and drops exact byte duplicates.
+    check_frame runs after decoding and drops frames whose difference hash
+    is within the threshold of the last frame that was kept, so slow drift
+    still accumulates into a change.
+    """
+
+    def __init__(self, dedup=DEDUP, change_threshold=CHANGE_THRESHOLD,
+                 max_skip_seconds=MAX_SKIP_SECONDS):
+        self.dedup = dedup
+        self.change_threshold = change_threshold
+        self.max_skip_seconds = max_skip_seconds
+        self.last_digest = {}
+        self.last_hash = {}
+        self.last_kept = {}
+        self.seen = 0
+        self.duplicates = 0
+        self.unchanged = 0
+
+    def check_payload(self, participant_id, payload):
+        """False if the payload repeats the participant's previous frame exactly"""
+        self.seen += 1
+        if not self.dedup:
+            return True
+        digest = payload_digest(payload)
+        if self.last_digest.get(participant_id) == digest:
+            self.duplicates += 1
+            return False
+        self.last_digest[participant_id] = digest
+        return True
+
+    def check_frame(self, participant_id, gray):
+        """False if the decoded frame barely differs from the last kept one"""
+        if not self.change_threshold:
+            return True
+        frame_hash = difference_hash(gray)
+        previous = self.last_hash.get(participant_id)
+        now = time.monotonic()
+        if (previous is not None and hamming(frame_hash, previous) <= self.change_threshold
+                and now - self.last_kept[participant_id] < self.max_skip_seconds):
+            self.unchanged += 1
+            return False
+        self.last_hash[participant_id] = frame_hash
+        self.last_kept[participant_id] = now
+        return True
+
+    def forget(self, participant_id):
+        """Drop what is remembered about a participant who left"""
+        self.last_digest.pop(participant_id, None)
+        self.last_hash.pop(participant_id, None)
+        self.last_kept.pop(participant_id, None)
+
+    def stats(self):
+        return {
+            "seen": self.seen,
+            "duplicates": self.duplicates,
+            "unchanged": self.unchanged,
+            "duplicate_ratio": self.duplicates / self.seen if self.seen else 0.0,
+            "unchanged_ratio": self.unchanged / self.seen if self.seen else 0.0,
+            "skip_ratio": (self.duplicates + self.unchanged) / self.seen if self.seen else 0.0,
+        }
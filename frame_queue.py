@@ -0,0 +1,112 @@
+import os
+import time
+import asyncio
+from collections import deque, namedtuple
+
+# Overflow policies
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+KEYFRAMES_ONLY = "keyframes_only"
+BLOCK = "block"
+
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, KEYFRAMES_ONLY, BLOCK)
+
+DEFAULT_QUEUE_SIZE = int(os.getenv('RTMS_QUEUE_SIZE', '30'))
+DEFAULT_OVERFLOW_POLICY = os.getenv('RTMS_OVERFLOW_POLICY', DROP_OLDEST)
+
+# meta holds per-frame details passed through to the handler, e.g. participant_id
+QueuedFrame = namedtuple("QueuedFrame", "enqueued_at keyframe payload meta")
+
+
+class FrameQueue:
+    """Bounded frame queue between the websocket reader and a processor
+
+    When full, the overflow policy decides what happens to a new frame:
+    drop_oldest evicts the head, drop_newest discards the new frame,
+    keyframes_only discards non-keyframes and lets keyframes evict the oldest
+    non-keyframe, and block makes the reader wait (backpressure).
+    """
+
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE, policy=DEFAULT_OVERFLOW_POLICY):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.frames = deque()
+        self.closed = False
+        self._cond = asyncio.Condition()
+
+        # Counters
+        self.queued = 0
+        self.dropped = 0
+        self.processed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def _evict_for(self, keyframe):
+        """Make room according to the policy; return False to drop the new frame"""
+        if self.policy == DROP_NEWEST:
+            return False
+        if self.policy == KEYFRAMES_ONLY:
+            if not keyframe:
+                return False
+            for i, frame in enumerate(self.frames):
+                if not frame.keyframe:
+                    del self.frames[i]
+                    return True
+        self.frames.popleft()
+        return True
+
+    async def put(self, payload, keyframe=True, meta=None):
+        """Queue a frame; returns False if it was dropped"""
+        async with self._cond:
+            if self.policy == BLOCK:
+                await self._cond.wait_for(lambda: len(self.frames) < self.maxsize or self.closed)
+            elif len(self.frames) >= self.maxsize:
+                # Either the new frame or an evicted one is lost
+                self.dropped += 1
+                if not self._evict_for(keyframe):
+                    return False
+            if self.closed:
+                return False
+            self.frames.append(QueuedFrame(time.monotonic(), keyframe, payload, meta or {}))
+            self.queued += 1
+            self._cond.notify_all()
+            return True
+
+    async def get(self):
+        """Wait for the next frame; returns None once closed and drained"""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.frames or self.closed)
+            if not self.frames:
+                return None
+            frame = self.frames.popleft()
+            self._cond.notify_all()
+            return frame
+
+    def frame_done(self, frame):
+        """Record that a frame finished processing"""
+        latency = time.monotonic() - frame.enqueued_at
+        self.processed += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    async def close(self):
+        """Stop accepting frames; consumers drain what is left"""
+        async with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        return {
+            "policy": self.policy,
+            "depth": len(self.frames),
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "latency_avg": self.latency_total / self.processed if self.processed else 0.0,
+            "latency_max": self.latency_max,
+        }
@@ -0,0 +1,238 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Output modes
+JPEG = "jpeg"
+SEGMENT = "segment"
+
+OUTPUT_MODES = (JPEG, SEGMENT)
+
+OUTPUT_MODE = os.getenv('VIDEO_OUTPUT_MODE', JPEG)
+BATCH_SIZE = int(os.getenv('VIDEO_WRITE_BATCH', '16'))
+BATCH_DEADLINE_MS = float(os.getenv('VIDEO_WRITE_BATCH_MS', '200'))
+# Decoded frames waiting to be written, in bytes per writer (one writer per participant).
+# 4 MB holds a batch deadline's worth of 720p grayscale frames at 15 fps.
+QUEUE_BYTES = int(os.getenv('VIDEO_WRITE_QUEUE_BYTES', str(4 * 1024 * 1024)))
+SEGMENT_BYTES = int(os.getenv('VIDEO_SEGMENT_BYTES', str(64 * 1024 * 1024)))
+# Sampling: keep every Nth frame, and/or frames whose mean change exceeds the threshold
+SAMPLE_EVERY = int(os.getenv('VIDEO_SAMPLE_EVERY', '1'))
+SCENE_THRESHOLD = float(os.getenv('VIDEO_SCENE_THRESHOLD', '0'))
+JPEG_QUALITY = int(os.getenv('VIDEO_JPEG_QUALITY', '90'))
+
+
+class JpegFileWriter:
+    """One JPEG file per frame, named like the original save_frame output"""
+
+    def __init__(self, output_dir, prefix="frame"):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.frame_count = 0
+
+    def write_batch(self, batch):
+        written = 0
+        for frame, timestamp in batch:
+            stamp = datetime.fromtimestamp(timestamp).strftime("%Y%m%d_%H%M%S")
+            filename = f"{self.output_dir}/{self.prefix}_{stamp}_{self.frame_count}.jpg"
+            ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+            if ok:
+                with open(filename, "wb") as f:
+                    f.write(encoded)
+                written += len(encoded)
+            self.frame_count += 1
+        return written
+
+    def close(self):
+        pass
+
+
+class SegmentFileWriter:
+    """Append-only MJPEG segments with a CSV index of offset,length,timestamp
+
+    A new segment is started once the current one exceeds segment_bytes.
+    """
+
+    def __init__(self, output_dir, prefix="segment", segment_bytes=SEGMENT_BYTES):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.segment_bytes = segment_bytes
+        self.segment_number = 0
+        self.data_file = None
+        self.index_file = None
+        self.offset = 0
+
+    def _open_segment(self):
+        self.close()
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        base = f"{self.output_dir}/{self.prefix}_{stamp}_{self.segment_number}"
+        self.data_file = open(f"{base}.mjpeg", "ab")
+        self.index_file = open(f"{base}.idx", "a")
+        self.offset = self.data_file.tell()
+        self.segment_number += 1
+
+    def write_batch(self, batch):
+        written = 0
+        for frame, timestamp in batch:
+            if self.data_file is None or self.offset >= self.segment_bytes:
+                self._open_segment()
+            ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+            if not ok:
+                continue
+            self.data_file.write(encoded)
+            self.index_file.write(f"{self.offset},{len(encoded)},{timestamp:.6f}\n")
+            self.offset += len(encoded)
+            written += len(encoded)
+        # One flush per batch rather than per frame
+        self.data_file.flush()
+        self.index_file.flush()
+        return written
+
+    def close(self):
+        if self.data_file is not None:
+            self.data_file.close()
+            self.index_file.close()
+            self.data_file = None
+            self.index_file = None
+
+
+class FrameSampler:
+    """Decides which frames are worth writing"""
+
+    def __init__(self, every=SAMPLE_EVERY, scene_threshold=SCENE_THRESHOLD):
+        self.every = max(every, 1)
+        self.scene_threshold = scene_threshold
+        self.seen = 0
+        self.last_thumbnail = None
+
+    def accept(self, frame):
+        self.seen += 1
+        if self.every > 1 and (self.seen - 1) % self.every == 0:
+            return True
+        if self.scene_threshold <= 0:
+            return self.every == 1
+        # Scene change: mean absolute difference of a small thumbnail
+        thumbnail = cv2.resize(frame, (32, 32), interpolation=cv2.INTER_AREA).astype(np.int16)
+        changed = (self.last_thumbnail is None or
+                   np.abs(thumbnail - self.last_thumbnail).mean() > self.scene_threshold)
+        if changed:
+            self.last_thumbnail = thumbnail
+        return changed
+
+
+class BatchedFrameWriter:
+    """Writes frames from a background task in batches off the event loop
+
+    Frames are queued by write(); a background task collects up to
+    batch_size frames or waits batch_deadline_ms, then hands the batch to
+    the output writer on a thread. The queue holds decoded frames, so it is
+    bounded by bytes: frames that would take it past queue_bytes are dropped.
+    """
+
+    def __init__(self, output_dir="video_output", mode=OUTPUT_MODE, batch_size=BATCH_SIZE,
+                 batch_deadline_ms=BATCH_DEADLINE_MS, queue_bytes=QUEUE_BYTES, sampler=None):
+        if mode not in OUTPUT_MODES:
+            raise ValueError(f"Unknown output mode: {mode}")
+        self.writer = JpegFileWriter(output_dir) if mode == JPEG else SegmentFileWriter(output_dir)
+        self.mode = mode
+        self.batch_size = batch_size
+        self.batch_deadline = batch_deadline_ms / 1000
+        self.queue_bytes = queue_bytes
+        self.sampler = sampler or FrameSampler()
+
+        self._queue = None
+        self.queued_bytes = 0
+        self._task = None
+
+        # Metrics
+        self.frames_written = 0
+        self.bytes_written = 0
+        self.frames_skipped = 0
+        self.frames_dropped = 0
+        self.write_time = 0.0
+        self.lag_max = 0.0
+        self.last_lag = 0.0
+
+    def _start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def write(self, frame):
+        """Queue a frame for writing; never blocks on disk"""
+        if not self.sampler.accept(frame):
+            self.frames_skipped += 1
+            return
+        self._start()
+        # An empty queue always takes a frame, however large
+        if self.queued_bytes and self.queued_bytes + frame.nbytes > self.queue_bytes:
+            self.frames_dropped += 1
+            return
+        self.queued_bytes += frame.nbytes
+        self._queue.put_nowait((frame, time.time()))
+
+    async def _collect(self):
+        """Wait for one frame, then gather more until the batch is full or due"""
+        item = await self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.batch_deadline
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                # Flush what we have, then stop
+                self._queue.put_nowait(None)
+                break
+            batch.append(item)
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            if batch is None:
+                return
+            self.queued_bytes -= sum(frame.nbytes for frame, _ in batch)
+            self.last_lag = time.time() - batch[0][1]
+            self.lag_max = max(self.lag_max, self.last_lag)
+            started = time.monotonic()
+            try:
+                self.bytes_written += await asyncio.to_thread(self.writer.write_batch, batch)
+                self.frames_written += len(batch)
+            except Exception as e:
+                logger.error(f"Error writing frames: {e}")
+            self.write_time += time.monotonic() - started
+
+    async def close(self):
+        """Flush queued frames and close the output"""
+        if self._task is not None:
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+        await asyncio.to_thread(self.writer.close)
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "frames_written": self.frames_written,
+            "frames_skipped": self.frames_skipped,
+            "frames_dropped": self.frames_dropped,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_bytes": self.queued_bytes,
+            "queue_lag": self.last_lag,
+            "queue_lag_max": self.lag_max,
+            "write_mb_per_second": (self.bytes_written / self.write_time / 1e6
+                                    if self.write_time else 0.0),
+            "write_fps": self.frames_written / self.write_time if self.write_time else 0.0,
+        }
@@ -0,0 +1,175 @@
+import os
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Execution modes for VideoProcessor
+INLINE = "inline"
+THREAD = "thread"
+PROCESS = "process"
+
+EXECUTION_MODES = (INLINE, THREAD, PROCESS)
+
+EXECUTION_MODE = os.getenv('VIDEO_EXECUTION_MODE', INLINE)
+WORKERS = int(os.getenv('VIDEO_WORKERS', str(os.cpu_count() or 1)))
+# Size of each shared-memory frame buffer used in process mode
+SLOT_SIZE = int(os.getenv('VIDEO_SHM_SLOT_BYTES', str(8 * 1024 * 1024)))
+
+
+def decode_frame(data):
+    """Decode a compressed frame and convert it to grayscale"""
+    np_arr = np.frombuffer(data, np.uint8)
+    frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+    if frame is None:
+        return None
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+def decode_shared_frame(in_name, length, out_name):
+    """Worker-process entry point: decode from one shared block into another
+
+    Returns the shape of the decoded frame written to the output block, or
+    None if the frame could not be decoded.
+    """
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        with in_shm.buf[:length] as payload:
+            frame = decode_frame(payload)
+        if frame is None:
+            return None
+        if frame.nbytes > out_shm.size:
+            raise ValueError(f"Decoded frame ({frame.nbytes} bytes) exceeds shared slot")
+        out = np.ndarray(frame.shape, frame.dtype, buffer=out_shm.buf)
+        out[...] = frame
+        del out
+        return frame.shape
+    finally:
+        in_shm.close()
+        out_shm.close()
+
+
+class FrameWorkerPool:
+    """Runs frame decoding off the event loop thread
+
+    Thread mode suits OpenCV calls, which release the GIL. Process mode passes
+    frames through preallocated shared-memory slots instead of pickling them,
+    for analysis too heavy to share one interpreter.
+    """
+
+    def __init__(self, mode=THREAD, workers=WORKERS, slot_size=SLOT_SIZE):
+        if mode not in (THREAD, PROCESS):
+            raise ValueError(f"Unsupported worker mode: {mode}")
+        self.mode = mode
+        self.workers = workers
+        self.slot_size = slot_size
+        self.slots = []
+        if mode == THREAD:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="frame-worker")
+        else:
+            # Spawned, not forked: the parent runs an event loop and other threads
+            self.executor = ProcessPoolExecutor(max_workers=workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+            # Two input/output slot pairs per worker keeps every worker busy
+            for _ in range(workers * 2):
+                self.slots.append((
+                    shared_memory.SharedMemory(create=True, size=slot_size),
+                    shared_memory.SharedMemory(create=True, size=slot_size),
+                ))
+        self._free_slots = deque(self.slots)
+        self._slot_available = None
+
+    async def _acquire_slot(self):
+        if self._slot_available is None:
+            self._slot_available = asyncio.Semaphore(len(self.slots))
+        await self._slot_available.acquire()
+        return self._free_slots.popleft()
+
+    def _release_slot(self, slot):
+        self._free_slots.append(slot)
+        self._slot_available.release()
+
+    async def decode(self, data):
+        """Decode a frame on a worker and return the grayscale array"""
+        loop = asyncio.get_running_loop()
+        if self.mode == THREAD or len(data) > self.slot_size:
+            if self.mode == PROCESS:
+                # Too big for a slot; fall back to pickling the payload
+                return await loop.run_in_executor(self.executor, decode_frame, bytes(data))
+            return await loop.run_in_executor(self.executor, decode_frame, data)
+
+        slot = await self._acquire_slot()
+        in_shm, out_shm = slot
+        try:
+            in_shm.buf[:len(data)] = data
+            shape = await loop.run_in_executor(
+                self.executor, decode_shared_frame, in_shm.name, len(data), out_shm.name)
+            if shape is None:
+                return None
+            # Copy out so the slot can be reused while the frame is saved
+            return np.ndarray(shape, np.uint8, buffer=out_shm.buf).copy()
+        finally:
+            self._release_slot(slot)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        for in_shm, out_shm in self.slots:
+            for shm in (in_shm, out_shm):
+                shm.close()
+                shm.unlink()
+        self.slots = []
+
+
+class OrderedResults:
+    """Emits completed futures per key in the order they were submitted
+
+    Frames for one participant may finish out of order on a pool; this keeps
+    their output ordered while different participants proceed independently.
+    emit is called as emit(result, key).
+    """
+
+    def __init__(self, emit):
+        self.emit = emit
+        self.pending = {}
+        self.drainers = {}
+
+    def add(self, key, future):
+        queue = self.pending.setdefault(key, deque())
+        queue.append(future)
+        drainer = self.drainers.get(key)
+        if drainer is None or drainer.done():
+            self.drainers[key] = asyncio.create_task(self._drain(key))
+
+    async def _drain(self, key):
+        queue = self.pending[key]
+        while queue:
+            future = queue[0]
+            try:
+                result = await future
+                await self.emit(result, key)
+            except Exception as e:
+                logger.error(f"Error processing frame: {e}")
+            queue.popleft()
+
+    async def release(self, key):
+        """Wait for a key's submitted frames, then forget the key; False if new ones arrived"""
+        drainer = self.drainers.get(key)
+        if drainer is not None:
+            await drainer
+        if self.pending.get(key) or self.drainers.get(key) is not drainer:
+            return False
+        self.pending.pop(key, None)
+        self.drainers.pop(key, None)
+        return True
+
+    async def join(self):
+        """Wait until every submitted frame has been emitted"""
+        while any(not drainer.done() for drainer in self.drainers.values()):
+            await asyncio.gather(*self.drainers.values())
@@ -1,24 +1,20 @@
-import requests
-from requests.auth import HTTPBasicAuth
+import time
 from dotenv import load_dotenv
-import os
 
+# Settings are read when modules are imported, so .env is loaded first
 load_dotenv()
 
-ACCOUNT_ID = os.getenv('ZOOM_ACCOUNT_ID')
-CLIENT_ID = os.getenv('ZOOM_CLIENT_ID')
-CLIENT_SECRET = os.getenv('ZOOM_CLIENT_SECRET')
+from zoom_auth import token_provider
 
 def get_access_token():
 
-    url = f"https://zoom.us/oauth/token?grant_type=account_credentials&account_id={ACCOUNT_ID}"
-    
-    try:
-        response = requests.post(url, auth=HTTPBasicAuth(CLIENT_ID, CLIENT_SECRET))
-        response.raise_for_status()  
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        return {"error": "request_failed", "reason": str(e)}
+    token = token_provider.get_access_token()
+    if token:
+        return {
+            "access_token": token,
+            "expires_in": int(token_provider.expires_at - time.time()),
+        }
+    return token_provider.last_error or {"error": "request_failed", "reason": "no access token"}
 
 if __name__ == "__main__":
     
@@ -0,0 +1,229 @@
+import os
+import time
+import bisect
+
+# Sampled hot-path log lines are emitted at most once per interval per key
+LOG_SAMPLE_INTERVAL = float(os.getenv('METRICS_LOG_INTERVAL', '10'))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Metric:
+    """A named metric family with a fixed set of label names
+
+    Hot paths should bind labels once with labels() and keep the child,
+    which makes each update a single attribute increment.
+    """
+
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self.children[values] = self._child()
+        return child
+
+    def remove(self, *values):
+        """Drop a labelled series, e.g. when its meeting ends"""
+        self.children.pop(values, None)
+
+    def _samples(self, values, child):
+        return [(self.name, dict(zip(self.labelnames, values)), child.value)]
+
+    def collect(self):
+        samples = []
+        for values, child in list(self.children.items()):
+            samples.extend(self._samples(values, child))
+        return {"name": self.name, "type": self.kind, "help": self.help, "samples": samples}
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def _samples(self, values, child):
+        labels = dict(zip(self.labelnames, values))
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), child.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            samples.append((f"{self.name}_bucket", {**labels, "le": le}, cumulative))
+        samples.append((f"{self.name}_sum", labels, child.sum))
+        samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+def family(name, kind, help, samples):
+    """Build a family from (labels, value) pairs, for collectors reporting existing stats"""
+    return {"name": name, "type": kind, "help": help,
+            "samples": [(name, labels, value) for labels, value in samples]}
+
+
+class Registry:
+    """Process-wide metrics plus collectors that report state at scrape time
+
+    Collectors are callables returning a list of families; they let
+    components expose counters they already keep (queue depth, drops,
+    rate-limit state) without touching their hot paths.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def snapshot(self):
+        """All families as plain data, e.g. to send from a worker process"""
+        families = [metric.collect() for metric in list(self.metrics.values())]
+        for collector in self.collectors:
+            families.extend(collector())
+        return families
+
+    def render(self, extra=()):
+        """Prometheus text exposition format"""
+        merged = {}
+        for fam in list(self.snapshot()) + list(extra):
+            entry = merged.setdefault(fam["name"], {**fam, "samples": []})
+            entry["samples"].extend(fam["samples"])
+        lines = []
+        for fam in merged.values():
+            lines.append(f"# HELP {fam['name']} {fam['help']}")
+            lines.append(f"# TYPE {fam['name']} {fam['type']}")
+            for name, labels, value in fam["samples"]:
+                if value is None:
+                    continue
+                lines.append(f"{name}{_format_labels(labels)} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def with_labels(families, **labels):
+    """Copy families adding labels to every sample, e.g. the worker they came from"""
+    return [{**fam, "samples": [(name, {**sample_labels, **labels}, value)
+                                for name, sample_labels, value in fam["samples"]]}
+            for fam in families]
+
+
+registry = Registry()
+
+_last_logged = {}
+
+
+def log_sampled(logger, key, level, message, *args, interval=LOG_SAMPLE_INTERVAL):
+    """Log at most once per interval for key; formatting is skipped otherwise"""
+    if not logger.isEnabledFor(level):
+        return
+    now = time.monotonic()
+    if now - _last_logged.get(key, 0.0) < interval:
+        return
+    _last_logged[key] = now
+    logger.log(level, message, *args)
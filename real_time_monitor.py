@@ -1,70 +1,154 @@
 import os
-import requests
 import time
+import asyncio
 from dotenv import load_dotenv
-from requests.auth import HTTPBasicAuth
 
+# Settings are read when modules are imported, so .env is loaded first
 load_dotenv()
 
-ACCOUNT_ID = os.getenv('ZOOM_ACCOUNT_ID')
-CLIENT_ID = os.getenv('ZOOM_CLIENT_ID')
-CLIENT_SECRET = os.getenv('ZOOM_CLIENT_SECRET')
-
-def get_access_token():
-    url = f"https://zoom.us/oauth/token?grant_type=account_credentials&account_id={ACCOUNT_ID}"
-    response = requests.post(url, auth=HTTPBasicAuth(CLIENT_ID, CLIENT_SECRET))
-    return response.json().get('access_token')
-
-def monitor_active_meetings():
-    access_token = get_access_token()
-    if not access_token:
-        print("Failed to get access token")
-        return
-    
-    headers = {"Authorization": f"Bearer {access_token}"}
-    
-    # Get user ID
-    user_response = requests.get("https://api.zoom.us/v2/users/me", headers=headers)
-    if user_response.status_code != 200:
-        print(f"Failed to get user info: {user_response.status_code}")
-        return
-    
-    user_id = user_response.json().get('id')
-    
+from zoom_api import zoom_api
+
+# Polling interval bounds in seconds; the sweep adapts between them
+MIN_POLL_INTERVAL = float(os.getenv('MONITOR_MIN_INTERVAL', '15'))
+MAX_POLL_INTERVAL = float(os.getenv('MONITOR_MAX_INTERVAL', '60'))
+# Concurrent meeting/participant lookups per sweep
+PARTICIPANT_CONCURRENCY = int(os.getenv('MONITOR_CONCURRENCY', '10'))
+PAGE_SIZE = 300
+
+class SweepError(Exception):
+    """A Zoom call failed, so the sweep's view of the account is incomplete"""
+
+async def fetch_all_pages(path, key, params=None):
+    """Follow next_page_token until every page of a list endpoint is read
+
+    Raises SweepError on any failed page rather than returning a partial list.
+    """
+    params = dict(params or {}, page_size=PAGE_SIZE)
+    items = []
+    while True:
+        response = await zoom_api.get(path, params=params)
+        if response.status_code != 200:
+            raise SweepError(f"Failed to get {path}: {response.status_code}")
+        data = response.json()
+        items.extend(data.get(key, []))
+        next_page_token = data.get("next_page_token")
+        if not next_page_token:
+            return items
+        params["next_page_token"] = next_page_token
+
+async def gather_or_cancel(coros):
+    """gather() that cancels the remaining lookups once one of them fails"""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def fetch_user_meetings(user_id, semaphore):
+    async with semaphore:
+        return await fetch_all_pages(f"/users/{user_id}/meetings", "meetings", {"type": "live"})
+
+async def fetch_live_meetings(semaphore):
+    """Get live meetings for every user in the account"""
+    users = await fetch_all_pages("/users", "users", {"status": "active"})
+    pages = await gather_or_cancel(
+        fetch_user_meetings(user["id"], semaphore) for user in users
+    )
+    meetings = {}
+    for page in pages:
+        for meeting in page:
+            meetings[meeting.get("id")] = meeting
+    return meetings
+
+async def fetch_participants(meeting_id, semaphore):
+    async with semaphore:
+        participants = await fetch_all_pages(
+            f"/metrics/meetings/{meeting_id}/participants", "participants", {"type": "live"})
+    return meeting_id, participants
+
+def summarize(meeting, participants):
+    """State we compare between sweeps to decide whether a meeting changed"""
+    return {
+        "topic": meeting.get("topic"),
+        "participants": frozenset(
+            p.get("user_id") or p.get("id") or p.get("user_name") for p in participants
+        ),
+    }
+
+def next_interval(sweep_duration, changed, interval):
+    """Poll faster while meetings are changing, back off when idle or slow"""
+    if changed:
+        interval = interval / 2
+    else:
+        interval = interval * 1.5
+    # Never schedule sweeps closer together than a sweep takes
+    interval = max(interval, sweep_duration * 2)
+    return min(max(interval, MIN_POLL_INTERVAL), MAX_POLL_INTERVAL)
+
+async def sweep(previous, semaphore):
+    """Poll all live meetings and return (state, changed, ended, stats)"""
+    started = time.monotonic()
+    meetings = await fetch_live_meetings(semaphore)
+    results = await gather_or_cancel(
+        fetch_participants(meeting_id, semaphore) for meeting_id in meetings
+    )
+
+    state = {}
+    changed = []
+    for meeting_id, participants in results:
+        state[meeting_id] = summarize(meetings[meeting_id], participants)
+        if previous.get(meeting_id) != state[meeting_id]:
+            changed.append(meeting_id)
+    ended = [meeting_id for meeting_id in previous if meeting_id not in state]
+
+    duration = time.monotonic() - started
+    stats = {
+        "duration": duration,
+        "meetings": len(state),
+        "meetings_per_second": len(state) / duration if duration else 0.0,
+    }
+    return state, changed, ended, stats
+
+async def monitor_active_meetings():
+    semaphore = asyncio.Semaphore(PARTICIPANT_CONCURRENCY)
+    previous = {}
+    interval = MAX_POLL_INTERVAL
+
     # Monitor active meetings
     while True:
         try:
-            # Get live meetings
-            meetings_url = f"https://api.zoom.us/v2/users/{user_id}/meetings"
-            meetings_response = requests.get(meetings_url, headers=headers, 
-                                           params={"type": "live"})
-            
-            if meetings_response.status_code == 200:
-                meetings = meetings_response.json().get("meetings", [])
-                
-                for meeting in meetings:
-                    meeting_id = meeting.get("id")
-                    print(f"Active meeting: {meeting.get('topic')} (ID: {meeting_id})")
-                    
-                    # Get meeting participants
-                    participants_url = f"https://api.zoom.us/v2/metrics/meetings/{meeting_id}/participants"
-                    participants_response = requests.get(participants_url, headers=headers)
-                    
-                    if participants_response.status_code == 200:
-                        participants = participants_response.json().get("participants", [])
-                        print(f"  Participants: {len(participants)}")
-                        
-                        # Here you would implement your real-time monitoring logic
-                        # For example, saving participant data, checking video status, etc.
-            else:
-                print(f"Failed to get meetings: {meetings_response.status_code}")
-            
-            # Check every 60 seconds
-            time.sleep(60)
-            
+            state, changed, ended, stats = await sweep(previous, semaphore)
+
+            for meeting_id in changed:
+                meeting = state[meeting_id]
+                print(f"Active meeting: {meeting['topic']} (ID: {meeting_id})")
+                print(f"  Participants: {len(meeting['participants'])}")
+
+                # Here you would implement your real-time monitoring logic
+                # For example, saving participant data, checking video status, etc.
+
+            for meeting_id in ended:
+                print(f"Meeting ended: {previous[meeting_id]['topic']} (ID: {meeting_id})")
+
+            previous = state
+            interval = next_interval(stats["duration"], changed or ended, interval)
+            print(f"Sweep: {stats['meetings']} meetings in {stats['duration']:.2f}s "
+                  f"({stats['meetings_per_second']:.1f}/s), next in {interval:.0f}s")
+
         except Exception as e:
-            print(f"Error monitoring meetings: {e}")
-            time.sleep(60)
+            # A partial sweep would report meetings as ended or changed; keep the last state
+            print(f"Error monitoring meetings, sweep discarded: {e}")
+            interval = MAX_POLL_INTERVAL
+
+        await asyncio.sleep(interval)
+
+async def main():
+    try:
+        await monitor_active_meetings()
+    finally:
+        await zoom_api.aclose()
 
 if __name__ == "__main__":
-    monitor_active_meetings()
+    asyncio.run(main())
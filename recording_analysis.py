@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+RECORDING_ANALYSIS = os.getenv('RECORDING_ANALYSIS', 'false').lower() == 'true'
+# Analyze one frame out of this many
+SAMPLE_EVERY = int(os.getenv('RECORDING_SAMPLE_EVERY', '30'))
+ANALYSIS_WORKERS = int(os.getenv('RECORDING_ANALYSIS_WORKERS', str(os.cpu_count() or 1)))
+# Beyond this gap a seek is cheaper than grabbing every frame in between
+SEEK_THRESHOLD = 60
+
+
+def video_info(path):
+    # OpenCV is imported on use so the web app can import this module cheaply
+    import cv2
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open video: {path}")
+        return int(capture.get(cv2.CAP_PROP_FRAME_COUNT)), capture.get(cv2.CAP_PROP_FPS) or 30.0
+    finally:
+        capture.release()
+
+
+def analyze_range(path, start, end, sample_every=SAMPLE_EVERY, faces=False):
+    """Analyze sampled frames in [start, end) of a video; runs in a worker process"""
+    # Imported here so worker processes pay for it only when used
+    import cv2
+    from video_processor import VideoProcessor
+    from face_detection import detect_faces
+
+    capture = cv2.VideoCapture(path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    results = []
+    decoded = 0
+    try:
+        # First sampled frame at or after start, aligned to the global grid
+        index = start + (-start) % sample_every
+        position = None
+        while index < end:
+            if position is None or index - position > SEEK_THRESHOLD:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+            else:
+                # Grabbing skips decoding the frames we don't analyze
+                for _ in range(index - position):
+                    capture.grab()
+            ok, frame = capture.read()
+            if not ok:
+                break
+            position = index + 1
+            decoded += 1
+
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            result = {
+                "frame": index,
+                "timestamp": index / fps,
+                "brightness": float(gray.mean()),
+                "analysis": VideoProcessor.analyze_frame(frame),
+            }
+            if faces:
+                result["faces"] = len(detect_faces(gray))
+            results.append(result)
+            index += sample_every
+    finally:
+        capture.release()
+    return results, decoded
+
+
+def split_ranges(frame_count, parts):
+    step = max(frame_count // parts, 1)
+    return [(start, min(start + step, frame_count)) for start in range(0, frame_count, step)]
+
+
+def analyze_recording(path, sample_every=SAMPLE_EVERY, workers=ANALYSIS_WORKERS, faces=False):
+    """Analyze a recording, splitting it into time ranges processed in parallel
+
+    Per-range results are merged in frame order.
+    """
+    started = time.monotonic()
+    frame_count, fps = video_info(path)
+    if workers <= 1:
+        results, decoded = analyze_range(path, 0, frame_count, sample_every, faces)
+    else:
+        # More ranges than workers evens out ranges that decode slower
+        ranges = split_ranges(frame_count, workers * 2)
+        # Spawned, not forked: this may run from a thread inside the web process
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            parts = list(executor.map(analyze_range, [path] * len(ranges),
+                                      [start for start, _ in ranges], [end for _, end in ranges],
+                                      [sample_every] * len(ranges), [faces] * len(ranges)))
+        results = [result for part, _ in parts for result in part]
+        decoded = sum(count for _, count in parts)
+    elapsed = time.monotonic() - started
+    return {
+        "path": path,
+        "frames": frame_count,
+        "duration": frame_count / fps,
+        "sampled": len(results),
+        "seconds": elapsed,
+        "frames_per_second": decoded / elapsed if elapsed else 0.0,
+        "results": results,
+    }
+
+
+async def analyze_recording_async(path, **kwargs):
+    """Run analyze_recording without blocking the event loop, saving results as JSON"""
+    report = await asyncio.to_thread(analyze_recording, path, **kwargs)
+    output_path = os.path.splitext(path)[0] + ".analysis.json"
+    with open(output_path, "w") as f:
+        json.dump(report, f)
+    logger.info(f"Analyzed {path}: {report['sampled']} frames in {report['seconds']:.1f}s "
+                f"({report['frames_per_second']:.1f} frames/s)")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a recorded meeting video")
+    parser.add_argument("path")
+    parser.add_argument("--sample-every", type=int, default=SAMPLE_EVERY)
+    parser.add_argument("--workers", type=int, default=ANALYSIS_WORKERS)
+    parser.add_argument("--faces", action="store_true", help="Count faces in sampled frames")
+    parser.add_argument("--compare", action="store_true",
+                        help="Also run sequentially and report the speedup")
+    parser.add_argument("--output", help="Write per-frame results to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = analyze_recording(args.path, args.sample_every, args.workers, args.faces)
+    print(f"{report['sampled']} frames sampled in {report['seconds']:.2f}s "
+          f"({report['frames_per_second']:.1f} frames/s) with {args.workers} workers")
+    if args.compare:
+        baseline = analyze_recording(args.path, args.sample_every, 1, args.faces)
+        print(f"Sequential: {baseline['seconds']:.2f}s "
+              f"({baseline['frames_per_second']:.1f} frames/s); "
+              f"speedup {baseline['seconds'] / report['seconds']:.2f}x")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
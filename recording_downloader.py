@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import resource
+import httpx
+from zoom_auth import token_provider
+
+logger = logging.getLogger(__name__)
+
+RECORDINGS_DIR = os.getenv('RECORDINGS_DIR', 'recordings')
+# Each file is split into ranges of this size, fetched in parallel
+PART_SIZE = int(os.getenv('RECORDING_PART_SIZE', str(32 * 1024 * 1024)))
+PARTS_PER_FILE = int(os.getenv('RECORDING_PARTS_PER_FILE', '4'))
+MAX_CONCURRENT_FILES = int(os.getenv('RECORDING_CONCURRENT_FILES', '2'))
+CHUNK_SIZE = 1024 * 1024
+# Persist resume progress after this many bytes per part
+PROGRESS_INTERVAL = 8 * 1024 * 1024
+DOWNLOAD_TIMEOUT = float(os.getenv('RECORDING_DOWNLOAD_TIMEOUT', '60'))
+
+
+class DownloadError(Exception):
+    pass
+
+
+async def pwrite(fd, data, offset):
+    """os.pwrite on a thread; a cancelled caller still waits for the write to land
+
+    The descriptor is closed once the download returns, so no write may
+    outlive its caller and hit a reused descriptor.
+    """
+    write = asyncio.ensure_future(asyncio.to_thread(os.pwrite, fd, data, offset))
+    try:
+        return await asyncio.shield(write)
+    except asyncio.CancelledError:
+        await write
+        raise
+
+
+class RecordingDownloader:
+    """Streams recording files to disk with parallel HTTP range requests
+
+    Each file is written in place to a preallocated .part file, with
+    completed bytes per range tracked in a .progress sidecar so an
+    interrupted download resumes where it stopped. Nothing is buffered in
+    memory beyond one chunk per active range.
+    """
+
+    def __init__(self, output_dir=RECORDINGS_DIR, part_size=PART_SIZE,
+                 parts_per_file=PARTS_PER_FILE, max_files=MAX_CONCURRENT_FILES):
+        self.output_dir = output_dir
+        self.part_size = part_size
+        self.parts_per_file = parts_per_file
+        self.max_files = max_files
+
+    async def _headers(self, token=None):
+        # A webhook's download_token works in place of the OAuth token
+        token = token or await token_provider.get_access_token_async()
+        return {"Authorization": f"Bearer {token}"}
+
+    async def _probe(self, client, url, token=None):
+        """Return (size, supports_ranges) by asking for the first byte"""
+        headers = await self._headers(token)
+        headers["Range"] = "bytes=0-0"
+        async with client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 206:
+                total = response.headers.get("Content-Range", "").rpartition("/")[2]
+                return (int(total) if total.isdigit() else None), True
+            response.raise_for_status()
+            return int(response.headers.get("Content-Length", 0)) or None, False
+
+    @staticmethod
+    def _load_progress(progress_path, ranges):
+        try:
+            with open(progress_path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return [0] * len(ranges)
+        if saved.get("ranges") != ranges:
+            return [0] * len(ranges)
+        return saved["done"]
+
+    @staticmethod
+    def _save_progress(progress_path, ranges, done):
+        tmp_path = progress_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"ranges": ranges, "done": done}, f)
+        os.replace(tmp_path, progress_path)
+
+    async def _fetch_range(self, client, url, fd, index, ranges, done, save, semaphore, token=None):
+        start, end = ranges[index]
+        if start + done[index] > end:
+            return
+        async with semaphore:
+            headers = await self._headers(token)
+            headers["Range"] = f"bytes={start + done[index]}-{end}"
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code != 206:
+                    raise DownloadError(f"Range request returned {response.status_code}")
+                since_save = 0
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    await pwrite(fd, chunk, start + done[index])
+                    done[index] += len(chunk)
+                    since_save += len(chunk)
+                    if since_save >= PROGRESS_INTERVAL:
+                        await save()
+                        since_save = 0
+
+    async def _fetch_whole(self, client, url, fd, token=None):
+        """Fallback for servers without range support"""
+        offset = 0
+        async with client.stream("GET", url, headers=await self._headers(token)) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                await pwrite(fd, chunk, offset)
+                offset += len(chunk)
+        return offset
+
+    @staticmethod
+    def _sha256(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    async def download_file(self, client, url, path, expected_size=None, sha256=None, token=None):
+        """Download one file, resuming a previous partial download if present"""
+        started = time.monotonic()
+        part_path = path + ".part"
+        progress_path = path + ".progress"
+        size, ranged = await self._probe(client, url, token)
+        size = expected_size or size
+
+        fd = os.open(part_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if size and ranged:
+                await asyncio.to_thread(os.ftruncate, fd, size)
+                ranges = [[start, min(start + self.part_size, size) - 1]
+                          for start in range(0, size, self.part_size)]
+                done = self._load_progress(progress_path, ranges)
+
+                async def save():
+                    await asyncio.to_thread(self._save_progress, progress_path, ranges, list(done))
+
+                semaphore = asyncio.Semaphore(self.parts_per_file)
+                tasks = [asyncio.ensure_future(
+                    self._fetch_range(client, url, fd, index, ranges, done, save, semaphore, token))
+                    for index in range(len(ranges))]
+                try:
+                    await asyncio.gather(*tasks)
+                finally:
+                    # One range failing must stop the others before fd is closed
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                    # Keep whatever finished so the next attempt can resume
+                    await save()
+                written = sum(done)
+            else:
+                await asyncio.to_thread(os.ftruncate, fd, 0)
+                written = await self._fetch_whole(client, url, fd, token)
+        finally:
+            os.close(fd)
+
+        if size and written != size:
+            raise DownloadError(f"{path}: expected {size} bytes, got {written}")
+        if sha256 and await asyncio.to_thread(self._sha256, part_path) != sha256:
+            os.remove(part_path)
+            raise DownloadError(f"{path}: checksum mismatch")
+        os.replace(part_path, path)
+        if os.path.exists(progress_path):
+            os.remove(progress_path)
+
+        elapsed = time.monotonic() - started
+        return {
+            "path": path,
+            "bytes": written,
+            "seconds": elapsed,
+            "mb_per_second": written / elapsed / 1e6 if elapsed else 0.0,
+        }
+
+    async def download_recording(self, meeting_id, recording_files, download_token=None):
+        """Download every completed file of a meeting's recording
+
+        download_token is the token Zoom sends with recording.completed;
+        without one the shared OAuth token is used.
+        """
+        meeting_dir = os.path.join(self.output_dir, str(meeting_id))
+        os.makedirs(meeting_dir, exist_ok=True)
+        semaphore = asyncio.Semaphore(self.max_files)
+        timeout = httpx.Timeout(DOWNLOAD_TIMEOUT)
+
+        async def fetch(client, recording_file):
+            extension = (recording_file.get("file_extension") or "bin").lower()
+            path = os.path.join(meeting_dir, f"{recording_file.get('id')}.{extension}")
+            if os.path.exists(path):
+                return {"path": path, "bytes": os.path.getsize(path), "skipped": True}
+            async with semaphore:
+                try:
+                    return await self.download_file(client, recording_file["download_url"], path,
+                                                    expected_size=recording_file.get("file_size"),
+                                                    token=download_token)
+                except (httpx.HTTPError, DownloadError) as e:
+                    logger.error(f"Failed to download {path}: {e}")
+                    return {"path": path, "error": str(e)}
+
+        files = [f for f in recording_files
+                 if f.get("download_url") and f.get("status", "completed") == "completed"]
+        async with httpx.AsyncClient(http2=True, follow_redirects=True, timeout=timeout) as client:
+            results = await asyncio.gather(*(fetch(client, f) for f in files))
+
+        # ru_maxrss is in kilobytes on Linux
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        total = sum(r.get("bytes", 0) for r in results if not r.get("skipped"))
+        logger.info(f"Downloaded {total / 1e6:.1f} MB for meeting {meeting_id}; "
+                    f"peak RSS {peak_rss_mb:.0f} MB")
+        return results
+
+
+recording_downloader = RecordingDownloader()
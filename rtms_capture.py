@@ -0,0 +1,62 @@
+import os
+import time
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Save every RTMS message of a session to <output dir>/rtms.capture for replay
+CAPTURE_ENABLED = os.getenv('RTMS_CAPTURE', 'false').lower() == 'true'
+CAPTURE_FILENAME = "rtms.capture"
+
+# File layout: MAGIC, then one record per websocket message:
+#   offset  f64  (seconds since the capture started)
+#   kind    u8   (0 = text, 1 = binary)
+#   length  u32
+# followed by the message bytes (UTF-8 for text).
+MAGIC = b"RTMSCAP1"
+RECORD_HEADER = struct.Struct("!dBI")
+TEXT = 0
+BINARY = 1
+
+
+class CaptureWriter:
+    """Appends websocket messages with their arrival time to a capture file"""
+
+    def __init__(self, path, buffer_size=1024 * 1024):
+        self.path = path
+        self.file = open(path, "wb", buffering=buffer_size)
+        self.file.write(MAGIC)
+        self.started = time.monotonic()
+        self.messages = 0
+
+    def record(self, message):
+        if isinstance(message, str):
+            kind, data = TEXT, message.encode("utf-8")
+        else:
+            kind, data = BINARY, message
+        self.file.write(RECORD_HEADER.pack(time.monotonic() - self.started, kind, len(data)))
+        self.file.write(data)
+        self.messages += 1
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+            logger.info(f"Captured {self.messages} RTMS messages to {self.path}")
+
+
+def read_capture(path):
+    """Yield (offset, message) pairs; text messages come back as str"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not an RTMS capture file: {path}")
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            offset, kind, length = RECORD_HEADER.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                logger.warning(f"Truncated record at the end of {path}")
+                return
+            yield offset, data.decode("utf-8") if kind == TEXT else data
@@ -1,55 +1,101 @@
 import os
 import json
+import time
+import random
 import asyncio
 import websockets
-import requests
+import httpx
 import logging
-from dotenv import load_dotenv
-from requests.auth import HTTPBasicAuth
+from zoom_auth import token_provider
+from zoom_api import zoom_api
+from rtms_frames import parse_binary_frame
+from frame_queue import FrameQueue, DEFAULT_QUEUE_SIZE, DEFAULT_OVERFLOW_POLICY
+from stream_lanes import (Lane, FairScheduler, merge_queue_stats, retire_lane, LANE_STREAMS,
+                          LANE_CONCURRENCY, LANE_IDLE_TIMEOUT)
+from metrics import registry, log_sampled
+from stream_profiles import get_profile, profile_streams, DEFAULT_PROFILE
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+RTMS_URL = os.getenv('ZOOM_RTMS_URL', "wss://rtms.zoom.us/v1")
+# Keepalive: ping this often and treat the connection as dead if no pong arrives in time
+PING_INTERVAL = float(os.getenv('RTMS_PING_INTERVAL', '20'))
+PING_TIMEOUT = float(os.getenv('RTMS_PING_TIMEOUT', '20'))
+# Reconnect backoff and the number of consecutive failures before giving up
+RECONNECT_BASE_DELAY = float(os.getenv('RTMS_RECONNECT_BASE_DELAY', '0.5'))
+RECONNECT_MAX_DELAY = float(os.getenv('RTMS_RECONNECT_MAX_DELAY', '30'))
+MAX_RECONNECT_ATTEMPTS = int(os.getenv('RTMS_MAX_RECONNECT_ATTEMPTS', '20'))
 
-# Zoom API credentials
-ACCOUNT_ID = os.getenv('ZOOM_ACCOUNT_ID')
-CLIENT_ID = os.getenv('ZOOM_CLIENT_ID')
-CLIENT_SECRET = os.getenv('ZOOM_CLIENT_SECRET')
+MESSAGES = registry.counter("rtms_messages_total", "RTMS messages received", ["stream"])
+BYTES = registry.counter("rtms_bytes_total", "RTMS payload bytes received", ["stream"])
+RECONNECTS = registry.counter("rtms_reconnects_total", "RTMS reconnects after a dropped connection")
+RESUBSCRIBES = registry.counter("rtms_resubscribes_total", "Subscription profile changes", ["profile"])
+
+def is_auth_failure(error):
+    """Whether a websocket handshake error means our RTMS token was rejected"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status in (401, 403)
 
 class ZoomRTMSClient:
-    def __init__(self):
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE, overflow_policy=DEFAULT_OVERFLOW_POLICY,
+                 capture=None, profile=None):
         self.access_token = None
         self.rtms_token = None
         self.websocket = None
         self.meeting_id = None
-        self.rtms_url = "wss://rtms.zoom.us/v1"
+        self.rtms_url = RTMS_URL
+        self.closing = False
+        self._closed_event = None
+
+        # Reconnect metrics
+        self.reconnects = 0
+        self.last_recovery_time = None
+        self.total_downtime = 0.0
+
+        # Per-lane frame queues decouple the socket reader from processing. Lanes
+        # are keyed by (stream, participant_id) for streams in LANE_STREAMS and
+        # (stream, None) otherwise; lanes of one stream share a fair scheduler.
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.lanes = {}
+        self.schedulers = {}
+        # Lanes idle past the timeout, or of a participant who left, are closed and
+        # their counters folded into per-stream totals
+        self.lane_idle_timeout = LANE_IDLE_TIMEOUT
+        self.retired = {}
+        # Closed lanes whose consumers are finishing, and the tasks waiting on them
+        self._retiring = {}
+        self._last_sweep = time.monotonic()
+        # Async handlers per stream type: handler(payload, participant_id=..., timestamp=...)
+        self.handlers = {}
+        # Async callbacks run as callback(participant_id) once a participant has no lanes left
+        self.release_callbacks = []
+        self._counters = {}
+        # Optional CaptureWriter recording raw messages for replay
+        self.capture = capture
+        # Which streams to subscribe to, and at what quality
+        self.profile = profile or get_profile(DEFAULT_PROFILE)
 
     def get_access_token(self):
-        """Get OAuth access token from Zoom"""
-        url = f"https://zoom.us/oauth/token?grant_type=account_credentials&account_id={ACCOUNT_ID}"
-        response = requests.post(url, auth=HTTPBasicAuth(CLIENT_ID, CLIENT_SECRET))
-        if response.status_code == 200:
-            self.access_token = response.json().get('access_token')
-            return self.access_token
-        else:
-            logger.error(f"Failed to get access token: {response.status_code} - {response.text}")
-            return None
+        """Get OAuth access token from the shared token cache"""
+        self.access_token = token_provider.get_access_token()
+        return self.access_token
 
-    def get_rtms_token(self, meeting_id):
+    async def get_rtms_token(self, meeting_id):
         """Get RTMS token for a specific meeting"""
-        if not self.access_token:
-            self.get_access_token()
+        self.access_token = await token_provider.get_access_token_async()
             
         if not self.access_token:
             logger.error("No access token available")
             return None
             
-        url = f"https://api.zoom.us/v2/rtms/meetings/{meeting_id}/tokens"
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        
-        response = requests.get(url, headers=headers)
+        try:
+            response = await zoom_api.get(f"/rtms/meetings/{meeting_id}/tokens")
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to get RTMS token: {e}")
+            return None
         if response.status_code == 200:
             self.rtms_token = response.json().get('token')
             self.meeting_id = meeting_id
@@ -61,7 +107,7 @@ class ZoomRTMSClient:
     async def connect_to_rtms(self, meeting_id):
         """Connect to RTMS websocket for a meeting"""
         if not self.rtms_token or self.meeting_id != meeting_id:
-            self.get_rtms_token(meeting_id)
+            await self.get_rtms_token(meeting_id)
             
         if not self.rtms_token:
             logger.error("No RTMS token available")
@@ -71,7 +117,9 @@ class ZoomRTMSClient:
             # Connect to RTMS WebSocket
             self.websocket = await websockets.connect(
                 f"{self.rtms_url}?access_token={self.rtms_token}",
-                extra_headers={"Content-Type": "application/json"}
+                additional_headers={"Content-Type": "application/json"},
+                ping_interval=PING_INTERVAL,
+                ping_timeout=PING_TIMEOUT
             )
             
             # Subscribe to video streams
@@ -81,6 +129,9 @@ class ZoomRTMSClient:
             return True
         except Exception as e:
             logger.error(f"Failed to connect to RTMS: {e}")
+            if is_auth_failure(e):
+                # Token expired or revoked; fetch a fresh one on the next attempt
+                self.rtms_token = None
             return False
 
     async def subscribe_to_streams(self):
@@ -89,18 +140,46 @@ class ZoomRTMSClient:
             logger.error("WebSocket connection not established")
             return
             
-        # Subscribe to video streams
+        # Subscribe to the streams in the current profile
         subscribe_message = {
             "action": "subscribe",
-            "streams": [
-                {"type": "video", "options": {"quality": "high"}},
-                {"type": "audio"},
-                {"type": "transcript"}
-            ]
+            "streams": profile_streams(self.profile)
         }
         
         await self.websocket.send(json.dumps(subscribe_message))
-        logger.info("Subscribed to video, audio, and transcript streams")
+        logger.info(f"Subscribed to {self.profile.name} profile: "
+                    f"{', '.join(s['type'] for s in subscribe_message['streams'])}")
+
+    async def resubscribe(self, profile):
+        """Switch to another profile, unsubscribing from streams it leaves out
+
+        While disconnected this only records the profile; the next connection
+        subscribes with it.
+        """
+        previous = {s["type"] for s in profile_streams(self.profile)}
+        self.profile = profile
+        RESUBSCRIBES.labels(profile.name).inc()
+        if not self.websocket or self.closing:
+            return
+        dropped = previous - {s["type"] for s in profile_streams(profile)}
+        try:
+            if dropped:
+                await self.websocket.send(json.dumps({
+                    "action": "unsubscribe",
+                    "streams": [{"type": stream} for stream in sorted(dropped)]
+                }))
+            await self.subscribe_to_streams()
+        except websockets.exceptions.ConnectionClosed:
+            # The reconnect subscribes with the new profile
+            pass
+
+    def register_handler(self, stream, handler):
+        """Route a stream type ("video", "audio" or "transcript") to an async handler"""
+        self.handlers[stream] = handler
+
+    def register_release(self, callback):
+        """Run an async callback(participant_id) when a participant's lanes have all closed"""
+        self.release_callbacks.append(callback)
 
     async def process_video_data(self, frame_processor_func=None):
         """Process incoming video frames"""
@@ -108,27 +187,39 @@ class ZoomRTMSClient:
             logger.error("WebSocket connection not established")
             return
             
+        try:
+            await self.read_messages(frame_processor_func)
+        finally:
+            await self.drain_queues()
+
+    async def read_messages(self, frame_processor_func=None):
+        """Read messages until the connection closes, queueing them for their handlers"""
+        if frame_processor_func:
+            self.register_handler("video", frame_processor_func)
         try:
             async for message in self.websocket:
+                if self.capture is not None:
+                    self.capture.record(message)
+                if isinstance(message, bytes):
+                    # Fast path: compact binary header, payload handed off without copying
+                    await self.process_binary_frame(message)
+                    continue
+
                 data = json.loads(message)
+                meta = {
+                    "participant_id": data.get("participant_id", data.get("user_id")),
+                    "timestamp": data.get("timestamp"),
+                }
                 
                 # Process different types of data
                 if "video" in data:
-                    video_data = data["video"]
-                    logger.info(f"Received video frame: {len(video_data)} bytes")
-                    
-                    # Process the video frame if a processor function is provided
-                    if frame_processor_func:
-                        await frame_processor_func(video_data)
-                        
+                    await self.dispatch("video", data["video"], meta, keyframe=data.get("keyframe", True))
                 elif "audio" in data:
-                    audio_data = data["audio"]
-                    logger.info(f"Received audio data: {len(audio_data)} bytes")
-                    
+                    await self.dispatch("audio", data["audio"], meta)
                 elif "transcript" in data:
-                    transcript = data["transcript"]
-                    logger.info(f"Received transcript: {transcript}")
-                    
+                    await self.dispatch("transcript", data["transcript"], meta)
+                elif data.get("event") == "participant_left":
+                    await self.release_participant(meta["participant_id"])
                 elif "error" in data:
                     logger.error(f"RTMS error: {data['error']}")
                     
@@ -137,18 +228,191 @@ class ZoomRTMSClient:
         except Exception as e:
             logger.error(f"Error processing RTMS data: {e}")
 
+    async def run(self, meeting_id, frame_processor_func=None):
+        """Stream a meeting, reconnecting with backoff until close() is called"""
+        attempt = 0
+        disconnected_at = None
+        try:
+            while not self.closing:
+                if await self.connect_to_rtms(meeting_id):
+                    if self.closing:
+                        # Stopped while the handshake was in flight
+                        await self.websocket.close()
+                        break
+                    if disconnected_at is not None:
+                        self.last_recovery_time = time.monotonic() - disconnected_at
+                        self.total_downtime += self.last_recovery_time
+                        self.reconnects += 1
+                        RECONNECTS.inc()
+                        logger.info(f"Reconnected to RTMS for meeting {meeting_id} "
+                                    f"after {self.last_recovery_time:.1f}s")
+                    attempt = 0
+                    disconnected_at = None
+                    await self.read_messages(frame_processor_func)
+                    if self.closing:
+                        break
+                    await self.websocket.close()
+                    logger.warning(f"RTMS connection for meeting {meeting_id} dropped; reconnecting")
+                if disconnected_at is None:
+                    disconnected_at = time.monotonic()
+                if attempt >= MAX_RECONNECT_ATTEMPTS:
+                    logger.error(f"Giving up on RTMS for meeting {meeting_id} "
+                                 f"after {attempt} attempts")
+                    break
+                delay = random.uniform(0, min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** attempt))
+                attempt += 1
+                await self._wait_unless_closed(delay)
+        finally:
+            await self.drain_queues()
+
+    async def _wait_unless_closed(self, delay):
+        if self._closed_event is None:
+            self._closed_event = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._closed_event.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    def reconnect_stats(self):
+        return {
+            "reconnects": self.reconnects,
+            "last_recovery_time": self.last_recovery_time,
+            "total_downtime": self.total_downtime,
+        }
+
+    async def dispatch(self, stream, payload, meta, keyframe=True):
+        """Queue a payload for its stream's handler; streams without one are ignored"""
+        counters = self._counters.get(stream)
+        if counters is None:
+            counters = self._counters[stream] = (MESSAGES.labels(stream), BYTES.labels(stream))
+        counters[0].inc()
+        counters[1].inc(len(payload))
+        log_sampled(logger, ("rtms", stream), logging.DEBUG,
+                    "Received %s message: %d bytes", stream, len(payload))
+        handler = self.handlers.get(stream)
+        if handler:
+            await self.enqueue_frame(stream, payload, handler, keyframe=keyframe, meta=meta)
+
+    async def enqueue_frame(self, stream, payload, handler, keyframe=True, meta=None):
+        """Hand a frame to its lane's queue, starting the lane's consumer on first use"""
+        participant_id = meta.get("participant_id") if meta and stream in LANE_STREAMS else None
+        lane = self.lanes.get((stream, participant_id))
+        if lane is None or lane.queue.closed:
+            lane = Lane(stream, participant_id, FrameQueue(self.queue_size, self.overflow_policy))
+            self.lanes[(stream, participant_id)] = lane
+            lane.consumer = asyncio.create_task(self.consume_frames(lane, handler))
+        lane.messages += 1
+        lane.bytes += len(payload)
+        lane.last_active = now = time.monotonic()
+        await lane.queue.put(payload, keyframe, meta)
+        if self.lane_idle_timeout and now - self._last_sweep >= self.lane_idle_timeout / 4:
+            self._last_sweep = now
+            await self.close_idle_lanes(now)
+
+    async def close_idle_lanes(self, now=None):
+        """Close lanes that are empty and have had no frame for the idle timeout"""
+        now = time.monotonic() if now is None else now
+        idle = [key for key, lane in list(self.lanes.items())
+                if not len(lane.queue) and now - lane.last_active >= self.lane_idle_timeout]
+        await self._close_lanes(idle)
+
+    async def release_participant(self, participant_id):
+        """Close a departed participant's lanes, releasing them once their frames are done"""
+        await self._close_lanes([key for key in list(self.lanes) if key[1] == participant_id])
+
+    async def _close_lanes(self, keys):
+        for key in keys:
+            lane = self.lanes.pop(key)
+            await lane.queue.close()
+            self._retiring[lane] = asyncio.create_task(self._retire(lane))
+
+    async def _retire(self, lane):
+        if lane.consumer is not None:
+            await lane.consumer
+        retire_lane(self.retired.setdefault(lane.stream, {}), lane)
+        del self._retiring[lane]
+        participant_id = lane.participant_id
+        # Leave the participant alone if they are still (or again) sending frames
+        if participant_id is None or any(key[1] == participant_id for key in self.lanes):
+            return
+        for callback in self.release_callbacks:
+            try:
+                await callback(participant_id)
+            except Exception as e:
+                logger.error(f"Error releasing participant {participant_id}: {e}")
+
+    async def consume_frames(self, lane, handler):
+        """Run the handler over a lane's frames, one turn at a time, until it is closed"""
+        scheduler = self.schedulers.get(lane.stream)
+        if scheduler is None:
+            scheduler = self.schedulers[lane.stream] = FairScheduler(LANE_CONCURRENCY)
+        queue = lane.queue
+        while True:
+            frame = await queue.get()
+            if frame is None:
+                return
+            await scheduler.acquire(lane, len(frame.payload))
+            try:
+                await handler(frame.payload, **frame.meta)
+            except Exception as e:
+                logger.error(f"Error in frame processor: {e}")
+            finally:
+                scheduler.release()
+            queue.frame_done(frame)
+
+    async def drain_queues(self):
+        """Close all lanes and wait for their consumers to finish what is queued"""
+        lanes = list(self.lanes.values())
+        for lane in lanes:
+            await lane.queue.close()
+        consumers = [lane.consumer for lane in lanes if lane.consumer is not None]
+        if consumers:
+            await asyncio.gather(*consumers)
+        if self._retiring:
+            await asyncio.gather(*list(self._retiring.values()))
+
+    def queue_stats(self):
+        """Queued/dropped/processed counts and frame latency per stream, over all its lanes"""
+        streams = {stream: [] for stream in self.retired}
+        for lane in [*self.lanes.values(), *self._retiring]:
+            streams.setdefault(lane.stream, []).append(lane)
+        return {stream: merge_queue_stats(lanes, self.retired.get(stream))
+                for stream, lanes in streams.items()}
+
+    def lane_stats(self):
+        """Queue and message counts per stream and participant"""
+        lanes = {}
+        for lane in list(self.lanes.values()):
+            lanes.setdefault(lane.stream, {})[str(lane.participant_id)] = lane.stats()
+        return lanes
+
+    async def process_binary_frame(self, message):
+        """Dispatch a binary RTMS frame by its stream type"""
+        try:
+            frame = parse_binary_frame(message)
+        except ValueError as e:
+            logger.error(f"Invalid binary RTMS frame: {e}")
+            return
+
+        meta = {"participant_id": frame.participant_id, "timestamp": frame.timestamp}
+        await self.dispatch(frame.stream, frame.payload, meta, keyframe=frame.keyframe)
+
     async def close(self):
-        """Close the RTMS connection"""
+        """Close the RTMS connection and stop reconnecting"""
+        self.closing = True
+        if self._closed_event is not None:
+            self._closed_event.set()
         if self.websocket:
             await self.websocket.close()
             logger.info("RTMS connection closed")
 
 # Example frame processor function
-async def example_frame_processor(frame_data):
+async def example_frame_processor(frame_data, participant_id=None, timestamp=None):
     """Example function to process video frames"""
     # Here you would implement your video processing logic
     # For example, saving frames, running computer vision models, etc.
-    print(f"Processing video frame: {len(frame_data)} bytes")
+    log_sampled(logger, "example_frame_processor", logging.DEBUG,
+                "Processing video frame: %d bytes", len(frame_data))
     
     # Example: Save frame to file (in a real implementation, you'd decode the video data first)
     # with open(f"frame_{int(time.time())}.raw", "wb") as f:
@@ -180,4 +444,5 @@ async def main():
     await monitor_meeting(meeting_id)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     asyncio.run(main())
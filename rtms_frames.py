@@ -0,0 +1,55 @@
+import struct
+from collections import namedtuple
+
+# Binary RTMS frame layout (network byte order):
+#   stream type     u8
+#   flags           u8   (bit 0: keyframe)
+#   participant id  u32
+#   timestamp       f64  (seconds since epoch)
+#   payload length  u32
+# followed by the payload bytes.
+FRAME_HEADER = struct.Struct("!BBIdI")
+
+STREAM_VIDEO = 1
+STREAM_AUDIO = 2
+STREAM_TRANSCRIPT = 3
+
+STREAM_NAMES = {
+    STREAM_VIDEO: "video",
+    STREAM_AUDIO: "audio",
+    STREAM_TRANSCRIPT: "transcript",
+}
+
+FLAG_KEYFRAME = 0x01
+
+RTMSFrame = namedtuple("RTMSFrame", "stream participant_id timestamp keyframe payload")
+
+
+def parse_binary_frame(message):
+    """Parse a binary websocket message without copying its payload
+
+    The returned payload is a memoryview into the original message, so it can
+    be handed straight to np.frombuffer.
+    """
+    view = memoryview(message)
+    if len(view) < FRAME_HEADER.size:
+        raise ValueError(f"Binary frame too short: {len(view)} bytes")
+    stream_type, flags, participant_id, timestamp, length = FRAME_HEADER.unpack_from(view)
+    end = FRAME_HEADER.size + length
+    if len(view) < end:
+        raise ValueError(f"Truncated binary frame: expected {length} payload bytes, "
+                         f"got {len(view) - FRAME_HEADER.size}")
+    return RTMSFrame(
+        stream=STREAM_NAMES.get(stream_type, "unknown"),
+        participant_id=participant_id,
+        timestamp=timestamp,
+        keyframe=bool(flags & FLAG_KEYFRAME),
+        payload=view[FRAME_HEADER.size:end],
+    )
+
+
+def pack_binary_frame(stream, payload, participant_id=0, timestamp=0.0, keyframe=False):
+    """Build a binary frame; used by local fake servers and benchmarks"""
+    stream_type = next(code for code, name in STREAM_NAMES.items() if name == stream)
+    flags = FLAG_KEYFRAME if keyframe else 0
+    return FRAME_HEADER.pack(stream_type, flags, participant_id, timestamp, len(payload)) + bytes(payload)
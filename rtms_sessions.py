@@ -0,0 +1,217 @@
+import os
+import time
+import asyncio
+import logging
+import importlib
+from collections import deque
+from metrics import family
+from rtms_capture import CaptureWriter, CAPTURE_ENABLED, CAPTURE_FILENAME
+from stream_profiles import AdaptiveController, get_profile, ADAPTIVE, DEFAULT_PROFILE
+
+logger = logging.getLogger(__name__)
+
+# Maximum concurrent RTMS sessions on this node; extra meetings wait in line
+MAX_SESSIONS = int(os.getenv('RTMS_MAX_SESSIONS', '20'))
+OUTPUT_ROOT = os.getenv('VIDEO_OUTPUT_DIR', 'video_output')
+# The RTMS client and media stack (OpenCV, numpy) are imported when the first
+# session starts, so processes that never stream do not pay for them
+MEDIA_MODULES = ("rtms_client", "stream_handlers", "video_processor")
+
+
+def load_media_modules():
+    for name in MEDIA_MODULES:
+        importlib.import_module(name)
+
+
+class RTMSSession:
+    """One meeting's RTMS connection and its video, audio and transcript handlers"""
+
+    def __init__(self, meeting_id, client, processor, audio=None, transcript=None, controller=None):
+        self.meeting_id = meeting_id
+        self.client = client
+        self.processor = processor
+        self.audio = audio
+        self.transcript = transcript
+        self.controller = controller
+        self._controller_task = None
+        client.register_handler("video", processor.process_frame)
+        client.register_release(processor.release_participant)
+        if audio:
+            client.register_handler("audio", audio.handle_audio)
+        if transcript:
+            client.register_handler("transcript", transcript.handle_transcript)
+        self.task = None
+        self.state = "connecting"
+        self.started_at = time.time()
+
+    def stats(self):
+        uptime = time.time() - self.started_at
+        return {
+            "meeting_id": self.meeting_id,
+            "state": self.state,
+            "uptime": uptime,
+            "frames": self.processor.frame_count,
+            "fps": self.processor.frame_count / uptime if uptime else 0.0,
+            "frame_filter": self.processor.filter.stats(),
+            "participants": self.processor.participant_stats(),
+            "queues": self.client.queue_stats(),
+            "lanes": self.client.lane_stats(),
+            "audio": self.audio.stats() if self.audio else None,
+            "transcript": self.transcript.stats() if self.transcript else None,
+            "subscription": (self.controller.stats() if self.controller
+                             else {"profile": self.client.profile.name}),
+            **self.client.reconnect_stats(),
+        }
+
+    def start_controller(self):
+        if self.controller:
+            self._controller_task = asyncio.create_task(self.controller.run())
+
+    async def close(self):
+        if self._controller_task:
+            self._controller_task.cancel()
+        await self.client.close()
+        await self.processor.close()
+        if self.transcript:
+            await self.transcript.close()
+        if self.client.capture:
+            self.client.capture.close()
+
+
+class RTMSSessionManager:
+    """Owns every RTMS session: one per meeting, capped per node"""
+
+    def __init__(self, max_sessions=MAX_SESSIONS, output_root=OUTPUT_ROOT):
+        self.max_sessions = max_sessions
+        self.output_root = output_root
+        self.sessions = {}
+        self.pending = deque()
+        # Subscription profile requested per meeting, when not the default
+        self.profiles = {}
+        self.media_loaded = False
+
+    async def load_media(self):
+        """Import the media stack off the event loop before the first session"""
+        if not self.media_loaded:
+            started = time.monotonic()
+            await asyncio.to_thread(load_media_modules)
+            self.media_loaded = True
+            logger.info(f"Loaded RTMS media modules in {time.monotonic() - started:.2f}s")
+
+    def create_session(self, meeting_id, profile=DEFAULT_PROFILE):
+        from rtms_client import ZoomRTMSClient
+        from video_processor import VideoProcessor
+        from stream_handlers import AudioAnalyzer, TranscriptAggregator
+        output_dir = os.path.join(self.output_root, meeting_id)
+        processor = VideoProcessor(output_dir=output_dir, meeting_id=meeting_id)
+        transcript = TranscriptAggregator(os.path.join(output_dir, "transcript.jsonl"))
+        capture = CaptureWriter(os.path.join(output_dir, CAPTURE_FILENAME)) if CAPTURE_ENABLED else None
+        client = ZoomRTMSClient(capture=capture, profile=get_profile(profile))
+        controller = AdaptiveController(client) if ADAPTIVE else None
+        return RTMSSession(meeting_id, client, processor, AudioAnalyzer(), transcript, controller)
+
+    async def start(self, meeting_id, profile=None):
+        """Start a session unless one is already running or queued for this meeting"""
+        await self.load_media()
+        meeting_id = str(meeting_id)
+        if profile is not None:
+            self.profiles[meeting_id] = get_profile(profile).name
+        if meeting_id in self.sessions:
+            return "running"
+        if meeting_id in self.pending:
+            return "queued"
+        if len(self.sessions) >= self.max_sessions:
+            self.pending.append(meeting_id)
+            logger.info(f"RTMS session cap reached; queued meeting {meeting_id}")
+            return "queued"
+        self._launch(meeting_id)
+        return "started"
+
+    def _launch(self, meeting_id):
+        session = self.create_session(meeting_id, self.profiles.get(meeting_id, DEFAULT_PROFILE))
+        self.sessions[meeting_id] = session
+        session.task = asyncio.create_task(self._run(session))
+
+    def _admit_next(self):
+        while self.pending and len(self.sessions) < self.max_sessions:
+            self._launch(self.pending.popleft())
+
+    async def _run(self, session):
+        meeting_id = session.meeting_id
+        try:
+            # Reconnects on drops until the session is stopped
+            session.state = "streaming"
+            session.start_controller()
+            await session.client.run(meeting_id)
+        except Exception as e:
+            logger.error(f"Error in RTMS processing for meeting {meeting_id}: {e}")
+        finally:
+            session.state = "closing"
+            await session.close()
+            self.sessions.pop(meeting_id, None)
+            self.profiles.pop(meeting_id, None)
+            logger.info(f"RTMS session for meeting {meeting_id} ended")
+            self._admit_next()
+
+    async def stop(self, meeting_id):
+        """Stop a running session or remove a queued one"""
+        meeting_id = str(meeting_id)
+        if meeting_id in self.pending:
+            self.pending.remove(meeting_id)
+            self.profiles.pop(meeting_id, None)
+            return "dequeued"
+        session = self.sessions.get(meeting_id)
+        if session is None:
+            return "not_found"
+        session.state = "stopping"
+        # Closing ends the read loop (or reconnect backoff) and drains queued frames
+        await session.client.close()
+        await session.task
+        return "stopped"
+
+    async def shutdown(self):
+        """Stop every session, e.g. when the app shuts down"""
+        self.pending.clear()
+        await asyncio.gather(*(self.stop(meeting_id) for meeting_id in list(self.sessions)))
+
+    def collect_metrics(self):
+        """Session counts and per-meeting queue state as metric families"""
+        queues = [({"meeting_id": meeting_id, "stream": stream}, stats)
+                  for meeting_id, session in list(self.sessions.items())
+                  for stream, stats in session.client.queue_stats().items()]
+        lanes = [({"meeting_id": meeting_id, "stream": stream, "participant_id": participant_id},
+                  stats)
+                 for meeting_id, session in list(self.sessions.items())
+                 for stream, participants in session.client.lane_stats().items()
+                 for participant_id, stats in participants.items()]
+        return [
+            family("rtms_sessions", "gauge", "Running RTMS sessions", [({}, len(self.sessions))]),
+            family("rtms_sessions_pending", "gauge", "RTMS sessions waiting for a slot",
+                   [({}, len(self.pending))]),
+            family("rtms_queue_depth", "gauge", "Frames waiting in a session's stream queue",
+                   [(labels, stats["depth"]) for labels, stats in queues]),
+            family("rtms_queue_dropped_total", "counter", "Frames dropped by the overflow policy",
+                   [(labels, stats["dropped"]) for labels, stats in queues]),
+            family("rtms_queue_latency_max_seconds", "gauge", "Longest time a frame spent queued",
+                   [(labels, stats["latency_max"]) for labels, stats in queues]),
+            family("rtms_lane_messages_total", "counter", "Messages received per participant lane",
+                   [(labels, stats["messages"]) for labels, stats in lanes]),
+            family("rtms_lane_depth", "gauge", "Frames waiting in a participant lane",
+                   [(labels, stats["depth"]) for labels, stats in lanes]),
+            family("rtms_lane_dropped_total", "counter", "Frames a participant lane dropped",
+                   [(labels, stats["dropped"]) for labels, stats in lanes]),
+            family("rtms_lane_latency_avg_seconds", "gauge",
+                   "Average time a participant lane's frames spent queued",
+                   [(labels, stats["latency_avg"]) for labels, stats in lanes]),
+        ]
+
+    def list(self):
+        return {
+            "max_sessions": self.max_sessions,
+            "sessions": [session.stats() for session in self.sessions.values()],
+            "pending": list(self.pending),
+        }
+
+
+# Shared manager used by the webhook app
+session_manager = RTMSSessionManager()
@@ -0,0 +1,357 @@
+import os
+import time
+import queue
+import bisect
+import hashlib
+import asyncio
+import logging
+import multiprocessing
+import httpx
+from rtms_sessions import RTMSSessionManager
+from metrics import registry, family, with_labels
+from stream_profiles import get_profile
+
+logger = logging.getLogger(__name__)
+
+# Number of RTMS worker processes; 0 keeps sessions in the web process
+RTMS_WORKERS = int(os.getenv('RTMS_WORKERS', '0'))
+HEARTBEAT_INTERVAL = float(os.getenv('RTMS_WORKER_HEARTBEAT', '5'))
+# A worker that misses heartbeats this long is treated as dead
+HEARTBEAT_TIMEOUT = float(os.getenv('RTMS_WORKER_TIMEOUT', '20'))
+RING_REPLICAS = 100
+# Base URL of an RTMS-capable node that webhook-only replicas hand meetings to
+RTMS_NODE_URL = os.getenv('RTMS_NODE_URL')
+
+
+class HashRing:
+    """Consistent hash ring so a meeting sticks to one worker
+
+    Adding or removing a worker only moves the meetings on its arcs.
+    """
+
+    def __init__(self, replicas=RING_REPLICAS):
+        self.replicas = replicas
+        self.keys = []
+        self.nodes = {}
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+    def add(self, node):
+        for i in range(self.replicas):
+            point = self._hash(f"{node}#{i}")
+            bisect.insort(self.keys, point)
+            self.nodes[point] = node
+
+    def remove(self, node):
+        for i in range(self.replicas):
+            point = self._hash(f"{node}#{i}")
+            index = bisect.bisect_left(self.keys, point)
+            if index < len(self.keys) and self.keys[index] == point:
+                del self.keys[index]
+                del self.nodes[point]
+
+    def get(self, key):
+        if not self.keys:
+            return None
+        index = bisect.bisect(self.keys, self._hash(str(key))) % len(self.keys)
+        return self.nodes[self.keys[index]]
+
+
+class LocalWorkerChannel:
+    """A worker's end of the local queue backend; picklable into the child"""
+
+    def __init__(self, commands, events):
+        self.commands = commands
+        self.events = events
+
+    def get_command(self, timeout):
+        try:
+            return self.commands.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def publish(self, event):
+        self.events.put(event)
+
+
+class LocalQueueBackend:
+    """Command/event transport over multiprocessing queues
+
+    A broker-backed backend only needs the same methods: worker_channel(),
+    send(), get_event() and remove().
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self.commands = {}
+        self.events = context.Queue()
+
+    def worker_channel(self, worker_id):
+        self.commands[worker_id] = self.context.Queue()
+        return LocalWorkerChannel(self.commands[worker_id], self.events)
+
+    def send(self, worker_id, command):
+        self.commands[worker_id].put(command)
+
+    def get_event(self, timeout):
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def remove(self, worker_id):
+        self.commands.pop(worker_id, None)
+
+
+def worker_main(worker_id, channel):
+    """Entry point for an RTMS worker process"""
+    logging.basicConfig(level=logging.INFO,
+                        format=f'%(asctime)s - {worker_id} - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(run_worker(worker_id, channel))
+
+
+async def run_worker(worker_id, channel):
+    manager = RTMSSessionManager()
+    registry.add_collector(manager.collect_metrics)
+    # Stops in progress per meeting; a later start for the meeting waits for its stop
+    stopping = {}
+    # Sequence number of the last command handled, so the front end knows which
+    # of its starts a heartbeat already reflects
+    processed = 0
+
+    def stopped(meeting_id, task):
+        if stopping.get(meeting_id) is task:
+            del stopping[meeting_id]
+
+    async def heartbeat():
+        while True:
+            channel.publish({"type": "heartbeat", "worker_id": worker_id, "processed": processed,
+                             "sessions": manager.list(), "metrics": registry.snapshot()})
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    heartbeat_task = asyncio.create_task(heartbeat())
+    try:
+        # Workers exist to stream, so load the media stack before the first meeting arrives
+        await manager.load_media()
+        while True:
+            command = await asyncio.to_thread(channel.get_command, 1.0)
+            if command is None:
+                continue
+            action = command.get("action")
+            meeting_id = command.get("meeting_id")
+            if action == "start":
+                if meeting_id in stopping:
+                    await asyncio.gather(stopping[meeting_id], return_exceptions=True)
+                await manager.start(meeting_id, command.get("profile"))
+            elif action == "stop":
+                # Draining a session can take a while, so other meetings' commands go on meanwhile
+                task = asyncio.create_task(manager.stop(meeting_id))
+                stopping[meeting_id] = task
+                task.add_done_callback(lambda task, meeting_id=meeting_id: stopped(meeting_id, task))
+            elif action == "shutdown":
+                break
+            processed = command.get("seq", processed)
+    finally:
+        heartbeat_task.cancel()
+        await manager.shutdown()
+
+
+class ShardedSessionManager:
+    """Front end that hands RTMS sessions to a pool of worker processes
+
+    Meetings are placed with consistent hashing. When a worker dies its
+    meetings move to the surviving owners and a replacement is spawned; when
+    a worker joins, meetings whose owner changed are moved to it.
+    """
+
+    def __init__(self, workers=RTMS_WORKERS, backend=None):
+        self.size = workers
+        self.context = multiprocessing.get_context("spawn")
+        self.backend = backend or LocalQueueBackend(self.context)
+        self.ring = HashRing()
+        self.processes = {}
+        self.assignments = {}
+        self.profiles = {}
+        self.last_seen = {}
+        self.worker_sessions = {}
+        self.worker_metrics = {}
+        # Sequence number of the last command sent to each worker
+        self.sent = {}
+        self.seq = 0
+        self.next_worker = 0
+        self._monitor_task = None
+
+    async def start_workers(self):
+        for _ in range(self.size):
+            self.add_worker()
+        self._monitor_task = asyncio.create_task(self._monitor())
+
+    def add_worker(self):
+        worker_id = f"worker-{self.next_worker}"
+        self.next_worker += 1
+        channel = self.backend.worker_channel(worker_id)
+        process = self.context.Process(target=worker_main, args=(worker_id, channel), daemon=True)
+        process.start()
+        self.processes[worker_id] = process
+        self.last_seen[worker_id] = time.monotonic()
+        self.ring.add(worker_id)
+        logger.info(f"RTMS worker {worker_id} joined (pid {process.pid})")
+        self._rebalance()
+        return worker_id
+
+    def remove_worker(self, worker_id):
+        """Drop a dead worker and move its meetings to their new owners"""
+        self.ring.remove(worker_id)
+        self.processes.pop(worker_id, None)
+        self.last_seen.pop(worker_id, None)
+        self.worker_sessions.pop(worker_id, None)
+        self.worker_metrics.pop(worker_id, None)
+        self.sent.pop(worker_id, None)
+        self.backend.remove(worker_id)
+        logger.warning(f"RTMS worker {worker_id} left")
+        self._rebalance()
+
+    def _send(self, worker_id, command):
+        self.seq += 1
+        self.sent[worker_id] = self.seq
+        self.backend.send(worker_id, {**command, "seq": self.seq})
+
+    def _forget_ended(self, worker_id, event):
+        """Drop assignments for meetings whose session ended on the worker
+
+        Only a heartbeat that reflects every command sent to the worker can
+        tell an ended session from a start the worker has not handled yet.
+        """
+        sessions = event.get("sessions") or {}
+        if event.get("processed", 0) < self.sent.get(worker_id, 0):
+            return
+        live = {str(session["meeting_id"]) for session in sessions.get("sessions", [])}
+        live.update(str(meeting_id) for meeting_id in sessions.get("pending", []))
+        for meeting_id, owner in list(self.assignments.items()):
+            if owner == worker_id and meeting_id not in live:
+                del self.assignments[meeting_id]
+                self.profiles.pop(meeting_id, None)
+                logger.info(f"RTMS session for meeting {meeting_id} ended on {worker_id}")
+
+    def _rebalance(self):
+        for meeting_id, worker_id in list(self.assignments.items()):
+            owner = self.ring.get(meeting_id)
+            if owner == worker_id:
+                continue
+            if worker_id in self.processes:
+                self._send(worker_id, {"action": "stop", "meeting_id": meeting_id})
+            self.assignments[meeting_id] = owner
+            if owner is not None:
+                self._send(owner, {"action": "start", "meeting_id": meeting_id,
+                                   "profile": self.profiles.get(meeting_id)})
+                logger.info(f"Moved meeting {meeting_id} from {worker_id} to {owner}")
+
+    async def _monitor(self):
+        """Collect heartbeats and replace workers that died"""
+        while True:
+            event = await asyncio.to_thread(self.backend.get_event, 1.0)
+            if event is not None and event.get("worker_id") in self.processes:
+                self.last_seen[event["worker_id"]] = time.monotonic()
+                self.worker_sessions[event["worker_id"]] = event.get("sessions")
+                self.worker_metrics[event["worker_id"]] = event.get("metrics") or []
+                self._forget_ended(event["worker_id"], event)
+            now = time.monotonic()
+            for worker_id, process in list(self.processes.items()):
+                if not process.is_alive() or now - self.last_seen[worker_id] > HEARTBEAT_TIMEOUT:
+                    if process.is_alive():
+                        process.terminate()
+                    self.remove_worker(worker_id)
+                    self.add_worker()
+
+    async def start(self, meeting_id, profile=None):
+        meeting_id = str(meeting_id)
+        if meeting_id in self.assignments:
+            return "running"
+        owner = self.ring.get(meeting_id)
+        if owner is None:
+            return "unavailable"
+        if profile is not None:
+            # Kept so the meeting keeps its profile if it moves to another worker
+            self.profiles[meeting_id] = get_profile(profile).name
+        self.assignments[meeting_id] = owner
+        self._send(owner, {"action": "start", "meeting_id": meeting_id,
+                           "profile": self.profiles.get(meeting_id)})
+        return "started"
+
+    async def stop(self, meeting_id):
+        meeting_id = str(meeting_id)
+        worker_id = self.assignments.pop(meeting_id, None)
+        self.profiles.pop(meeting_id, None)
+        if worker_id is None:
+            return "not_found"
+        if worker_id in self.processes:
+            self._send(worker_id, {"action": "stop", "meeting_id": meeting_id})
+        return "stopped"
+
+    async def shutdown(self):
+        if self._monitor_task:
+            self._monitor_task.cancel()
+        for worker_id in self.processes:
+            self.backend.send(worker_id, {"action": "shutdown"})
+        for process in self.processes.values():
+            await asyncio.to_thread(process.join, HEARTBEAT_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        self.processes = {}
+
+    def collect_metrics(self):
+        """Each worker's metrics from its last heartbeat, labelled by worker"""
+        families = [family("rtms_worker_up", "gauge", "Whether an RTMS worker process is alive",
+                           [({"worker": worker_id}, int(process.is_alive()))
+                            for worker_id, process in self.processes.items()])]
+        for worker_id, worker_families in list(self.worker_metrics.items()):
+            families.extend(with_labels(worker_families, worker=worker_id))
+        return families
+
+    def list(self):
+        return {
+            "workers": {
+                worker_id: {"pid": process.pid, "alive": process.is_alive(),
+                            "sessions": self.worker_sessions.get(worker_id)}
+                for worker_id, process in self.processes.items()
+            },
+            "assignments": dict(self.assignments),
+        }
+
+
+class RemoteSessionManager:
+    """Starts and stops sessions on another node through its RTMS endpoints
+
+    Used by webhook-only replicas. Failures raise, so the webhook event log
+    retries the event instead of dropping it.
+    """
+
+    def __init__(self, base_url=RTMS_NODE_URL, timeout=10.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.client = None
+
+    def _client(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout)
+        return self.client
+
+    async def start(self, meeting_id, profile=None):
+        params = {"profile": profile} if profile else None
+        response = await self._client().get(f"/start-rtms/{meeting_id}", params=params)
+        response.raise_for_status()
+        return response.json().get("status")
+
+    async def stop(self, meeting_id):
+        response = await self._client().get(f"/stop-rtms/{meeting_id}")
+        if response.status_code == 404:
+            return "not_found"
+        response.raise_for_status()
+        return response.json().get("status")
+
+    async def shutdown(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
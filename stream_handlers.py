@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import logging
+import numpy as np
+from metrics import log_sampled
+
+logger = logging.getLogger(__name__)
+
+# RTMS audio is 16-bit mono PCM
+AUDIO_SAMPLE_RATE = int(os.getenv('AUDIO_SAMPLE_RATE', '16000'))
+AUDIO_BUFFER_SECONDS = float(os.getenv('AUDIO_BUFFER_SECONDS', '10'))
+# Features are computed over frames of this length
+AUDIO_FRAME_MS = int(os.getenv('AUDIO_FRAME_MS', '20'))
+# RMS (on the int16 scale) above which a frame counts as voice
+VAD_THRESHOLD = float(os.getenv('AUDIO_VAD_THRESHOLD', '500'))
+TRANSCRIPT_FLUSH_SECONDS = float(os.getenv('TRANSCRIPT_FLUSH_SECONDS', '1'))
+
+
+def decode_payload(payload):
+    """JSON messages carry base64 text; binary frames carry raw bytes"""
+    if isinstance(payload, str):
+        return base64.b64decode(payload)
+    return payload
+
+
+class AudioRingBuffer:
+    """Fixed-size int16 ring buffer; writes never allocate or grow"""
+
+    def __init__(self, capacity):
+        self.samples = np.zeros(capacity, np.int16)
+        self.capacity = capacity
+        self.position = 0
+        self.total = 0
+
+    def write(self, chunk):
+        """Append samples; returns how many were kept (a chunk over capacity keeps its tail)"""
+        if len(chunk) >= self.capacity:
+            chunk = chunk[-self.capacity:]
+        end = self.position + len(chunk)
+        if end <= self.capacity:
+            self.samples[self.position:end] = chunk
+        else:
+            split = self.capacity - self.position
+            self.samples[self.position:] = chunk[:split]
+            self.samples[:end - self.capacity] = chunk[split:]
+        self.position = end % self.capacity
+        self.total += len(chunk)
+        return len(chunk)
+
+    def latest(self, count):
+        """The most recent count samples, oldest first (a copy only when wrapped)"""
+        count = min(count, self.capacity, self.total)
+        start = self.position - count
+        if start >= 0:
+            return self.samples[start:self.position]
+        return np.concatenate((self.samples[start:], self.samples[:self.position]))
+
+
+class ParticipantAudio:
+    def __init__(self, capacity, frame_length):
+        self.buffer = AudioRingBuffer(capacity)
+        self.frame_length = frame_length
+        self.pending = 0
+        self.rms = 0.0
+        self.voice_frames = 0
+        self.frames = 0
+
+
+class AudioAnalyzer:
+    """Per-participant PCM accumulation with vectorized RMS and voice activity"""
+
+    def __init__(self, sample_rate=AUDIO_SAMPLE_RATE, buffer_seconds=AUDIO_BUFFER_SECONDS,
+                 frame_ms=AUDIO_FRAME_MS, vad_threshold=VAD_THRESHOLD):
+        self.sample_rate = sample_rate
+        self.capacity = int(sample_rate * buffer_seconds)
+        self.frame_length = int(sample_rate * frame_ms / 1000)
+        self.vad_threshold = vad_threshold
+        self.participants = {}
+        self.samples_processed = 0
+        self.cpu_time = 0.0
+
+    async def handle_audio(self, payload, participant_id=None, timestamp=None):
+        started = time.process_time()
+        data = decode_payload(payload)
+        if len(data) % 2:
+            # Half a sample can't be decoded; keep the whole ones
+            log_sampled(logger, "odd_audio_payload", logging.WARNING,
+                        "Dropping trailing byte of a %d-byte PCM payload", len(data))
+            data = memoryview(data)[:len(data) - 1]
+        samples = np.frombuffer(data, np.int16)
+        state = self.participants.get(participant_id)
+        if state is None:
+            state = self.participants[participant_id] = ParticipantAudio(self.capacity,
+                                                                         self.frame_length)
+        # Only samples still in the ring can be analyzed
+        state.pending = min(state.pending + state.buffer.write(samples), self.capacity)
+        self.samples_processed += len(samples)
+
+        # Analyze whole frames that arrived since the last pass in one go
+        frames = state.pending // self.frame_length
+        if frames:
+            window = state.buffer.latest(state.pending)[:frames * self.frame_length]
+            window = window.reshape(frames, self.frame_length).astype(np.float32)
+            rms = np.sqrt(np.mean(window * window, axis=1))
+            state.rms = float(rms[-1])
+            state.voice_frames += int(np.count_nonzero(rms > self.vad_threshold))
+            state.frames += frames
+            state.pending -= frames * self.frame_length
+        self.cpu_time += time.process_time() - started
+
+    def stats(self):
+        audio_minutes = self.samples_processed / self.sample_rate / 60
+        return {
+            "cpu_seconds_per_audio_minute": self.cpu_time / audio_minutes if audio_minutes else 0.0,
+            "participants": {
+                str(participant_id): {
+                    "rms": state.rms,
+                    "speaking": state.rms > self.vad_threshold,
+                    "voice_ratio": state.voice_frames / state.frames if state.frames else 0.0,
+                }
+                for participant_id, state in self.participants.items()
+            },
+        }
+
+
+class TranscriptAggregator:
+    """Streams transcript segments to an append-only JSON-lines file
+
+    Segments are buffered in memory and written by a background task once
+    per flush interval, so the RTMS reader never waits on disk.
+    """
+
+    def __init__(self, path, flush_seconds=TRANSCRIPT_FLUSH_SECONDS):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.pending = []
+        self.words = {}
+        self.segments = 0
+        self._closed = None
+        self._task = None
+
+    async def handle_transcript(self, payload, participant_id=None, timestamp=None):
+        text = payload if isinstance(payload, str) else bytes(payload).decode('utf-8', 'replace')
+        self.pending.append(json.dumps({
+            "timestamp": timestamp or time.time(),
+            "participant_id": participant_id,
+            "text": text,
+        }) + "\n")
+        self.words[participant_id] = self.words.get(participant_id, 0) + len(text.split())
+        self.segments += 1
+        if self._task is None:
+            self._closed = asyncio.Event()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    def _append(self, lines):
+        with open(self.path, "a") as f:
+            f.writelines(lines)
+
+    async def flush(self):
+        if self.pending:
+            lines, self.pending = self.pending, []
+            await asyncio.to_thread(self._append, lines)
+
+    async def _flush_loop(self):
+        # Only this task writes, so appends never interleave
+        while True:
+            try:
+                await asyncio.wait_for(self._closed.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except OSError as e:
+                logger.error(f"Error writing transcript: {e}")
+            if self._closed.is_set():
+                return
+
+    async def close(self):
+        """Write out buffered segments and stop the flush task"""
+        if self._task is not None:
+            self._closed.set()
+            await self._task
+            self._task = None
+
+    def stats(self):
+        return {
+            "segments": self.segments,
+            "words": {str(participant_id): count for participant_id, count in self.words.items()},
+        }
@@ -0,0 +1,122 @@
+import os
+import heapq
+import time
+import asyncio
+import itertools
+
+# Streams split into one lane per participant; the rest keep a single lane
+LANE_STREAMS = frozenset(stream.strip() for stream in
+                         os.getenv('RTMS_LANE_STREAMS', 'video,audio').split(',') if stream.strip())
+# Handler calls running at once per stream, across all of its lanes
+LANE_CONCURRENCY = int(os.getenv('RTMS_LANE_CONCURRENCY', '4'))
+# Seconds without a frame before a lane is closed and its participant released (0 keeps lanes)
+LANE_IDLE_TIMEOUT = float(os.getenv('RTMS_LANE_IDLE_TIMEOUT', '60'))
+
+
+class Lane:
+    """One participant's share of a stream: its own queue, consumer and counters"""
+
+    def __init__(self, stream, participant_id, queue):
+        self.stream = stream
+        self.participant_id = participant_id
+        self.queue = queue
+        self.consumer = None
+        self.messages = 0
+        self.bytes = 0
+        self.last_active = time.monotonic()
+        # Virtual time, in payload bytes, at which the lane's last frame finishes
+        self.finish = 0.0
+
+    def stats(self):
+        return {**self.queue.stats(), "messages": self.messages, "bytes": self.bytes}
+
+
+class FairScheduler:
+    """Hands out handler turns to a stream's lanes by start-time fair queuing
+
+    Each frame is tagged with a virtual start time: where its lane's previous
+    frame finished, or the scheduler's current virtual time if the lane was
+    idle, and it finishes `cost` payload bytes later. When more lanes wait
+    than there are slots, the earliest tag goes next, so busy lanes are
+    served equal bytes over time: a participant sending large frames gets
+    fewer turns instead of starving small, frequent senders, and a lane that
+    was idle cannot bank credit.
+    """
+
+    def __init__(self, slots=LANE_CONCURRENCY):
+        self.slots = max(slots, 1)
+        self.active = 0
+        self.vtime = 0.0
+        # (start tag, sequence, future) heap of waiting frames
+        self.waiting = []
+        self._sequence = itertools.count()
+        self.turns = 0
+        self.waits = 0
+
+    async def acquire(self, lane, cost):
+        """Wait for a turn to process a frame of `cost` bytes"""
+        start = max(lane.finish, self.vtime)
+        lane.finish = start + cost
+        self.turns += 1
+        if self.active < self.slots and not self.waiting:
+            self.active += 1
+            self.vtime = start
+            return
+        self.waits += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiting, (start, next(self._sequence), future))
+        self._grant()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                # Granted a turn just as it was cancelled
+                self.release()
+            raise
+
+    def release(self):
+        self.active -= 1
+        self._grant()
+
+    def _grant(self):
+        while self.active < self.slots and self.waiting:
+            start, _, future = heapq.heappop(self.waiting)
+            if future.cancelled():
+                continue
+            self.vtime = start
+            self.active += 1
+            future.set_result(None)
+
+    def stats(self):
+        return {"active": self.active, "waiting": len(self.waiting),
+                "turns": self.turns, "waits": self.waits}
+
+
+def retire_lane(totals, lane):
+    """Fold a closed lane's counters into its stream's totals so they keep counting up"""
+    stats = lane.queue.stats()
+    totals["policy"] = stats["policy"]
+    for key in ("queued", "dropped", "processed"):
+        totals[key] = totals.get(key, 0) + stats[key]
+    totals["latency_total"] = totals.get("latency_total", 0.0) + lane.queue.latency_total
+    totals["latency_max"] = max(totals.get("latency_max", 0.0), stats["latency_max"])
+
+
+def merge_queue_stats(lanes, retired=None):
+    """One stream's queue stats summed over its lanes and the totals of closed ones"""
+    retired = retired or {}
+    stats = [lane.queue.stats() for lane in lanes]
+    processed = sum(s["processed"] for s in stats) + retired.get("processed", 0)
+    latency_total = (sum(lane.queue.latency_total for lane in lanes)
+                     + retired.get("latency_total", 0.0))
+    return {
+        "policy": stats[0]["policy"] if stats else retired["policy"],
+        "lanes": len(stats),
+        "depth": sum(s["depth"] for s in stats),
+        "queued": sum(s["queued"] for s in stats) + retired.get("queued", 0),
+        "dropped": sum(s["dropped"] for s in stats) + retired.get("dropped", 0),
+        "processed": processed,
+        "latency_avg": latency_total / processed if processed else 0.0,
+        "latency_max": max([s["latency_max"] for s in stats]
+                           + [retired.get("latency_max", 0.0)]),
+    }
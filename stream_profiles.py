@@ -0,0 +1,135 @@
+import os
+import asyncio
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# video is a dict of subscription options, or None to leave video off
+SubscriptionProfile = namedtuple("SubscriptionProfile", "name video audio transcript")
+
+PROFILES = {profile.name: profile for profile in (
+    SubscriptionProfile("full", {"quality": "high", "width": 1280, "height": 720, "fps": 30},
+                        True, True),
+    SubscriptionProfile("standard", {"quality": "medium", "width": 640, "height": 360, "fps": 15},
+                        True, True),
+    SubscriptionProfile("low", {"quality": "low", "width": 320, "height": 180, "fps": 5},
+                        True, True),
+    SubscriptionProfile("audio_only", None, True, True),
+    SubscriptionProfile("transcript_only", None, False, True),
+)}
+
+DEFAULT_PROFILE = os.getenv('RTMS_PROFILE', 'full')
+# Richest first; under overload the controller steps down this list
+LADDER = [name.strip() for name in
+          os.getenv('RTMS_PROFILE_LADDER', 'full,standard,low,audio_only').split(',')]
+
+ADAPTIVE = os.getenv('RTMS_ADAPTIVE', 'true').lower() == 'true'
+ADAPT_INTERVAL = float(os.getenv('RTMS_ADAPT_INTERVAL', '2'))
+# Average queue latency over an interval that counts as overloaded / idle
+HIGH_LAG = float(os.getenv('RTMS_ADAPT_HIGH_LAG', '0.5'))
+LOW_LAG = float(os.getenv('RTMS_ADAPT_LOW_LAG', '0.1'))
+# Calm intervals in a row before stepping back up
+RESTORE_AFTER = int(os.getenv('RTMS_ADAPT_RESTORE_AFTER', '5'))
+
+
+def get_profile(name):
+    profile = PROFILES.get(name)
+    if profile is None:
+        raise ValueError(f"Unknown subscription profile: {name}")
+    return profile
+
+
+def profile_streams(profile):
+    """Subscribe-message stream entries for a profile"""
+    streams = []
+    if profile.video is not None:
+        streams.append({"type": "video", "options": dict(profile.video)})
+    if profile.audio:
+        streams.append({"type": "audio"})
+    if profile.transcript:
+        streams.append({"type": "transcript"})
+    return streams
+
+
+class AdaptiveController:
+    """Steps a client's subscription down the ladder when processing lags
+
+    Each interval it looks at how long frames waited in the client's queues
+    and whether any were dropped. Overload moves one step leaner at once;
+    restoring a step needs RESTORE_AFTER calm intervals in a row, so the
+    subscription does not flap. It never goes richer than the profile the
+    meeting started with.
+    """
+
+    def __init__(self, client, ladder=None, interval=ADAPT_INTERVAL, high_lag=HIGH_LAG,
+                 low_lag=LOW_LAG, restore_after=RESTORE_AFTER):
+        self.client = client
+        self.ladder = list(ladder or LADDER)
+        if client.profile.name not in self.ladder:
+            self.ladder.insert(0, client.profile.name)
+        self.ceiling = self.ladder.index(client.profile.name)
+        self.level = self.ceiling
+        self.interval = interval
+        self.high_lag = high_lag
+        self.low_lag = low_lag
+        self.restore_after = restore_after
+        self.calm = 0
+        self.settling = False
+        self.lag = 0.0
+        self.switches = 0
+        self._last = {}
+
+    def _sample(self):
+        """Average queue latency and drops since the previous sample"""
+        latency = processed = dropped = 0
+        for key, lane in list(self.client.lanes.items()):
+            queue = lane.queue
+            previous = self._last.get(key, (0.0, 0, 0))
+            current = (queue.latency_total, queue.processed, queue.dropped)
+            if current[1] < previous[1]:
+                # Queue was recreated after a reconnect
+                previous = (0.0, 0, 0)
+            latency += current[0] - previous[0]
+            processed += current[1] - previous[1]
+            dropped += current[2] - previous[2]
+            self._last[key] = current
+        return (latency / processed if processed else 0.0), dropped
+
+    async def step(self):
+        self.lag, dropped = self._sample()
+        if self.settling:
+            # Frames queued before the switch are still draining; judge the next interval
+            self.settling = False
+            return
+        if self.lag > self.high_lag or dropped:
+            self.calm = 0
+            if self.level < len(self.ladder) - 1:
+                await self._switch(self.level + 1, f"lag {self.lag:.2f}s, {dropped} dropped")
+        elif self.lag < self.low_lag:
+            self.calm += 1
+            if self.calm >= self.restore_after and self.level > self.ceiling:
+                self.calm = 0
+                await self._switch(self.level - 1, f"lag {self.lag:.2f}s")
+        else:
+            self.calm = 0
+
+    async def _switch(self, level, reason):
+        profile = get_profile(self.ladder[level])
+        logger.info(f"Meeting {self.client.meeting_id}: switching to {profile.name} "
+                    f"subscription ({reason})")
+        self.level = level
+        self.switches += 1
+        self.settling = True
+        await self.client.resubscribe(profile)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.step()
+            except Exception as e:
+                logger.error(f"Error adapting subscription: {e}")
+
+    def stats(self):
+        return {"profile": self.ladder[self.level], "lag": self.lag, "switches": self.switches}
@@ -0,0 +1,28 @@
+import asyncio
+import numpy as np
+from stream_handlers import AudioAnalyzer, AudioRingBuffer
+
+
+def test_ring_buffer_keeps_tail_of_oversized_chunk():
+    ring = AudioRingBuffer(8)
+    assert ring.write(np.arange(20, dtype=np.int16)) == 8
+    assert ring.latest(8).tolist() == list(range(12, 20))
+
+
+def test_chunk_longer_than_buffer_is_analyzed():
+    analyzer = AudioAnalyzer(sample_rate=1000, buffer_seconds=0.1, frame_ms=20)
+    loud = np.full(250, 3000, np.int16)
+    asyncio.run(analyzer.handle_audio(loud.tobytes(), participant_id=1))
+    state = analyzer.participants[1]
+    # 100 samples fit the ring: five 20-sample frames, nothing left pending
+    assert state.frames == 5
+    assert state.pending == 0
+    assert analyzer.stats()["participants"]["1"]["speaking"]
+
+
+def test_odd_length_payload_drops_trailing_byte():
+    analyzer = AudioAnalyzer(sample_rate=1000, buffer_seconds=1, frame_ms=20)
+    payload = np.full(20, 3000, np.int16).tobytes() + b"\x01"
+    asyncio.run(analyzer.handle_audio(payload, participant_id=1))
+    assert analyzer.samples_processed == 20
+    assert analyzer.participants[1].frames == 1
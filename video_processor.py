@@ -3,99 +3,286 @@ import cv2
 import numpy as np
 import asyncio
 import base64
+import functools
 import time
 import logging
-from datetime import datetime
 from rtms_client import ZoomRTMSClient
+from frame_workers import (FrameWorkerPool, OrderedResults, decode_frame,
+                           EXECUTION_MODE, EXECUTION_MODES, INLINE, WORKERS)
+from frame_sinks import BatchedFrameWriter
+from face_detection import FaceTracker, FACE_DETECTION, detect_faces as detect_faces_scaled
+from frame_batcher import FrameBatcher, BATCH_SIZE
+from frame_filter import FrameFilter, DEDUP, CHANGE_THRESHOLD
+from metrics import registry, log_sampled
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+FRAMES = registry.counter("video_frames_total", "Video frames by outcome", ["outcome"])
+DECODE_SECONDS = registry.histogram("video_decode_seconds",
+                                    "Time to decode a video frame, including waiting for a worker")
+FPS = registry.gauge("video_processing_fps", "Frames processed per second over the last window",
+                     ["meeting_id"])
+PARTICIPANT_FPS = registry.gauge("video_participant_fps",
+                                 "Frames processed per second over the last window, per participant",
+                                 ["meeting_id", "participant_id"])
+# Seconds of frames each FPS reading covers
+FPS_WINDOW = 5.0
+SKIP_RATIO = registry.gauge("video_skip_ratio",
+                            "Share of frames skipped as duplicate or unchanged", ["meeting_id"])
+
+class ParticipantVideo:
+    """One participant's output, counters and face tracking"""
+    
+    def __init__(self, sink, face_tracker=None, fps_gauge=None):
+        self.sink = sink
+        self.face_tracker = face_tracker
+        self.fps_gauge = fps_gauge
+        self.last_faces = []
+        self.last_analysis = None
+        self.frame_count = 0
+        self.first_frame_at = time.time()
+        self.last_frame_at = None
+        # FPS over the last completed window
+        self.fps = 0.0
+        self.window_start = self.first_frame_at
+        self.window_frames = 0
+
+    def count_frame(self, now):
+        """Count a processed frame; True when it completes an FPS window"""
+        self.window_frames += 1
+        elapsed = now - self.window_start
+        if elapsed < FPS_WINDOW:
+            return False
+        self.fps = self.window_frames / elapsed
+        if self.fps_gauge is not None:
+            self.fps_gauge.set(self.fps)
+        self.window_start = now
+        self.window_frames = 0
+        return True
+
+    def current_fps(self, now):
+        """The last window's FPS, or the rate so far before the first window completes"""
+        if self.fps or now - self.first_frame_at >= FPS_WINDOW:
+            return self.fps
+        return self.frame_count / (now - self.first_frame_at) if now > self.first_frame_at else 0.0
+
 class VideoProcessor:
-    def __init__(self, output_dir="video_output"):
+    def __init__(self, output_dir="video_output", execution_mode=EXECUTION_MODE,
+                 workers=WORKERS, max_in_flight=None, sink=None,
+                 face_detection=FACE_DETECTION, analysis_batch_size=BATCH_SIZE, meeting_id=None,
+                 dedup=DEDUP, change_threshold=CHANGE_THRESHOLD):
         self.output_dir = output_dir
+        self.meeting_id = str(meeting_id or "default")
         
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
         
-        # Initialize frame counter
+        # Initialize frame counter (all participants)
         self.frame_count = 0
         
-        # Track processing metrics
-        self.start_time = None
-        self.processed_frames = 0
+        # Per-participant state; each participant's frames are written by their own
+        # background batched writer under output_dir/participant_<id>, unless a
+        # shared sink is given
+        self.sink = sink
+        self.participants = {}
+        
+        # Track processing metrics; FPS is kept per participant
+        self._fps = FPS.labels(self.meeting_id)
+        self._processed = FRAMES.labels("processed")
+        self._undecodable = FRAMES.labels("undecodable")
+        self._failed = FRAMES.labels("failed")
+        self._duplicate = FRAMES.labels("duplicate")
+        self._unchanged = FRAMES.labels("unchanged")
+        self._skip_ratio = SKIP_RATIO.labels(self.meeting_id)
+        
+        # Skips exact duplicates before decoding and near-static frames after
+        self.filter = FrameFilter(dedup, change_threshold)
+        self._decode_seconds = DECODE_SECONDS.labels()
+        
+        # Optional worker pool so decoding stays off the event loop thread
+        if execution_mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {execution_mode}")
+        self.pool = None if execution_mode == INLINE else FrameWorkerPool(execution_mode, workers)
+        self.max_in_flight = max_in_flight or workers * 2
+        self._in_flight = None
+        self.ordered = OrderedResults(self.handle_processed_frame)
+        
+        # Optional face detection, detecting every N frames and tracking in between
+        self.face_detection = face_detection
         
         # Optional: Initialize any ML models here
         # self.model = load_model()
+        
+        # Optional batched analysis; frames are grouped before inference
+        self.batcher = (FrameBatcher(self.analyze_batch, analysis_batch_size)
+                        if analysis_batch_size > 0 else None)
+    
+    def participant(self, participant_id):
+        """State for a participant, created on their first frame"""
+        state = self.participants.get(participant_id)
+        if state is None:
+            if self.sink is not None:
+                sink = self.sink
+            else:
+                output_dir = (self.output_dir if participant_id is None else
+                              os.path.join(self.output_dir, f"participant_{participant_id}"))
+                os.makedirs(output_dir, exist_ok=True)
+                sink = BatchedFrameWriter(output_dir)
+            state = self.participants[participant_id] = ParticipantVideo(
+                sink, FaceTracker() if self.face_detection else None,
+                PARTICIPANT_FPS.labels(self.meeting_id, str(participant_id)))
+        return state
+
+    @property
+    def fps(self):
+        """Meeting FPS: the sum of its participants' FPS"""
+        return sum(state.fps for state in list(self.participants.values()))
     
-    async def process_frame(self, frame_data):
+    async def process_frame(self, frame_data, participant_id=None, timestamp=None):
         """Process a single video frame"""
-        if self.start_time is None:
-            self.start_time = time.time()
-        
         try:
-            # Decode the frame data (assuming it's base64 encoded)
+            # Decode the frame data
             # Note: The actual format of frame_data depends on Zoom's RTMS implementation
             # You may need to adjust this based on the actual data format
-            try:
-                # If the data is base64 encoded
+            if isinstance(frame_data, str):
+                # JSON messages carry base64 encoded frames
                 decoded_data = base64.b64decode(frame_data)
-            except:
-                # If it's already binary
+            else:
+                # Binary frames arrive as bytes or a memoryview into the message
                 decoded_data = frame_data
             
-            # Convert to numpy array
-            np_arr = np.frombuffer(decoded_data, np.uint8)
-            
-            # Decode the image
-            frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-            
-            if frame is None:
-                logger.warning("Failed to decode frame")
+            if not self.filter.check_payload(participant_id, decoded_data):
+                self._duplicate.inc()
                 return
             
-            # Example: Apply some processing (grayscale conversion)
-            processed_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # Example: Detect faces (if needed)
-            # faces = self.detect_faces(frame)
-            
-            # Example: Apply a model for analysis
-            # results = self.analyze_frame(frame)
-            
-            # Save the processed frame (for debugging/testing)
-            self.save_frame(processed_frame)
+            if self.pool is None:
+                # Decode and convert to grayscale on the calling thread
+                started = time.perf_counter()
+                processed_frame = decode_frame(decoded_data)
+                self._decode_seconds.observe(time.perf_counter() - started)
+                await self.handle_processed_frame(processed_frame, participant_id)
+                return
             
-            # Update metrics
-            self.processed_frames += 1
-            elapsed = time.time() - self.start_time
-            if elapsed > 5:  # Log stats every 5 seconds
-                fps = self.processed_frames / elapsed
-                logger.info(f"Processing at {fps:.2f} FPS")
-                self.start_time = time.time()
-                self.processed_frames = 0
+            # Hand off to a worker; results are emitted in order per participant
+            if self._in_flight is None:
+                self._in_flight = asyncio.Semaphore(self.max_in_flight)
+            await self._in_flight.acquire()
+            future = asyncio.ensure_future(self._timed_decode(decoded_data))
+            future.add_done_callback(lambda _: self._in_flight.release())
+            self.ordered.add(participant_id, future)
                 
         except Exception as e:
+            self._failed.inc()
             logger.error(f"Error processing frame: {e}")
     
-    def save_frame(self, frame, prefix="frame"):
-        """Save a frame to disk"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{self.output_dir}/{prefix}_{timestamp}_{self.frame_count}.jpg"
-        cv2.imwrite(filename, frame)
+    async def _timed_decode(self, data):
+        started = time.perf_counter()
+        try:
+            return await self.pool.decode(data)
+        finally:
+            self._decode_seconds.observe(time.perf_counter() - started)
+    
+    async def handle_processed_frame(self, processed_frame, participant_id=None):
+        """Save a decoded grayscale frame and update metrics"""
+        if processed_frame is None:
+            self._undecodable.inc()
+            log_sampled(logger, "undecodable", logging.WARNING, "Failed to decode frame")
+            return
+        
+        # Nothing worth analyzing or saving since the participant's last kept frame
+        if not self.filter.check_frame(participant_id, processed_frame):
+            self._unchanged.inc()
+            return
+        
+        state = self.participant(participant_id)
+        
+        # Detect faces (if enabled) off the event loop thread
+        if state.face_tracker is not None:
+            state.last_faces = await asyncio.to_thread(state.face_tracker.update, processed_frame)
+        
+        # Example: Apply a model for analysis, batched across frames (and participants)
+        if self.batcher is not None:
+            analysis = await self.batcher.submit(processed_frame)
+            analysis.add_done_callback(functools.partial(self._store_analysis, state))
+        
+        # Save the processed frame (for debugging/testing)
+        await self.save_frame(processed_frame, participant_id)
+        
+        # Update metrics; gauges move when the participant's FPS window completes
+        self._processed.inc()
+        if state.count_frame(time.time()):
+            self._fps.set(self.fps)
+            self._skip_ratio.set(self.filter.stats()["skip_ratio"])
+            if logger.isEnabledFor(logging.DEBUG):
+                lag = max(state.sink.stats()["queue_lag"] for state in self.participants.values())
+                logger.debug(f"Processing at {self.fps:.2f} FPS for {len(self.participants)} "
+                             f"participants; writer queue lag up to {lag:.2f}s")
+    
+    @staticmethod
+    def _store_analysis(state, future):
+        if not future.cancelled() and future.exception() is None:
+            state.last_analysis = future.result()
+    
+    async def close(self):
+        """Wait for in-flight frames, flush the writer and shut down the worker pool"""
+        await self.ordered.join()
+        if self.batcher is not None:
+            await self.batcher.close()
+        if self.sink is not None:
+            await self.sink.close()
+        else:
+            for state in self.participants.values():
+                await state.sink.close()
+        if self.pool is not None:
+            await asyncio.to_thread(self.pool.shutdown)
+            self.pool = None
+        FPS.remove(self.meeting_id)
+        SKIP_RATIO.remove(self.meeting_id)
+        for participant_id in self.participants:
+            PARTICIPANT_FPS.remove(self.meeting_id, str(participant_id))
+    
+    async def release_participant(self, participant_id):
+        """Finish a departed participant's frames and free their writer, tracker and filter state"""
+        if not await self.ordered.release(participant_id):
+            # Frames arrived again while waiting; the participant is back
+            return
+        state = self.participants.pop(participant_id, None)
+        self.filter.forget(participant_id)
+        if state is None:
+            return
+        PARTICIPANT_FPS.remove(self.meeting_id, str(participant_id))
+        self._fps.set(self.fps)
+        if state.sink is not self.sink:
+            await state.sink.close()
+    
+    async def save_frame(self, frame, participant_id=None):
+        """Queue a frame for the participant's background writer"""
+        state = self.participant(participant_id)
+        await state.sink.write(frame)
+        state.frame_count += 1
+        state.last_frame_at = time.time()
         self.frame_count += 1
     
+    def participant_stats(self):
+        """Frames, frame rate and latest faces per participant"""
+        now = time.time()
+        return {
+            str(participant_id): {
+                "frames": state.frame_count,
+                "fps": state.current_fps(now),
+                "last_frame_at": state.last_frame_at,
+                "faces": len(state.last_faces),
+            }
+            for participant_id, state in list(self.participants.items())
+        }
+    
     def detect_faces(self, frame):
         """Example function to detect faces in a frame"""
-        # Load a pre-trained face detector
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        
         # Convert to grayscale for face detection
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         
-        # Detect faces
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+        # Detect faces with the cached detector on a downscaled copy
+        faces = detect_faces_scaled(gray)
         
         # Draw rectangles around faces
         for (x, y, w, h) in faces:
@@ -103,7 +290,8 @@ class VideoProcessor:
         
         return faces
     
-    def analyze_frame(self, frame):
+    @staticmethod
+    def analyze_frame(frame):
         """Example function to analyze a frame with a ML model"""
         # This is a placeholder for your actual model inference code
         # For example, you might use a pre-trained model for object detection
@@ -119,6 +307,17 @@ class VideoProcessor:
         
         # Return results
         return {"objects_detected": ["person", "laptop"]}
+    
+    @staticmethod
+    def analyze_batch(batch):
+        """Example function to analyze a batch of preprocessed frames with a ML model"""
+        # batch is a float32 array of shape (N, 224, 224), already resized and normalized
+        
+        # Run inference on the whole batch at once
+        # results = self.model.predict(batch[..., np.newaxis])
+        
+        # Return one result per frame
+        return [{"objects_detected": ["person", "laptop"]} for _ in range(len(batch))]
 
 async def process_meeting_video(meeting_id):
     """Process video from a specific meeting"""
@@ -140,6 +339,7 @@ async def process_meeting_video(meeting_id):
     finally:
         # Close connection when done
         await client.close()
+        await processor.close()
 
 # Main function to run the video processor
 async def main():
@@ -150,4 +350,5 @@ async def main():
     await process_meeting_video(meeting_id)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     asyncio.run(main())
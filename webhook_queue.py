@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import queue
+import hashlib
+import sqlite3
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+EVENT_DB_PATH = os.getenv('WEBHOOK_EVENT_DB', 'webhook_events.db')
+EVENT_CONSUMERS = int(os.getenv('WEBHOOK_CONSUMERS', '2'))
+MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '5'))
+# Processed events older than this are pruned at startup
+RETENTION_HOURS = float(os.getenv('WEBHOOK_RETENTION_HOURS', '72'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    body BLOB NOT NULL,
+    received_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    retry_at REAL NOT NULL DEFAULT 0,
+    event_key TEXT,
+    error TEXT,
+    ordering_key TEXT
+);
+CREATE INDEX IF NOT EXISTS events_status ON events (status, id);
+CREATE TABLE IF NOT EXISTS processed_keys (
+    event_key TEXT PRIMARY KEY,
+    event_id INTEGER NOT NULL,
+    processed_at REAL
+);
+"""
+
+
+def event_key(body):
+    """Idempotency key: Zoom retries resend the same event, timestamp and object"""
+    obj = body.get("payload", {}).get("object", {})
+    identity = obj.get("uuid") or obj.get("id") or ""
+    raw = f"{body.get('event')}:{body.get('event_ts')}:{identity}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def ordering_key(body):
+    """Meeting an event belongs to; a meeting's events are handled in arrival order"""
+    try:
+        identity = json.loads(body).get("payload", {}).get("object", {}).get("id")
+    except (ValueError, AttributeError):
+        return None
+    return str(identity) if identity is not None else None
+
+
+class EventLog:
+    """Durable append-only webhook log in SQLite
+
+    append() returns once the raw body is committed. Appends from concurrent
+    requests are group-committed by a single writer thread, so an ack costs
+    one shared transaction rather than one fsync per request.
+
+    Consumers run concurrently, but an event is not claimed while an
+    earlier event for the same meeting is still pending or processing, so
+    a meeting's events (including retries) are handled in order.
+    """
+
+    def __init__(self, path=EVENT_DB_PATH):
+        self.path = path
+        self._writes = queue.Queue()
+        self._writer = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self._available = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def open(self):
+        self._conn = self._connect()
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(events)")}
+        if "ordering_key" not in columns:
+            # Logs written before events were ordered per meeting
+            self._conn.execute("ALTER TABLE events ADD COLUMN ordering_key TEXT")
+            rows = self._conn.execute(
+                "SELECT id, body FROM events WHERE status IN ('pending', 'processing')").fetchall()
+            self._conn.executemany("UPDATE events SET ordering_key = ? WHERE id = ?",
+                                   [(ordering_key(body), event_id) for event_id, body in rows])
+        self._conn.execute("CREATE INDEX IF NOT EXISTS events_ordering ON events (ordering_key, id)")
+        # Events claimed by a consumer that died are retried
+        self._conn.execute("UPDATE events SET status = 'pending' WHERE status = 'processing'")
+        self._conn.execute("DELETE FROM processed_keys WHERE processed_at IS NULL")
+        cutoff = time.time() - RETENTION_HOURS * 3600
+        self._conn.execute("DELETE FROM events WHERE status IN ('done', 'duplicate') AND received_at < ?", (cutoff,))
+        self._conn.execute("DELETE FROM processed_keys WHERE processed_at < ?", (cutoff,))
+        self._available = asyncio.Event()
+        self._writer = threading.Thread(target=self._write_loop, args=(asyncio.get_running_loop(),),
+                                        name="webhook-log-writer", daemon=True)
+        self._writer.start()
+
+    def _write_loop(self, loop):
+        conn = self._connect()
+        while True:
+            item = self._writes.get()
+            if item is None:
+                break
+            batch = [item]
+            # Group-commit everything that queued up while we were waiting
+            while True:
+                try:
+                    item = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._writes.put(None)
+                    break
+                batch.append(item)
+            now = time.time()
+            try:
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "INSERT INTO events (body, received_at, ordering_key) VALUES (?, ?, ?)",
+                    [(body, now, ordering_key(body)) for body, _ in batch])
+                conn.execute("COMMIT")
+                error = None
+            except sqlite3.Error as e:
+                conn.execute("ROLLBACK")
+                error = e
+            for _, future in batch:
+                loop.call_soon_threadsafe(self._resolve, future, error)
+        conn.close()
+
+    def _resolve(self, future, error):
+        if future.done():
+            return
+        if error is None:
+            future.set_result(None)
+            self._available.set()
+        else:
+            future.set_exception(error)
+
+    async def append(self, body):
+        """Durably record a raw webhook body"""
+        future = asyncio.get_running_loop().create_future()
+        self._writes.put((body, future))
+        await future
+
+    def _claim(self, limit):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute(
+                "SELECT id, body, attempts FROM events AS e "
+                "WHERE status = 'pending' AND retry_at <= ? AND (ordering_key IS NULL OR NOT EXISTS ("
+                "  SELECT 1 FROM events AS earlier WHERE earlier.ordering_key = e.ordering_key "
+                "  AND earlier.id < e.id AND earlier.status IN ('pending', 'processing'))) "
+                "ORDER BY id LIMIT ?", (time.time(), limit)).fetchall()
+            self._conn.executemany("UPDATE events SET status = 'processing' WHERE id = ?",
+                                   [(row[0],) for row in rows])
+            self._conn.execute("COMMIT")
+            return rows
+
+    def _reserve_key(self, event_id, key):
+        """Reserve an idempotency key; False means another delivery already has it"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO processed_keys (event_key, event_id) VALUES (?, ?)",
+                (key, event_id))
+            return cursor.rowcount == 1
+
+    def _finish(self, event_id, key, status, error=None, release_key=False, retry_in=0):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "UPDATE events SET status = ?, event_key = ?, error = ?, attempts = attempts + 1, "
+                "retry_at = ? WHERE id = ?", (status, key, error, time.time() + retry_in, event_id))
+            if release_key:
+                self._conn.execute("DELETE FROM processed_keys WHERE event_key = ? AND event_id = ?",
+                                   (key, event_id))
+            elif status == "done":
+                self._conn.execute("UPDATE processed_keys SET processed_at = ? WHERE event_key = ?",
+                                   (time.time(), key))
+            self._conn.execute("COMMIT")
+
+    async def wait_for_events(self, timeout):
+        try:
+            await asyncio.wait_for(self._available.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._available.clear()
+
+    async def process(self, event_id, body, attempts, handler):
+        """Run the handler for one event at most once per idempotency key"""
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            await asyncio.to_thread(self._finish, event_id, None, "failed", str(e))
+            return
+        key = event_key(data)
+        if not await asyncio.to_thread(self._reserve_key, event_id, key):
+            await asyncio.to_thread(self._finish, event_id, key, "duplicate")
+            return
+        try:
+            await handler(data)
+        except Exception as e:
+            logger.error(f"Error handling webhook event {event_id}: {e}")
+            status = "failed" if attempts + 1 >= MAX_ATTEMPTS else "pending"
+            await asyncio.to_thread(self._finish, event_id, key, status, str(e), True, 2 ** attempts)
+            return
+        await asyncio.to_thread(self._finish, event_id, key, "done")
+
+    async def consume(self, handler, batch_size=10):
+        """Consumer loop: claim pending events and process them in order
+
+        A batch holds at most one event per meeting, so concurrent consumers
+        never handle two events of one meeting at once.
+        """
+        while True:
+            rows = await asyncio.to_thread(self._claim, batch_size)
+            if not rows:
+                await self.wait_for_events(1.0)
+                continue
+            for event_id, body, attempts in rows:
+                await self.process(event_id, body, attempts, handler)
+            # Events held back behind this batch can be claimed now
+            self._available.set()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM events GROUP BY status").fetchall())
+        counts["write_queue"] = self._writes.qsize()
+        return counts
+
+    def close(self):
+        if self._writer is not None:
+            self._writes.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# Shared log used by the webhook app
+event_log = EventLog()
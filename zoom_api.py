@@ -0,0 +1,89 @@
+import os
+import asyncio
+import logging
+import httpx
+from zoom_auth import token_provider
+from zoom_ratelimit import RateLimitScheduler
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+API_BASE_URL = os.getenv('ZOOM_API_BASE_URL', "https://api.zoom.us/v2")
+
+# Connection pool and concurrency settings
+MAX_CONNECTIONS = int(os.getenv('ZOOM_API_MAX_CONNECTIONS', '100'))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('ZOOM_API_MAX_KEEPALIVE', '20'))
+KEEPALIVE_EXPIRY = float(os.getenv('ZOOM_API_KEEPALIVE_EXPIRY', '30'))
+MAX_CONCURRENCY = int(os.getenv('ZOOM_API_CONCURRENCY', '50'))
+REQUEST_TIMEOUT = float(os.getenv('ZOOM_API_TIMEOUT', '10'))
+CONNECT_TIMEOUT = float(os.getenv('ZOOM_API_CONNECT_TIMEOUT', '5'))
+
+
+class ZoomAPIClient:
+    """Async Zoom REST client sharing one pooled HTTP/2 connection set"""
+
+    def __init__(self, base_url=API_BASE_URL, max_connections=MAX_CONNECTIONS,
+                 max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry=KEEPALIVE_EXPIRY, max_concurrency=MAX_CONCURRENCY,
+                 timeout=REQUEST_TIMEOUT, connect_timeout=CONNECT_TIMEOUT,
+                 tokens=None, scheduler=None):
+        self.base_url = base_url
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_concurrency = max_concurrency
+        self.tokens = tokens or token_provider
+        self.scheduler = scheduler or RateLimitScheduler()
+
+        # Created lazily so they bind to the event loop that uses them
+        self._client = None
+        self._semaphore = None
+
+    def _get_client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(base_url=self.base_url, http2=True,
+                                             limits=self.limits, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def _send(self, client, method, path, headers, **kwargs):
+        async def send():
+            token = await self.tokens.get_access_token_async()
+            async with self._semaphore:
+                return await client.request(method, path, headers={
+                    **headers, "Authorization": f"Bearer {token}"}, **kwargs)
+
+        return await self.scheduler.execute(method, path, send)
+
+    async def request(self, method, path, headers=None, **kwargs):
+        """Send an authenticated, rate-limited request
+
+        429 and 5xx responses are retried by the scheduler; a 401 is retried
+        once with a fresh token.
+        """
+        client = self._get_client()
+        headers = headers or {}
+        response = await self._send(client, method, path, headers, **kwargs)
+        if response.status_code == 401:
+            # Token revoked or expired early; drop it and try again
+            self.tokens.invalidate()
+            response = await self._send(client, method, path, headers, **kwargs)
+        return response
+
+    async def get(self, path, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def aclose(self):
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Shared client used across the app
+zoom_api = ZoomAPIClient()
+registry.add_collector(zoom_api.scheduler.collect_metrics)
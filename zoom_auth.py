@@ -0,0 +1,142 @@
+import os
+import time
+import asyncio
+import threading
+import logging
+import requests
+from requests.auth import HTTPBasicAuth
+
+logger = logging.getLogger(__name__)
+
+# Zoom API credentials
+ACCOUNT_ID = os.getenv('ZOOM_ACCOUNT_ID')
+CLIENT_ID = os.getenv('ZOOM_CLIENT_ID')
+CLIENT_SECRET = os.getenv('ZOOM_CLIENT_SECRET')
+
+# Refresh this many seconds before Zoom says the token expires
+TOKEN_REFRESH_MARGIN = int(os.getenv('ZOOM_TOKEN_REFRESH_MARGIN', '300'))
+
+TOKEN_URL = os.getenv('ZOOM_TOKEN_URL', "https://zoom.us/oauth/token")
+
+
+class TokenProvider:
+    """Caches the Server-to-Server OAuth token shared by every Zoom API caller"""
+
+    def __init__(self, account_id=None, client_id=None, client_secret=None,
+                 refresh_margin=TOKEN_REFRESH_MARGIN):
+        self.account_id = account_id or ACCOUNT_ID
+        self.client_id = client_id or CLIENT_ID
+        self.client_secret = client_secret or CLIENT_SECRET
+        self.refresh_margin = refresh_margin
+
+        self.access_token = None
+        self.expires_at = 0.0
+        self.last_error = None
+
+        # Single-flight guards: one for threads, one in-flight future for coroutines
+        self._lock = threading.Lock()
+        self._inflight = None
+        self._refresh_task = None
+
+    def is_valid(self):
+        """Whether the cached token is usable without refreshing"""
+        return self.access_token is not None and time.time() < self.expires_at - self.refresh_margin
+
+    def invalidate(self):
+        """Drop the cached token, e.g. after Zoom answers 401"""
+        with self._lock:
+            self.access_token = None
+            self.expires_at = 0.0
+
+    def _store(self, token_data):
+        """Cache a token response and return the access token"""
+        token = token_data.get('access_token')
+        if not token:
+            self.last_error = token_data
+            logger.error(f"Zoom token response had no access_token: {token_data}")
+            return None
+        self.access_token = token
+        self.expires_at = time.time() + int(token_data.get('expires_in', 3600))
+        self.last_error = None
+        return token
+
+    def _fetch_token(self):
+        """POST to Zoom's OAuth endpoint and return the raw token response"""
+        params = {"grant_type": "account_credentials", "account_id": self.account_id}
+        response = requests.post(TOKEN_URL, params=params,
+                                 auth=HTTPBasicAuth(self.client_id, self.client_secret))
+        response.raise_for_status()
+        return response.json()
+
+    def _refresh(self):
+        """Fetch and cache a new token, returning None on failure"""
+        try:
+            return self._store(self._fetch_token())
+        except requests.exceptions.RequestException as e:
+            self.last_error = {"error": "request_failed", "reason": str(e)}
+            logger.error(f"Failed to get access token: {e}")
+            return None
+
+    def get_access_token(self, force_refresh=False):
+        """Return a cached token, refreshing it at most once across threads"""
+        if not force_refresh and self.is_valid():
+            return self.access_token
+        with self._lock:
+            # Another thread may have refreshed while we waited
+            if not force_refresh and self.is_valid():
+                return self.access_token
+            return self._refresh()
+
+    async def get_access_token_async(self, force_refresh=False):
+        """Return a cached token without blocking the event loop
+
+        Concurrent callers share one in-flight refresh, so a burst of webhooks
+        triggers a single POST to Zoom.
+        """
+        if not force_refresh and self.is_valid():
+            return self.access_token
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(
+                asyncio.to_thread(self.get_access_token, force_refresh))
+        return await asyncio.shield(self._inflight)
+
+    async def _refresh_loop(self):
+        """Refresh the token shortly before it expires"""
+        while True:
+            if self.is_valid():
+                delay = self.expires_at - self.refresh_margin - time.time()
+            else:
+                await self.get_access_token_async(force_refresh=True)
+                # Back off briefly if Zoom refused us
+                delay = 0 if self.is_valid() else 30
+            await asyncio.sleep(max(delay, 1))
+
+    def start_background_refresh(self):
+        """Start proactive refreshing on the running event loop"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self._refresh_loop())
+        return self._refresh_task
+
+    async def stop_background_refresh(self):
+        """Cancel the proactive refresh task"""
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+
+# Shared provider used across the app
+token_provider = TokenProvider()
+
+
+def get_access_token():
+    """Get a cached OAuth access token from Zoom"""
+    return token_provider.get_access_token()
+
+
+async def get_access_token_async():
+    """Get a cached OAuth access token from Zoom without blocking"""
+    return await token_provider.get_access_token_async()
@@ -1,19 +1,37 @@
 import os
-from fastapi import FastAPI, Request, BackgroundTasks, HTTPException
+from fastapi import FastAPI, Request, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import requests
 from dotenv import load_dotenv
 import uvicorn
-from requests.auth import HTTPBasicAuth
-import hashlib
-import hmac
+import json
 import asyncio
-from rtms_client import ZoomRTMSClient
-from video_processor import VideoProcessor
+import logging
+from typing import Optional
 
+# Settings are read when modules are imported, so .env is loaded first
 load_dotenv()
 
+from rtms_sessions import session_manager as local_session_manager
+from rtms_workers import ShardedSessionManager, RemoteSessionManager, RTMS_WORKERS, RTMS_NODE_URL
+from zoom_auth import token_provider
+from zoom_api import zoom_api
+from webhook_queue import event_log, EVENT_CONSUMERS
+from webhook_auth import webhook_verifier, VERIFY_SIGNATURES
+from recording_downloader import recording_downloader, DownloadError
+from recording_analysis import RECORDING_ANALYSIS
+from metrics import registry, family, CONTENT_TYPE
+from stream_profiles import PROFILES
+
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'),
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# "webhook" serves webhooks, recordings and the Zoom API and hands meeting starts
+# and stops to the RTMS node at RTMS_NODE_URL; "full" runs RTMS sessions itself
+SERVICE_MODE = os.getenv('SERVICE_MODE', 'full')
+WEBHOOK_ONLY = SERVICE_MODE == 'webhook'
+
 app = FastAPI()
 
 app.add_middleware(
@@ -24,122 +42,220 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-ACCOUNT_ID = os.getenv('ZOOM_ACCOUNT_ID')
-CLIENT_ID = os.getenv('ZOOM_CLIENT_ID')
-CLIENT_SECRET = os.getenv('ZOOM_CLIENT_SECRET')
 VERIFICATION_TOKEN = os.getenv('ZOOM_VERIFICATION_TOKEN')
 
+# Events that start or stop RTMS sessions
+RTMS_EVENTS = ("meeting.started", "meeting.ended")
+
+# Hand RTMS sessions to worker processes when RTMS_WORKERS is set
+rtms_forwarder = None
+if WEBHOOK_ONLY:
+    session_manager = None
+    if RTMS_NODE_URL:
+        rtms_forwarder = RemoteSessionManager(RTMS_NODE_URL)
+elif RTMS_WORKERS:
+    session_manager = ShardedSessionManager(RTMS_WORKERS)
+else:
+    session_manager = local_session_manager
+if session_manager is not None:
+    registry.add_collector(session_manager.collect_metrics)
+
 class ZoomEvent(BaseModel):
     event: str
     payload: dict
 
-def get_access_token():
-    url = f"https://zoom.us/oauth/token?grant_type=account_credentials&account_id={ACCOUNT_ID}"
-    response = requests.post(url, auth=HTTPBasicAuth(CLIENT_ID, CLIENT_SECRET))
-    return response.json().get('access_token')
+event_consumers = []
 
-async def process_recording(meeting_id: str, access_token: str):
-    headers = {"Authorization": f"Bearer {access_token}"}
-    
-    # Get recording info
-    recording_url = f"https://api.zoom.us/v2/meetings/{meeting_id}/recordings"
-    response = requests.get(recording_url, headers=headers)
-    
-    if response.status_code == 200:
-        recording_data = response.json()
-        # Process recording data here
-        # Save to database, analyze, etc.
-        return recording_data
-    return None
+@app.on_event("startup")
+async def start_background_services():
+    """Keep the shared OAuth token warm, start event consumers and RTMS workers"""
+    token_provider.start_background_refresh()
+    event_log.open()
+    for _ in range(EVENT_CONSUMERS):
+        event_consumers.append(asyncio.create_task(event_log.consume(handle_zoom_event)))
+    if rtms_forwarder is not None:
+        logger.info(f"Running in webhook-only mode; RTMS sessions go to {RTMS_NODE_URL}")
+    elif WEBHOOK_ONLY:
+        logger.warning("Running in webhook-only mode without RTMS_NODE_URL; "
+                       "meeting start/end webhooks are refused so Zoom redelivers them")
+    elif RTMS_WORKERS:
+        await session_manager.start_workers()
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    """Stop event consumers, RTMS sessions, token refreshing and Zoom API connections"""
+    for task in event_consumers:
+        task.cancel()
+    await asyncio.gather(*event_consumers, return_exceptions=True)
+    event_log.close()
+    if session_manager is not None:
+        await session_manager.shutdown()
+    if rtms_forwarder is not None:
+        await rtms_forwarder.shutdown()
+    await token_provider.stop_background_refresh()
+    await zoom_api.aclose()
+
+async def download_and_analyze(meeting_id, recording_files, download_token=None):
+    """Download a meeting's recording files, then analyze the MP4s if enabled
+
+    Raises DownloadError if any file failed, before analyzing anything, so a
+    retry resumes the failed files and then analyzes the whole recording.
+    """
+    results = await recording_downloader.download_recording(meeting_id, recording_files,
+                                                            download_token)
+    failed = [result["path"] for result in results if "error" in result]
+    if failed:
+        raise DownloadError(f"Failed to download {len(failed)} of {len(results)} recording files "
+                            f"for meeting {meeting_id}: {', '.join(failed)}")
+    if not RECORDING_ANALYSIS:
+        return
+    from recording_analysis import analyze_recording_async
+    for result in results:
+        if result["path"].endswith(".mp4"):
+            try:
+                await analyze_recording_async(result["path"])
+            except Exception as e:
+                logger.error(f"Error analyzing recording {result['path']}: {e}")
+
+async def process_recording(meeting_id: str, recording_files, download_token=None):
+    """Download and analyze the files a recording.completed webhook lists
+
+    The files come from the webhook rather than /meetings/{id}/recordings,
+    which for a recurring meeting ID can still list a previous instance.
+    Runs on an event consumer, so the event is only marked done once the
+    files are on disk; a failure or restart retries it from the event log.
+    """
+    await download_and_analyze(meeting_id, recording_files, download_token)
 
 @app.get("/")
 async def health_check():
     """Health check endpoint for Render and Zoom webhook validation"""
     return {"status": "ok"}
 
+@app.get("/zoom-api/stats")
+async def zoom_api_stats():
+    """Queue depth, throttle and retry counts per Zoom rate-limit category"""
+    return zoom_api.scheduler.stats()
+
 @app.post("/webhook")
-async def zoom_webhook(request: Request, background_tasks: BackgroundTasks):
-    body = await request.json()
-    event_type = body.get("event")
+async def zoom_webhook(request: Request):
+    raw_body = await request.body()
+    
+    # Reject unauthenticated requests before any parsing or queueing
+    if VERIFY_SIGNATURES:
+        reason = webhook_verifier.verify(raw_body,
+                                         request.headers.get("x-zm-request-timestamp"),
+                                         request.headers.get("x-zm-signature"))
+        if reason is not None:
+            return Response(status_code=401)
     
-    # Handle Zoom's URL validation
-    if event_type == "endpoint.url_validation":
+    # Handle Zoom's URL validation inline; it needs the hash in the response
+    if b"endpoint.url_validation" in raw_body:
+        body = json.loads(raw_body)
         plain_token = body.get("payload", {}).get("plainToken")
-        if plain_token and VERIFICATION_TOKEN:
-            # Generate hash for validation
-            encoded_token = plain_token.encode('utf-8')
-            encoded_secret = VERIFICATION_TOKEN.encode('utf-8')
-            hash_object = hmac.new(encoded_secret, encoded_token, hashlib.sha256)
-            encrypted_token = hash_object.hexdigest()
-            
+        if body.get("event") == "endpoint.url_validation" and plain_token and VERIFICATION_TOKEN:
             return {
                 "plainToken": plain_token,
-                "encryptedToken": encrypted_token
+                "encryptedToken": webhook_verifier.sign_plain_token(plain_token)
             }
     
-    # Handle regular Zoom events
-    if event_type == "meeting.started":
-        meeting_id = body.get("payload", {}).get("object", {}).get("id")
-        if meeting_id:
-            access_token = get_access_token()
-            # Start both recording processing and real-time video processing
-            background_tasks.add_task(process_recording, meeting_id, access_token)
-            background_tasks.add_task(start_rtms_processing, meeting_id)
-        return {"status": "processing"}
+    # A webhook-only replica with nowhere to send RTMS events must not ack them
+    if WEBHOOK_ONLY and rtms_forwarder is None and is_rtms_event(raw_body):
+        return Response(status_code=503)
+    
+    # Everything else is durably queued and acknowledged immediately
+    await event_log.append(raw_body)
+    return {"status": "queued"}
+
+def is_rtms_event(raw_body):
+    if not any(event.encode() in raw_body for event in RTMS_EVENTS):
+        return False
+    try:
+        return json.loads(raw_body).get("event") in RTMS_EVENTS
+    except ValueError:
+        return False
+
+def rtms_sessions():
+    """Where this replica starts and stops RTMS sessions"""
+    if session_manager is not None:
+        return session_manager
+    if rtms_forwarder is not None:
+        return rtms_forwarder
+    # Raising keeps the event in the log as failed instead of dropping it
+    raise RuntimeError("RTMS event received but this replica has no RTMS_NODE_URL")
+
+async def handle_zoom_event(body):
+    """Process a queued Zoom event; runs on the event consumers"""
+    event_type = body.get("event")
+    meeting_id = body.get("payload", {}).get("object", {}).get("id")
+    
+    if event_type == "meeting.started" and meeting_id:
+        # Recordings are picked up from recording.completed once Zoom has them
+        await rtms_sessions().start(meeting_id)
+    
+    elif event_type == "meeting.ended" and meeting_id:
+        await rtms_sessions().stop(meeting_id)
     
     elif event_type == "recording.completed":
         recording_files = body.get("payload", {}).get("object", {}).get("recording_files", [])
-        meeting_id = body.get("payload", {}).get("object", {}).get("id")
-        
         if recording_files and meeting_id:
-            access_token = get_access_token()
-            background_tasks.add_task(process_recording, meeting_id, access_token)
-        return {"status": "processing"}
-    
-    return {"status": "ignored"}
+            await process_recording(meeting_id, recording_files, body.get("download_token"))
+
+@app.get("/webhook/stats")
+async def webhook_stats():
+    """Counts of queued, processed, duplicate and failed webhook events"""
+    return await asyncio.to_thread(event_log.stats)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for RTMS sessions, video processing, webhooks and the Zoom API"""
+    # The event log is queried off the event loop; everything else is in memory
+    webhook = await asyncio.to_thread(event_log.stats)
+    write_queue = webhook.pop("write_queue", 0)
+    extra = [
+        family("webhook_events", "gauge", "Webhook events by status",
+               [({"status": status}, count) for status, count in webhook.items()]),
+        family("webhook_write_queue", "gauge", "Webhook events waiting for the group commit",
+               [({}, write_queue)]),
+    ]
+    return Response(registry.render(extra), media_type=CONTENT_TYPE)
 
 @app.get("/meetings")
 async def list_meetings():
-    access_token = get_access_token()
-    print("access_token")
-    print(access_token)
-    if not access_token:
-        raise HTTPException(status_code=401, detail="Failed to get access token")
-    
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get("https://api.zoom.us/v2/users/me/meetings", headers=headers)
+    # zoom_api fetches and refreshes the OAuth token itself
+    response = await zoom_api.get("/users/me/meetings")
     
     if response.status_code == 200:
         return response.json()
     else:
         raise HTTPException(status_code=response.status_code, detail="Failed to get meetings")
 
-# Function to start RTMS processing
-async def start_rtms_processing(meeting_id):
-    """Start processing real-time media streams for a meeting"""
-    try:
-        # Initialize video processor
-        processor = VideoProcessor()
-        
-        # Initialize RTMS client
-        client = ZoomRTMSClient()
-        
-        # Connect to RTMS
-        connected = await client.connect_to_rtms(meeting_id)
-        if not connected:
-            print(f"Failed to connect to RTMS for meeting {meeting_id}")
-            return
-        
-        # Process video data
-        await client.process_video_data(processor.process_frame)
-    except Exception as e:
-        print(f"Error in RTMS processing: {e}")
+def require_rtms():
+    if session_manager is None:
+        raise HTTPException(status_code=503, detail="RTMS is disabled in webhook-only mode")
+    return session_manager
 
 @app.get("/start-rtms/{meeting_id}")
-async def start_rtms(meeting_id: str, background_tasks: BackgroundTasks):
-    """Endpoint to manually start RTMS processing for a meeting"""
-    background_tasks.add_task(start_rtms_processing, meeting_id)
-    return {"status": "RTMS processing started", "meeting_id": meeting_id}
+async def start_rtms(meeting_id: str, profile: Optional[str] = None):
+    """Endpoint to manually start RTMS processing for a meeting, optionally with a subscription profile"""
+    require_rtms()
+    if profile is not None and profile not in PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown profile; choose from {', '.join(PROFILES)}")
+    status = await session_manager.start(meeting_id, profile)
+    return {"status": f"RTMS processing {status}", "meeting_id": meeting_id}
+
+@app.get("/stop-rtms/{meeting_id}")
+async def stop_rtms(meeting_id: str):
+    """Endpoint to stop RTMS processing for a meeting"""
+    status = await require_rtms().stop(meeting_id)
+    if status == "not_found":
+        raise HTTPException(status_code=404, detail="No RTMS session for this meeting")
+    return {"status": f"RTMS processing {status}", "meeting_id": meeting_id}
+
+@app.get("/rtms-sessions")
+async def list_rtms_sessions():
+    """List RTMS sessions with per-session throughput"""
+    return require_rtms().list()
 
 if __name__ == "__main__":
     uvicorn.run("zoom_integration:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,235 @@
+import os
+import re
+import math
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import httpx
+from metrics import family
+
+logger = logging.getLogger(__name__)
+
+# Requests per second allowed for each Zoom rate-limit category
+CATEGORY_RATES = {
+    "light": float(os.getenv('ZOOM_RATE_LIGHT', '30')),
+    "medium": float(os.getenv('ZOOM_RATE_MEDIUM', '20')),
+    "heavy": float(os.getenv('ZOOM_RATE_HEAVY', '10')),
+}
+
+MAX_RETRIES = int(os.getenv('ZOOM_API_MAX_RETRIES', '5'))
+BACKOFF_BASE = float(os.getenv('ZOOM_API_BACKOFF_BASE', '0.5'))
+BACKOFF_MAX = float(os.getenv('ZOOM_API_BACKOFF_MAX', '30'))
+# Waits longer than this (e.g. a daily quota reset) are returned to the caller
+MAX_RETRY_WAIT = float(os.getenv('ZOOM_API_MAX_RETRY_WAIT', '60'))
+
+# Safe to resend after a timeout or 5xx, when Zoom may already have acted on the first try
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Failures where the request never reached Zoom, so any method can be resent
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+# Zoom's documented category for the endpoints we call; anything else is "light"
+ENDPOINT_CATEGORIES = [
+    ("GET", re.compile(r"^/metrics/"), "heavy"),
+    ("GET", re.compile(r"^/report/"), "heavy"),
+    ("GET", re.compile(r"^/users/[^/]+/meetings$"), "medium"),
+    ("GET", re.compile(r"^/users$"), "medium"),
+    ("POST", re.compile(r"^/users/[^/]+/meetings$"), "medium"),
+]
+
+
+def parse_retry_after(value):
+    """Return the number of seconds a Retry-After header asks us to wait"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    # Zoom sends an absolute timestamp for daily limits
+    try:
+        when = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class QuotaExhausted(Exception):
+    """A category's quota is used up for longer than callers should wait"""
+
+    def __init__(self, retry_in):
+        super().__init__(f"quota exhausted for {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+class TokenBucket:
+    """Token bucket admitting requests at a steady rate, FIFO among waiters"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.exhausted_until = 0.0
+        self._lock = None
+
+    def pause(self, seconds):
+        """Stop admitting requests for the given number of seconds"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def exhaust(self, seconds):
+        """Reject requests outright for the given number of seconds"""
+        self.exhausted_until = max(self.exhausted_until, time.monotonic() + seconds)
+
+    def _check_quota(self):
+        retry_in = self.exhausted_until - time.monotonic()
+        if retry_in > 0:
+            raise QuotaExhausted(retry_in)
+
+    async def acquire(self):
+        """Wait for a token; raises QuotaExhausted instead of waiting out a spent quota"""
+        self._check_quota()
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                # Waiters queued before the quota ran out fail fast too
+                self._check_quota()
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RateLimitScheduler:
+    """Admits Zoom API calls per rate-limit category and retries 429/5xx"""
+
+    def __init__(self, rates=None, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE,
+                 backoff_max=BACKOFF_MAX, max_retry_wait=MAX_RETRY_WAIT):
+        rates = rates or CATEGORY_RATES
+        self.buckets = {category: TokenBucket(rate) for category, rate in rates.items()}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_wait = max_retry_wait
+        self.metrics = {
+            category: {"queue_depth": 0, "requests": 0, "throttled": 0, "rejected": 0,
+                       "retries": 0, "server_errors": 0, "transport_errors": 0,
+                       "remaining": None}
+            for category in self.buckets
+        }
+
+    def categorize(self, method, path):
+        for rule_method, pattern, category in ENDPOINT_CATEGORIES:
+            if method == rule_method and pattern.match(path):
+                return category
+        return "light"
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _observe(self, category, response):
+        """Track the X-RateLimit-Remaining header
+
+        It counts the category's daily quota, and nothing says when that
+        resets; the 429 that follows carries Retry-After, which execute() uses.
+        """
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        if remaining is not None and remaining.isdigit():
+            self.metrics[category]["remaining"] = int(remaining)
+
+    def _rejected(self, method, path, retry_in):
+        """A local 429 for calls made while the category's quota is exhausted"""
+        return httpx.Response(429, headers={"Retry-After": str(math.ceil(retry_in))},
+                              request=httpx.Request(method, path))
+
+    async def execute(self, method, path, send):
+        """Run send() under admission control, retrying throttled or failed calls
+
+        429s are retried for every method, since Zoom rejects those calls
+        before acting on them. Transport errors and 5xx are retried only for
+        idempotent methods; a POST or PATCH is resent only if the connection
+        was never made, so a write is never applied twice.
+        """
+        category = self.categorize(method, path)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        bucket = self.buckets[category]
+        metrics = self.metrics[category]
+
+        for attempt in range(self.max_retries + 1):
+            metrics["queue_depth"] += 1
+            try:
+                await bucket.acquire()
+            except QuotaExhausted as e:
+                metrics["rejected"] += 1
+                return self._rejected(method, path, e.retry_in)
+            finally:
+                metrics["queue_depth"] -= 1
+            metrics["requests"] += 1
+
+            try:
+                response = await send()
+            except httpx.TransportError as e:
+                metrics["transport_errors"] += 1
+                if attempt == self.max_retries or not (idempotent or isinstance(e, UNSENT_ERRORS)):
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(f"Zoom API {method} {path} failed ({e}); retrying in {delay:.1f}s")
+            else:
+                self._observe(category, response)
+                if response.status_code == 429:
+                    metrics["throttled"] += 1
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    delay = retry_after if retry_after is not None else self.backoff(attempt)
+                    if delay > self.max_retry_wait:
+                        # Callers get a 429 right away until the quota resets
+                        bucket.exhaust(delay)
+                        logger.error(f"Zoom {category} quota exhausted for {delay:.0f}s "
+                                     f"({response.headers.get('X-RateLimit-Type')})")
+                        return response
+                    bucket.pause(delay)
+                elif response.status_code >= 500:
+                    metrics["server_errors"] += 1
+                    if not idempotent:
+                        return response
+                    delay = self.backoff(attempt)
+                else:
+                    return response
+                if attempt == self.max_retries:
+                    return response
+                logger.warning(f"Zoom API {method} {path} returned {response.status_code}; "
+                               f"retrying in {delay:.1f}s")
+
+            metrics["retries"] += 1
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        return {category: dict(values) for category, values in self.metrics.items()}
+
+    def collect_metrics(self):
+        """Per-category counters as metric families for /metrics"""
+        families = []
+        for key, kind in (("requests", "counter"), ("throttled", "counter"), ("rejected", "counter"),
+                          ("retries", "counter"), ("server_errors", "counter"),
+                          ("transport_errors", "counter"), ("queue_depth", "gauge"),
+                          ("remaining", "gauge")):
+            name = f"zoom_api_{key}_total" if kind == "counter" else f"zoom_api_{key}"
+            families.append(family(name, kind, f"Zoom API {key.replace('_', ' ')} per rate-limit category",
+                                   [({"category": category}, values[key])
+                                    for category, values in self.metrics.items()]))
+        return families